@@ -0,0 +1,342 @@
+"""
+Benchmark suite for the write path: the ingest mutations, the post_save signal cascade and the summary
+recalculations, timed against a synthetic dataset of N pulsars x M observations x K ToAs each.
+
+Run it against a local Postgres with the benchmark_ingest management command, which writes the report
+as JSON so runs on different commits can be compared.
+"""
+
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import RequestFactory
+
+from benchmarks.synthetic import (
+    make_ephemeris_text,
+    make_observation_input,
+    make_pulsar_names,
+    make_residual_lines,
+    make_toa_lines,
+)
+from dataportal.models import (
+    Calibration,
+    MainProject,
+    Observation,
+    PipelineRun,
+    Project,
+    Pulsar,
+    PulsarFoldSummary,
+    SummaryUpdate,
+    Telescope,
+    Template,
+    Toa,
+)
+
+CREATE_OBSERVATION = """
+    mutation ($input: ObservationInput!) {
+        createObservation(input: $input) {
+            observation {
+                id
+            }
+        }
+    }
+"""
+
+CREATE_PIPELINE_RUN = """
+    mutation ($input: PipelineRunInput!) {
+        createPipelineRun(input: $input) {
+            pipelineRun {
+                id
+            }
+        }
+    }
+"""
+
+CREATE_TOA = """
+    mutation ($input: ToaInput!) {
+        createToa(input: $input) {
+            toa {
+                id
+            }
+        }
+    }
+"""
+
+CREATE_RESIDUAL = """
+    mutation ($input: ResidualInput!) {
+        createResidual(input: $input) {
+            toa {
+                id
+            }
+        }
+    }
+"""
+
+START_UTC = datetime(2023, 1, 1, tzinfo=timezone.utc)
+MJD_EPOCH = datetime(1858, 11, 17, tzinfo=timezone.utc)
+
+
+@dataclass
+class IngestBenchmarkConfig:
+    n_pulsars: int = 10
+    n_observations: int = 10
+    nchan: int = 16
+    nsubint: int = 8
+    # Fraction of the pulsars given a binary ephemeris, so orbital phases are calculated
+    binary_fraction: float = 0.5
+    trace_memory: bool = False
+
+
+@dataclass
+class StageResult:
+    rows: int
+    seconds: float
+    queries: int
+    # High-water mark of the process' resident memory after the stage
+    peak_rss_mb: float
+    # Peak memory allocated by Python during the stage, if traced
+    peak_traced_mb: float = None
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else None
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_peak_rss_mb():
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024**2 if sys.platform == "darwin" else peak_rss / 1024
+
+
+class IngestBenchmark:
+    """
+    Generate the synthetic dataset through the ingest mutations one stage at a time and measure each stage.
+
+    The mutations are executed against meertime.schema directly, as a superuser, so the timings leave out
+    HTTP handling but include everything the resolvers and signals do.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.stages = {}
+
+    def run(self):
+        self.populate()
+        return self.report()
+
+    def populate(self):
+        self.create_fixtures()
+        self.create_observations()
+        self.create_pipeline_runs()
+        self.create_toas()
+        self.create_residuals()
+        self.send_post_save_signals()
+        self.recalculate_summaries()
+
+    def report(self):
+        return {
+            "commit": get_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "database": {
+                "vendor": connection.vendor,
+                "version": connection.pg_version if connection.vendor == "postgresql" else None,
+            },
+            "config": asdict(self.config),
+            "stages": {
+                name: dict(asdict(result), rows_per_sec=result.rows_per_sec) for name, result in self.stages.items()
+            },
+        }
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """
+        Time the body and count its queries. The body sets the number of rows it wrote on the yielded dict
+        if it is not known in advance.
+        """
+        counted = {"rows": rows, "queries": 0}
+
+        def count_query(execute, sql, params, many, context):
+            counted["queries"] += 1
+            return execute(sql, params, many, context)
+
+        if self.config.trace_memory:
+            tracemalloc.start()
+        with connection.execute_wrapper(count_query):
+            start = time.perf_counter()
+            yield counted
+            seconds = time.perf_counter() - start
+        peak_traced_mb = None
+        if self.config.trace_memory:
+            peak_traced_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+            tracemalloc.stop()
+        self.stages[name] = StageResult(
+            rows=counted["rows"],
+            seconds=seconds,
+            queries=counted["queries"],
+            peak_rss_mb=get_peak_rss_mb(),
+            peak_traced_mb=peak_traced_mb,
+        )
+
+    def execute(self, query, input):
+        # Imported here so the schema is only built once Django is set up
+        from meertime.schema import schema
+
+        result = schema.execute(query, variables={"input": input}, context_value=self.request)
+        if result.errors:
+            raise result.errors[0]
+        return result.data
+
+    def create_fixtures(self):
+        user = get_user_model().objects.create_superuser(username="ingest-benchmark", email="benchmark@example.com")
+        self.request = RequestFactory().post("/api/graphql/")
+        self.request.user = user
+
+        self.telescope, _ = Telescope.objects.get_or_create(name="Benchmark Telescope")
+        main_project, _ = MainProject.objects.get_or_create(name="Benchmark", telescope=self.telescope)
+        self.project, _ = Project.objects.get_or_create(
+            code="BENCHMARK-INGEST", defaults={"short": "BENCHINGEST", "main_project": main_project}
+        )
+        self.pulsars = [
+            Pulsar.objects.get_or_create(name=name)[0] for name in make_pulsar_names(self.config.n_pulsars)
+        ]
+        n_binary = round(self.config.binary_fraction * self.config.n_pulsars)
+        self.ephemeris_texts = {
+            pulsar.id: make_ephemeris_text(pulsar.name, f0=100.0 + index, binary=index < n_binary)
+            for index, pulsar in enumerate(self.pulsars)
+        }
+        self.templates = {
+            pulsar.id: Template.objects.create(
+                pulsar=pulsar, project=self.project, band="LBAND", template_hash=f"benchmark-{pulsar.name}"
+            )
+            for pulsar in self.pulsars
+        }
+        # One calibration per observing session, shared by the pulsars observed in it
+        self.calibrations = [
+            Calibration.objects.create(schedule_block_id=f"benchmark-{index}", calibration_type="pre")
+            for index in range(self.config.n_observations)
+        ]
+
+    def observation_start(self, pulsar_index, observation_index):
+        return START_UTC + timedelta(days=observation_index, minutes=10 * pulsar_index)
+
+    def create_observations(self):
+        inputs = [
+            make_observation_input(
+                pulsar.name,
+                self.telescope.name,
+                self.project.code,
+                calibration.id,
+                self.observation_start(pulsar_index, observation_index),
+                self.ephemeris_texts[pulsar.id],
+                self.config.nchan,
+                self.config.nsubint,
+            )
+            for observation_index, calibration in enumerate(self.calibrations)
+            for pulsar_index, pulsar in enumerate(self.pulsars)
+        ]
+        with self.stage("create_observation", rows=len(inputs)):
+            for input in inputs:
+                self.execute(CREATE_OBSERVATION, input)
+        self.observations = list(Observation.objects.filter(project=self.project).order_by("id"))
+
+    def create_pipeline_runs(self):
+        with self.stage("create_pipeline_run", rows=len(self.observations)):
+            for observation in self.observations:
+                self.execute(
+                    CREATE_PIPELINE_RUN,
+                    {
+                        "observationId": observation.id,
+                        "ephemerisId": observation.ephemeris_id,
+                        "templateId": self.templates[observation.pulsar_id].id,
+                        "pipelineName": "benchmark",
+                        "pipelineDescription": "Synthetic ingest benchmark",
+                        "pipelineVersion": "0",
+                        "jobState": "Completed",
+                        "location": "/tmp",
+                        "dm": 2.64,
+                        "dmErr": 0.01,
+                        "sn": 100.0,
+                        "flux": 25.0,
+                        "rm": 10.0,
+                        "rmErr": 1.0,
+                        "percentRfiZapped": 0.1,
+                    },
+                )
+        self.pipeline_runs = list(PipelineRun.objects.filter(observation__project=self.project).order_by("id"))
+
+    def create_toas(self):
+        observations = {observation.id: observation for observation in self.observations}
+        with self.stage("create_toa") as counted:
+            for pipeline_run in self.pipeline_runs:
+                observation = observations[pipeline_run.observation_id]
+                toa_lines = make_toa_lines(
+                    self.config.nchan,
+                    self.config.nsubint,
+                    start_mjd=(observation.utc_start - MJD_EPOCH).total_seconds() / 86400,
+                    seed=pipeline_run.id,
+                )
+                data = self.execute(
+                    CREATE_TOA,
+                    {
+                        "pipelineRunId": pipeline_run.id,
+                        "projectShort": self.project.short,
+                        "ephemerisText": self.ephemeris_texts[observation.pulsar_id],
+                        "templateId": self.templates[observation.pulsar_id].id,
+                        "toaLines": toa_lines,
+                        "dmCorrected": False,
+                        "nsubType": "1",
+                        "obsNpol": 1,
+                        "obsNchan": self.config.nchan,
+                    },
+                )
+                counted["rows"] += len(data["createToa"]["toa"])
+
+    def create_residuals(self):
+        # One residual upload per pulsar, as when a pulsar's timing is refitted
+        residual_lines = {
+            pulsar.id: make_residual_lines(
+                *zip(*Toa.objects.filter(project=self.project, observation__pulsar=pulsar).values_list("id", "mjd")),
+                seed=pulsar.id,
+            )
+            for pulsar in self.pulsars
+        }
+        with self.stage("create_residual") as counted:
+            for lines in residual_lines.values():
+                data = self.execute(CREATE_RESIDUAL, {"residualLines": lines})
+                counted["rows"] += len(data["createResidual"]["toa"])
+
+    def send_post_save_signals(self):
+        # Re-send the signals the ingest mutations trigger on their own, to time the cascade without the writes
+        instances = [(Observation, observation) for observation in self.observations] + [
+            (PipelineRun, pipeline_run) for pipeline_run in self.pipeline_runs
+        ]
+        with self.stage("post_save_cascade", rows=len(instances)):
+            for sender, instance in instances:
+                post_save.send(sender=sender, instance=instance, created=False)
+
+    def recalculate_summaries(self):
+        with self.stage("summary_recalculation") as counted:
+            while True:
+                n_processed, n_recalculated = SummaryUpdate.process_queue(10000)
+                if not n_processed:
+                    break
+                counted["rows"] += n_recalculated
+            for pulsar in self.pulsars:
+                PulsarFoldSummary.update_or_create(pulsar, self.project.main_project)
+                counted["rows"] += 1
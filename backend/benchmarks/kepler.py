@@ -0,0 +1,64 @@
+"""
+Benchmark of the vectorized Kepler solver against solving each mean anomaly with scipy's fsolve, for 1 to 10^6
+MJDs of an eccentric binary.
+
+Run from the backend directory with:
+
+    python -m benchmarks.kepler [--max-mjds 1000000] [--max-fsolve-mjds 10000] [--ecc 0.617134] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy.optimize import fsolve
+
+from utils.binary_phase import eccentric_anomaly, mean_anomaly
+
+# Orbit of J1915+1606, the Hulse-Taylor pulsar
+T0 = 52144.90097849
+PB = 0.322997448918
+
+
+def fsolve_eccentric_anomaly(M, ECC):
+    return np.asarray([fsolve(lambda E, M_i=M_i: E - ECC * np.sin(E) - M_i, M_i)[0] for M_i in M])
+
+
+def best_time(function, M, ECC, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(M, ECC)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-mjds", type=int, default=10**6)
+    parser.add_argument(
+        "--max-fsolve-mjds", type=int, default=10**4, help="Largest number of MJDs to time fsolve for, as it is slow"
+    )
+    parser.add_argument("--ecc", type=float, default=0.617134)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"Solving Kepler's equation at eccentricity {args.ecc}, best of {args.repeat}")
+    print(f"{'MJDs':>8} {'vectorized (s)':>15} {'fsolve (s)':>12} {'speedup':>8} {'max |dE|':>10}")
+    n_mjds = 1
+    while n_mjds <= args.max_mjds:
+        mjds = np.sort(rng.uniform(58000, 61000, n_mjds))
+        M = np.atleast_1d(mean_anomaly(mjds, T0, pb=PB))
+        seconds = best_time(eccentric_anomaly, M, args.ecc, args.repeat)
+        line = f"{n_mjds:>8} {seconds:>15.6f}"
+        if n_mjds <= args.max_fsolve_mjds:
+            fsolve_seconds = best_time(fsolve_eccentric_anomaly, M, args.ecc, args.repeat)
+            difference = np.max(np.abs(eccentric_anomaly(M, args.ecc) - fsolve_eccentric_anomaly(M, args.ecc)))
+            line += f" {fsolve_seconds:>12.6f} {fsolve_seconds / seconds:>8.0f} {float(difference):>10.1e}"
+        print(line)
+        n_mjds *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Read-path harness that replays the frontend's GraphQL operations through the Django test client.
+
+Each operation is run as an anonymous user, a project member and a superuser, and the latency, SQL query
+count and rows fetched are measured. READ_PATH_QUERY_BUDGETS caps the query count of each operation on the
+READ_PATH_BUDGET_DATASET, so an N+1 that slips into the resolvers is caught by the tests.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from cachalot.api import cachalot_disabled
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+
+from benchmarks.ingest import IngestBenchmarkConfig
+from benchmarks.relay_operations import load_relay_operations
+from dataportal.models import Observation, ProjectMembership
+
+GRAPHQL_URL = "/api/graphql/"
+
+ROLES = ["anonymous", "member", "superuser"]
+
+# The page operations that are replayed, with the variables they are sent with for a dataset
+READ_PATH_OPERATIONS = {
+    "FoldQuery": lambda dataset: {},
+    "FoldDetailQuery": lambda dataset: {"pulsar": dataset.pulsar, "mainProject": dataset.main_project},
+    "SearchQuery": lambda dataset: {},
+    "SessionQuery": lambda dataset: {"id": dataset.calibration_id},
+    "SessionLatestQuery": lambda dataset: {},
+    "SingleObservationQuery": lambda dataset: {
+        "pulsar": dataset.pulsar,
+        "mainProject": dataset.main_project,
+        "utc": dataset.utc,
+        "beam": dataset.beam,
+    },
+}
+
+# The synthetic dataset the budgets are set for. Every pulsar has several observations in several
+# sessions, so a query per row adds several queries and goes over the budget.
+READ_PATH_BUDGET_DATASET = IngestBenchmarkConfig(n_pulsars=3, n_observations=3, nchan=2, nsubint=1)
+
+# The most SQL queries each operation may run on READ_PATH_BUDGET_DATASET as any role. Lower them when a
+# resolver gets cheaper.
+READ_PATH_QUERY_BUDGETS = {
+    "FoldQuery": 12,
+    "FoldDetailQuery": 40,
+    "SearchQuery": 7,
+    "SessionQuery": 31,
+    "SessionLatestQuery": 31,
+    "SingleObservationQuery": 16,
+}
+
+
+@dataclass
+class ReadPathDataset:
+    """
+    The values of an observation in the database that the operations are sent with.
+    """
+
+    pulsar: str
+    main_project: str
+    calibration_id: int
+    utc: str
+    beam: int
+
+    @classmethod
+    def from_observation(cls, observation):
+        return cls(
+            pulsar=observation.pulsar.name,
+            main_project=observation.project.main_project.name,
+            calibration_id=observation.calibration_id,
+            utc=observation.utc_start.strftime("%Y-%m-%d-%H:%M:%S"),
+            beam=observation.beam,
+        )
+
+
+@dataclass
+class OperationResult:
+    operation: str
+    role: str
+    p50_ms: float
+    p95_ms: float
+    queries: int
+    rows_fetched: int
+
+
+def create_role_users(project):
+    """
+    Create a user for each role, with the member belonging to the project.
+
+    Returns:
+        dict: Role to the user, or None for the anonymous role.
+    """
+    User = get_user_model()
+    member = User.objects.create_user(username="read-path-member", email="member@example.com")
+    ProjectMembership.objects.create(user=member, project=project, role=ProjectMembership.RoleChoices.MEMBER)
+    superuser = User.objects.create_superuser(username="read-path-superuser", email="superuser@example.com")
+    return {"anonymous": None, "member": member, "superuser": superuser}
+
+
+class ReadPathHarness:
+    """
+    Replay operations as each role and measure them.
+
+    Queries are counted with django-cachalot disabled, so the counts are those of a cold cache and do
+    not depend on what ran before.
+    """
+
+    def __init__(self, dataset, users, operations=None, repeat=5):
+        self.dataset = dataset
+        self.users = users
+        self.documents = load_relay_operations()
+        self.operations = operations or list(READ_PATH_OPERATIONS)
+        self.repeat = repeat
+
+    def run(self):
+        results = []
+        for role, user in self.users.items():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            for operation in self.operations:
+                results.append(self.run_operation(client, operation, role))
+        return results
+
+    def run_operation(self, client, operation, role):
+        body = json.dumps(
+            {
+                "query": self.documents[operation],
+                "operationName": operation,
+                "variables": READ_PATH_OPERATIONS[operation](self.dataset),
+            }
+        )
+        latencies = []
+        for _ in range(self.repeat):
+            counted = {"queries": 0, "rows": 0}
+
+            def count_query(execute, sql, params, many, context):
+                result = execute(sql, params, many, context)
+                counted["queries"] += 1
+                counted["rows"] += max(context["cursor"].rowcount, 0)
+                return result
+
+            with cachalot_disabled(), connection.execute_wrapper(count_query):
+                start = time.perf_counter()
+                response = client.post(GRAPHQL_URL, body, content_type="application/json")
+                latencies.append((time.perf_counter() - start) * 1000)
+            content = json.loads(response.content)
+            if response.status_code != 200 or content.get("errors"):
+                raise RuntimeError(f"{operation} as {role} failed: {content.get('errors', response.status_code)}")
+
+        return OperationResult(
+            operation=operation,
+            role=role,
+            p50_ms=float(np.percentile(latencies, 50)),
+            p95_ms=float(np.percentile(latencies, 95)),
+            queries=counted["queries"],
+            rows_fetched=counted["rows"],
+        )
+
+
+def get_dataset(project):
+    """
+    The dataset of the project's first fold observation.
+    """
+    observation = (
+        Observation.objects.filter(project=project, obs_type="fold")
+        .select_related("pulsar", "project__main_project")
+        .order_by("utc_start")
+        .first()
+    )
+    return ReadPathDataset.from_observation(observation)
@@ -0,0 +1,135 @@
+"""
+Extract the GraphQL operations the React frontend sends from its sources.
+
+The frontend's queries spread Relay fragments that take local arguments (@argumentDefinitions and
+@arguments), which the server does not understand. The operations are compiled the way the Relay
+compiler would before they are sent: fragment spreads are inlined with their arguments bound and the
+Relay-only directives are removed.
+"""
+
+import os
+import re
+
+from graphql import (
+    BREAK,
+    REMOVE,
+    FragmentDefinitionNode,
+    InlineFragmentNode,
+    NullValueNode,
+    OperationDefinitionNode,
+    OperationType,
+    Visitor,
+    parse,
+    print_ast,
+    visit,
+)
+
+FRONTEND_SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "src")
+
+GRAPHQL_TAG_PATTERN = re.compile(r"graphql`(.*?)`", re.DOTALL)
+
+# Directives the Relay compiler consumes, which are not part of the server schema
+RELAY_DIRECTIVES = {"argumentDefinitions", "arguments", "refetchable", "connection", "relay", "inline", "required"}
+
+
+def extract_graphql_documents(src_dir=FRONTEND_SRC_DIR):
+    """
+    Find the graphql tagged templates in the .js and .jsx sources, skipping tests.
+
+    Returns:
+        list: (path, document text) pairs.
+    """
+    documents = []
+    for directory, _, file_names in sorted(os.walk(src_dir)):
+        for file_name in sorted(file_names):
+            if not file_name.endswith((".js", ".jsx")) or ".test." in file_name:
+                continue
+            path = os.path.join(directory, file_name)
+            with open(path, "r") as source_file:
+                source = source_file.read()
+            documents += [(path, match.group(1)) for match in GRAPHQL_TAG_PATTERN.finditer(source)]
+    return documents
+
+
+def get_directive(node, name):
+    return next((directive for directive in node.directives or () if directive.name.value == name), None)
+
+
+def get_argument_values(directive):
+    """
+    The values of a directive's arguments, by name.
+    """
+    if directive is None:
+        return {}
+    return {argument.name.value: argument.value for argument in directive.arguments}
+
+
+def get_argument_defaults(fragment):
+    """
+    The default value of each of a fragment's @argumentDefinitions, or None if it has no default.
+    """
+    defaults = {}
+    for name, definition in get_argument_values(get_directive(fragment, "argumentDefinitions")).items():
+        default = next((field.value for field in definition.fields if field.name.value == "defaultValue"), None)
+        defaults[name] = default
+    return defaults
+
+
+class BindFragmentArguments(Visitor):
+    """
+    Replace the fragment-local argument variables in a fragment's selections with their bound values.
+    """
+
+    def __init__(self, bindings):
+        super().__init__()
+        self.bindings = bindings
+
+    def enter_variable(self, node, *args):
+        if node.name.value in self.bindings:
+            return self.bindings[node.name.value]
+        return None
+
+
+class InlineFragments(Visitor):
+    """
+    Replace fragment spreads with inline fragments of the fragment's selections and remove Relay directives.
+    """
+
+    def __init__(self, fragments):
+        super().__init__()
+        self.fragments = fragments
+
+    def enter_fragment_spread(self, node, *args):
+        fragment = self.fragments[node.name.value]
+        defaults = get_argument_defaults(fragment)
+        values = get_argument_values(get_directive(node, "arguments"))
+        bindings = {name: values.get(name, default) or NullValueNode() for name, default in defaults.items()}
+        selection_set = visit(fragment.selection_set, BindFragmentArguments(bindings))
+        # The inline fragment is visited next, which inlines any fragments it spreads in turn
+        return InlineFragmentNode(type_condition=fragment.type_condition, directives=(), selection_set=selection_set)
+
+    def enter_directive(self, node, *args):
+        if node.name.value in RELAY_DIRECTIVES:
+            return REMOVE
+        return None
+
+    def enter_fragment_definition(self, node, *args):
+        return BREAK
+
+
+def load_relay_operations(src_dir=FRONTEND_SRC_DIR, operation_type=OperationType.QUERY):
+    """
+    Compile the frontend's operations into documents the server can execute.
+
+    Returns:
+        dict: Operation name to the text of a self-contained document.
+    """
+    operations = {}
+    fragments = {}
+    for _, document_text in extract_graphql_documents(src_dir):
+        for definition in parse(document_text).definitions:
+            if isinstance(definition, FragmentDefinitionNode):
+                fragments[definition.name.value] = definition
+            elif isinstance(definition, OperationDefinitionNode) and definition.operation == operation_type:
+                operations[definition.name.value] = definition
+    return {name: print_ast(visit(operation, InlineFragments(fragments))) for name, operation in operations.items()}
@@ -0,0 +1,165 @@
+"""
+Synthetic data generators for the ingest benchmarks.
+
+The generated values are realistic enough to pass the same validation as real pipeline
+output (e.g. the .tim round-trip check in Toa.bulk_create) but are not physically meaningful.
+"""
+
+import numpy as np
+
+
+def make_toa_lines(nchan, nsubint, archive="J0437-4715_2023-10-22-04:41:07_zap.ar", start_mjd=60239.0, seed=0):
+    """
+    Build the lines of a .tim file with one ToA per (channel, subint) pair.
+
+    Args:
+        nchan (int): Number of frequency channels.
+        nsubint (int): Number of sub-integrations.
+        archive (str): Archive name written in the first column.
+        start_mjd (float): MJD of the first sub-integration.
+        seed (int): Seed for the random number generator so runs are comparable.
+
+    Returns:
+        list: The .tim lines, starting with a FORMAT header and ending in newlines.
+    """
+    rng = np.random.default_rng(seed)
+    bandwidth = 856.0
+    channel_width = bandwidth / nchan
+    lines = ["FORMAT 1\n"]
+    for subint in range(nsubint):
+        subint_mjd = start_mjd + subint * 8 / 86400
+        for chan in range(nchan):
+            freq = 856.0 + (chan + 0.5) * channel_width
+            # Keep 12 decimal places of MJD precision, matching what the pipeline writes
+            mjd = f"{subint_mjd + rng.uniform(0, 1e-6):.12f}"
+            mjd_err = rng.uniform(0.05, 50.0)
+            gof = round(rng.uniform(0.8, 1.5), 3)
+            snr = round(rng.uniform(5.0, 2000.0), 2)
+            lines.append(
+                f"{archive} {freq:.6f} {mjd} {mjd_err:>7.3f}  meerkat  -fe KAT -be MKBF -f KAT_MKBF "
+                f"-bw {int(bandwidth)} -tobs 8 -tmplt J0437-4715.std -gof {gof} -nbin 1024 -nch {nchan} "
+                f"-chan {chan} -rcvr KAT -snr {snr} -length 8 -subint {subint}\n"
+            )
+    return lines
+
+
+def make_ephemeris_text(pulsar_name, f0=173.6879458121843, dm=2.64, binary=False):
+    """
+    Build the text of a minimal tempo2 par file.
+
+    Args:
+        pulsar_name (str): The J name written to PSRJ.
+        f0 (float): Spin frequency in Hz.
+        dm (float): Dispersion measure in pc/cm^3.
+        binary (bool): Add an ELL1 binary model so orbital phases get computed.
+
+    Returns:
+        str: The par file text.
+    """
+    lines = [
+        f"PSRJ           {pulsar_name}",
+        "RAJ             04:37:15.8961737         1  0.00000000629488302358",
+        "DECJ           -47:15:09.11071           1  0.00000006061694785521",
+        f"F0             {f0}     1  0.00000000000000270294",
+        "F1             -1.7283640942690754574e-15 1  1.5434707003216917787e-21",
+        "PEPOCH         59000",
+        f"DM             {dm}     1  0.00011",
+    ]
+    if binary:
+        lines += [
+            "BINARY         ELL1",
+            "PB             5.7410462314943813463     1  0.00000000007281488476",
+            "A1             3.3666870435582466006     1  0.00000000933513547706",
+            "TASC           54530.172461534588453     1  0.00000000076151045604",
+            "EPS1           -5.1016917286211208876e-06 1  0.00000000315396614244",
+            "EPS2           -1.9028599082066548289e-05 1  0.00000000370497612815",
+        ]
+    lines += [
+        "START          58526.211865789908546",
+        "FINISH         60239.197009013628704",
+        "TZRMJD         59000.194531386567016",
+        "TZRFRQ         1284.0",
+        "TZRSITE        meerkat",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def make_pulsar_names(n_pulsars):
+    """
+    Build n_pulsars distinct J names spread across the sky.
+    """
+    names = []
+    for index in range(n_pulsars):
+        ra_minutes = index * 7 % (24 * 60)
+        dec_minutes = index * 13 % (89 * 60)
+        names.append(f"J{ra_minutes // 60:02d}{ra_minutes % 60:02d}-{dec_minutes // 60:02d}{dec_minutes % 60:02d}")
+    return names
+
+
+def make_observation_input(
+    pulsar_name, telescope_name, project_code, calibration_id, utc_start, ephemeris_text, nchan, nsubint
+):
+    """
+    Build the createObservation input of a fold observation.
+
+    Args:
+        pulsar_name (str): The J name of an existing pulsar.
+        telescope_name (str): The name of an existing telescope.
+        project_code (str): The code of an existing project.
+        calibration_id (int): The id of an existing calibration.
+        utc_start (datetime): The start of the observation.
+        ephemeris_text (str): The folding ephemeris, as from make_ephemeris_text.
+        nchan (int): Number of frequency channels.
+        nsubint (int): Number of 8 second sub-integrations, which sets the duration.
+
+    Returns:
+        dict: The ObservationInput, keyed by the GraphQL field names.
+    """
+    return {
+        "pulsarName": pulsar_name,
+        "telescopeName": telescope_name,
+        "projectCode": project_code,
+        "calibrationId": calibration_id,
+        "frequency": 1284.0,
+        "bandwidth": 856.0,
+        "nchan": nchan,
+        "beam": 1,
+        "nant": 58,
+        "nantEff": 58,
+        "npol": 4,
+        "obsType": "fold",
+        "utcStart": utc_start.isoformat(),
+        "raj": "04:37:15.8961737",
+        "decj": "-47:15:09.11071",
+        "duration": 8.0 * nsubint,
+        "nbit": 8,
+        "tsamp": 0.0000047,
+        "ephemerisText": ephemeris_text,
+        "foldNbin": 1024,
+        "foldNchan": nchan,
+        "foldTsubint": 8,
+    }
+
+
+def make_residual_lines(toa_ids, mjds, seed=0):
+    """
+    Build "id,mjd,residual,residual_err,residual_phase" lines, as written by the pipeline, for ToAs.
+
+    Args:
+        toa_ids (list): The ToA ids.
+        mjds (list): The MJD of each ToA.
+        seed (int): Seed for the random number generator so runs are comparable.
+
+    Returns:
+        list: One residual line per ToA.
+    """
+    rng = np.random.default_rng(seed)
+    residuals = rng.normal(0.0, 1e-6, len(toa_ids))
+    residual_errs = rng.uniform(0.1, 10.0, len(toa_ids))
+    residual_phases = rng.normal(0.0, 1e-3, len(toa_ids))
+    return [
+        f"{toa_id},{mjd},{residual},{residual_err},{residual_phase}"
+        for toa_id, mjd, residual, residual_err, residual_phase in zip(
+            toa_ids, mjds, residuals, residual_errs, residual_phases
+        )
+    ]
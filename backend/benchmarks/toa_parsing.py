@@ -0,0 +1,50 @@
+"""
+Micro-benchmark of the per-line and columnar .tim parsers on a realistic 1024 channel x 64 subint file.
+
+Run from the backend directory with:
+
+    python -m benchmarks.toa_parsing [--nchan 1024] [--nsubint 64] [--repeat 3]
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import make_toa_lines
+from utils.toa import toa_columns_to_lines, toa_dict_to_line, toa_line_to_dict, toa_lines_to_columns
+
+
+def per_line(toa_lines):
+    for toa_line in toa_lines:
+        assert toa_line == toa_dict_to_line(toa_line_to_dict(toa_line))
+
+
+def columnar(toa_lines):
+    for block in toa_lines_to_columns(toa_lines):
+        assert toa_columns_to_lines(block) == [toa_lines[row] for row in block.rows]
+
+
+def best_time(function, toa_lines, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(toa_lines)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nchan", type=int, default=1024)
+    parser.add_argument("--nsubint", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    toa_lines = [toa_line.rstrip("\n") for toa_line in make_toa_lines(args.nchan, args.nsubint)[1:]]
+    print(f"Parsing and round-tripping {len(toa_lines)} ToA lines, best of {args.repeat}")
+    for label, function in [("toa_line_to_dict per line", per_line), ("toa_lines_to_columns", columnar)]:
+        seconds = best_time(function, toa_lines, args.repeat)
+        print(f"{label:<28} {seconds:8.3f} s {len(toa_lines) / seconds:12.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
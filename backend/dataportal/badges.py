@@ -0,0 +1,236 @@
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from dataportal.models import Badge, PipelineRun, PulsarFoldResult
+
+# Columns of a pulsar's fold results the badge rules are evaluated on
+BADGE_COLUMNS = {
+    "pipeline_run_id": "pipeline_run_id",
+    "rm": "pipeline_run__rm",
+    "rm_err": "pipeline_run__rm_err",
+    "dm": "pipeline_run__dm",
+    "p0": "observation__ephemeris__p0",
+    "nbin": "observation__fold_nbin",
+    "frequency": "observation__frequency",
+    "bandwidth": "observation__bandwidth",
+    "percent_rfi_zapped": "pipeline_run__percent_rfi_zapped",
+}
+
+
+@dataclass(frozen=True)
+class BadgeRule:
+    name: str
+    description: str
+    # Takes the columns of load_badge_columns and returns boolean arrays of the rows the rule was
+    # evaluated for and the rows that should have the badge. Rows that are not evaluated keep their badges.
+    evaluate: Callable
+    # Only ever add the badge, never remove it from rows that are no longer flagged
+    add_only: bool = False
+
+
+RULE_BADGES_CACHE_KEY = "badges:rule_badge_ids"
+# Seconds the badge ids of the rules are kept in the shared cache
+RULE_BADGES_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Badge name to the rule that assigns it to pipeline runs, in evaluation order
+BADGE_RULES = {}
+
+
+def register_badge_rule(name, description, add_only=False):
+    """
+    Decorator registering a vectorized evaluator as the rule for the named badge.
+    """
+
+    def decorator(evaluate):
+        BADGE_RULES[name] = BadgeRule(name=name, description=description, evaluate=evaluate, add_only=add_only)
+        return evaluate
+
+    return decorator
+
+
+def get_rule_badges():
+    """
+    Resolve the Badge id of every registered rule, creating any badges that are missing.
+
+    The ids are kept in the shared cache until a Badge is saved or deleted, so evaluating the rules
+    for a pipeline run does not look the badges up again.
+
+    Returns:
+        dict: Badge name to Badge id.
+    """
+    badge_ids = cache.get(RULE_BADGES_CACHE_KEY)
+    if badge_ids is not None and set(badge_ids) == set(BADGE_RULES):
+        return badge_ids
+
+    badge_ids = dict(Badge.objects.filter(name__in=list(BADGE_RULES)).values_list("name", "id"))
+    missing = [rule for name, rule in BADGE_RULES.items() if name not in badge_ids]
+    if missing:
+        Badge.objects.bulk_create(
+            [Badge(name=rule.name, description=rule.description) for rule in missing], ignore_conflicts=True
+        )
+        badge_ids = dict(Badge.objects.filter(name__in=list(BADGE_RULES)).values_list("name", "id"))
+    cache.set(RULE_BADGES_CACHE_KEY, badge_ids, RULE_BADGES_CACHE_TIMEOUT)
+    return badge_ids
+
+
+def clear_rule_badges_cache():
+    cache.delete(RULE_BADGES_CACHE_KEY)
+
+
+def load_badge_columns(pulsar, main_project):
+    """
+    Load the columns the badge rules need for all of a pulsar's fold results in one query.
+
+    Returns:
+        dict: Column name to a float NumPy array (NaN where the value is null), except pipeline_run_id
+        which is an integer array.
+    """
+    rows = list(
+        PulsarFoldResult.objects.filter(pulsar=pulsar, observation__project__main_project=main_project).values_list(
+            *BADGE_COLUMNS.values()
+        )
+    )
+    columns = {}
+    for index, name in enumerate(BADGE_COLUMNS):
+        values = [row[index] for row in rows]
+        if name == "pipeline_run_id":
+            columns[name] = np.array(values, dtype=np.int64)
+        else:
+            columns[name] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return columns
+
+
+# Add only as the badge always has been, so it isn't taken away from runs that were badged before
+@register_badge_rule("Strong RFI", "Over 20% of RFI removed from observation", add_only=True)
+def strong_rfi(columns):
+    """
+    Flag pipeline runs that removed over 20% of the observation as RFI.
+    """
+    percent_rfi_zapped = columns["percent_rfi_zapped"]
+    evaluated = ~np.isnan(percent_rfi_zapped)
+    with np.errstate(invalid="ignore"):
+        flagged = evaluated & (percent_rfi_zapped > 0.2)
+    return evaluated, flagged
+
+
+@register_badge_rule(
+    "RM Drift", "The Rotation Measure has drifted three weighted standard deviations from the weighted mean"
+)
+def rm_drift(columns):
+    """
+    Flag pipeline runs whose RM is more than three weighted standard deviations from the weighted mean RM.
+
+    Returns:
+        tuple: Boolean arrays of the rows the rule was evaluated for and the rows that should have the badge.
+    """
+    rm = columns["rm"]
+    rm_err = columns["rm_err"]
+    weighted = ~np.isnan(rm) & ~np.isnan(rm_err)
+    if not weighted.any():
+        return np.zeros_like(weighted), np.zeros_like(weighted)
+
+    rm_weights = 1 / (rm_err[weighted] ** 2)
+    rm_weights /= np.sum(rm_weights)
+    rm_mean = np.average(rm[weighted], weights=rm_weights)
+    rm_std = np.sqrt(np.average((rm[weighted] - rm_mean) ** 2, weights=rm_weights))
+
+    evaluated = ~np.isnan(rm)
+    with np.errstate(invalid="ignore"):
+        flagged = evaluated & (np.abs(rm - rm_mean) > 3 * rm_std) & (rm_std != 0)
+    return evaluated, flagged
+
+
+@register_badge_rule(
+    "DM Drift",
+    "The DM has drifted away from the median DM of the pulsar enough to cause a dispersion of three profile bins",
+)
+def dm_drift(columns):
+    """
+    Flag pipeline runs whose DM is far enough from the pulsar's median DM to disperse the profile by three bins.
+
+    Returns:
+        tuple: Boolean arrays of the rows the rule was evaluated for and the rows that should have the badge.
+    """
+    dm = columns["dm"]
+    has_dm = ~np.isnan(dm)
+    if not has_dm.any():
+        return has_dm, has_dm.copy()
+
+    dm_median = np.median(dm[has_dm])
+    # The duration of a bin in milliseconds and the DM required to cause a dispersion of one bin
+    bin_duration_ms = columns["p0"] / columns["nbin"] * 1000
+    dm_dispersion = bin_duration_ms * columns["frequency"] ** 3 / (8.3 * 10.0**6 * columns["bandwidth"])
+
+    evaluated = has_dm & np.isfinite(dm_dispersion)
+    with np.errstate(invalid="ignore"):
+        flagged = evaluated & (np.abs(dm - dm_median) > 3 * dm_dispersion)
+    return evaluated, flagged
+
+
+def apply_badge_changes(badge_id, pipeline_run_ids, evaluated, flagged, dry_run=False):
+    """
+    Bring the badge assignments of the evaluated pipeline runs in line with the flagged ones.
+
+    Only the difference against the current assignments is written, with one bulk insert into and one
+    delete from the PipelineRun.badges through table.
+
+    Returns:
+        tuple: The sets of pipeline run ids the badge was (or with dry_run, would be) added to and removed from.
+    """
+    evaluated_ids = set(pipeline_run_ids[evaluated].tolist())
+    flagged_ids = set(pipeline_run_ids[flagged].tolist())
+    if not evaluated_ids:
+        return set(), set()
+
+    through = PipelineRun.badges.through
+    current_ids = set(
+        through.objects.filter(badge_id=badge_id, pipelinerun_id__in=evaluated_ids).values_list(
+            "pipelinerun_id", flat=True
+        )
+    )
+    to_add = flagged_ids - current_ids
+    to_remove = (evaluated_ids - flagged_ids) & current_ids
+    if dry_run:
+        return to_add, to_remove
+
+    with transaction.atomic():
+        if to_add:
+            through.objects.bulk_create(
+                [through(pipelinerun_id=pipeline_run_id, badge_id=badge_id) for pipeline_run_id in to_add],
+                ignore_conflicts=True,
+            )
+        if to_remove:
+            through.objects.filter(badge_id=badge_id, pipelinerun_id__in=to_remove).delete()
+    return to_add, to_remove
+
+
+def update_pulsar_badges(pulsar, main_project, badges=None, dry_run=False):
+    """
+    Re-evaluate every registered badge rule for the fold results of a pulsar within a main project.
+
+    Parameters:
+        pulsar: Pulsar django model or id
+        main_project: MainProject django model or id
+        badges: dict, optional
+            Badge name to Badge id, as returned by get_rule_badges.
+        dry_run: bool
+            Work out the changes without writing them.
+
+    Returns:
+        dict: Badge name to the (added, removed) sets of pipeline run ids.
+    """
+    if badges is None:
+        badges = get_rule_badges()
+
+    columns = load_badge_columns(pulsar, main_project)
+    changes = {}
+    for name, rule in BADGE_RULES.items():
+        evaluated, flagged = rule.evaluate(columns)
+        if rule.add_only:
+            evaluated = flagged
+        changes[name] = apply_badge_changes(badges[name], columns["pipeline_run_id"], evaluated, flagged, dry_run)
+    return changes
@@ -0,0 +1,158 @@
+import hashlib
+import itertools
+import json
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.core.cache import cache
+
+from utils.ephemeris import parse_ephemeris_file
+
+# Number of parsed ephemerides each process keeps in memory
+EPHEMERIS_CACHE_SIZE = 256
+# Seconds a parsed ephemeris is kept in the shared cache
+EPHEMERIS_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Bump when parse_ephemeris_file changes its output so stale shared entries are ignored
+EPHEMERIS_CACHE_VERSION = 1
+
+
+def is_ephemeris_text(ephemeris_text):
+    """
+    Mirror the check parse_ephemeris_file uses to tell par file text from a path to a par file.
+    """
+    return "PSR" in ephemeris_text and "\n" in ephemeris_text
+
+
+@lru_cache(maxsize=EPHEMERIS_CACHE_SIZE)
+def _get_ephemeris_json(ephemeris_text):
+    cache_key = f"ephemeris:{hashlib.sha256(ephemeris_text.encode('utf-8')).hexdigest()}"
+    ephemeris_json = cache.get(cache_key, version=EPHEMERIS_CACHE_VERSION)
+    if ephemeris_json is None:
+        ephemeris_json = json.dumps(parse_ephemeris_file(ephemeris_text))
+        cache.set(cache_key, ephemeris_json, EPHEMERIS_CACHE_TIMEOUT, version=EPHEMERIS_CACHE_VERSION)
+    return ephemeris_json
+
+
+def get_parsed_ephemeris(ephemeris_text):
+    """
+    Parse the text of a tempo2 par file, only parsing each distinct text once.
+
+    Parsed ephemerides are kept in a bounded in-process LRU cache backed by the shared (Redis) cache,
+    so a par file that is uploaded with every observation is only parsed once across all workers.
+    Paths to par files are always parsed as the file may have changed.
+
+    Args:
+        ephemeris_text (str): The par file text or a path to a par file.
+
+    Returns:
+        dict: A new copy of the parsed ephemeris which the caller is free to modify.
+    """
+    if not is_ephemeris_text(ephemeris_text):
+        return parse_ephemeris_file(ephemeris_text)
+    return json.loads(_get_ephemeris_json(ephemeris_text))
+
+
+def clear_ephemeris_cache():
+    """
+    Empty the in-process ephemeris cache, the shared cache entries expire on their own.
+    """
+    _get_ephemeris_json.cache_clear()
+
+
+# Seconds a user's project memberships are kept in the shared cache
+MEMBERSHIP_CACHE_TIMEOUT = 60
+# Number of users whose membership changes each process keeps track of
+MEMBERSHIP_LOCAL_VERSIONS_SIZE = 10000
+# Per-process version of the memberships of the users whose memberships most recently changed, which makes
+# resolved memberships held on a user object stale as soon as they change in this process
+_local_membership_versions = OrderedDict()
+_membership_changes = itertools.count(1)
+# The version of every user without a local version, raised as users are evicted so memberships resolved
+# before an evicted user's change are still stale
+_evicted_membership_version = 0
+
+
+def _get_version(version_key):
+    # A missing version starts from the current time rather than zero, so entries cached under a version
+    # that has since been evicted can't be picked up again
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key, time.time_ns())
+    return version
+
+
+def _bump_version(version_key):
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, time.time_ns(), None)
+
+
+def get_membership_version(user_id):
+    """
+    The shared version of a user's memberships, which changes whenever one of them is saved or deleted.
+    """
+    return _get_version(f"memberships:version:{user_id}")
+
+
+def bump_membership_version(user_id):
+    """
+    Invalidate the cached memberships of a user, in this process and in the shared cache.
+    """
+    global _evicted_membership_version
+    _local_membership_versions[user_id] = next(_membership_changes)
+    _local_membership_versions.move_to_end(user_id)
+    while len(_local_membership_versions) > MEMBERSHIP_LOCAL_VERSIONS_SIZE:
+        _, _evicted_membership_version = _local_membership_versions.popitem(last=False)
+    _bump_version(f"memberships:version:{user_id}")
+
+
+def get_project_memberships(user, load=True):
+    """
+    Resolve a user's project memberships once per request.
+
+    The memberships are held on the user object, which is created for each request, and in the shared
+    (Redis) cache for a short time under the user's membership version, so they are only looked up again
+    once a membership of the user changes.
+
+    Args:
+        user: The user, which may be anonymous.
+        load (bool): Query the database if the memberships aren't cached, otherwise return None.
+
+    Returns:
+        dict: Project id to a (role, is_active) tuple for each of the user's memberships.
+    """
+    if not user.is_authenticated:
+        return {}
+    local_version = _local_membership_versions.get(user.id, _evicted_membership_version)
+    resolved = getattr(user, "_project_memberships", None)
+    if resolved is not None and resolved[0] == local_version:
+        return resolved[1]
+
+    cache_key = f"memberships:{user.id}"
+    version = get_membership_version(user.id)
+    memberships = cache.get(cache_key, version=version)
+    if memberships is None:
+        if not load:
+            return None
+        # Imported here as the models import this module
+        from dataportal.models import ProjectMembership
+
+        memberships = {
+            project_id: (role, is_active)
+            for project_id, role, is_active in ProjectMembership.objects.filter(user=user).values_list(
+                "project_id", "role", "is_active"
+            )
+        }
+        cache.set(cache_key, memberships, MEMBERSHIP_CACHE_TIMEOUT, version=version)
+    user._project_memberships = (local_version, memberships)
+    return memberships
+
+
+def get_active_project_ids(user):
+    """
+    The ids of the projects a user is an active member of, see get_project_memberships.
+    """
+    return frozenset(project_id for project_id, (_, is_active) in get_project_memberships(user).items() if is_active)
@@ -1,15 +1,12 @@
-import json
 from decimal import Decimal
 
 import graphene
 from django.contrib.postgres.fields import JSONField
-from django.db import IntegrityError
 from graphene_django.converter import convert_django_field
 
 from dataportal.graphql.queries import EphemerisNode
 from dataportal.models import Ephemeris, Project, Pulsar
 from user_manage.graphql.decorators import permission_required
-from utils.ephemeris import parse_ephemeris_file
 
 
 @convert_django_field.register(JSONField)
@@ -43,29 +40,10 @@ class CreateEphemeris(graphene.Mutation):
             # Should have a project code or short so I can't create an ephemeris
             project = None
 
-        # Load the ephemeris file
-        ephemeris_dict = parse_ephemeris_file(input["ephemerisText"])
-        try:
-            ephemeris, _ = Ephemeris.objects.get_or_create(
-                pulsar=pulsar,
-                project=project,
-                # TODO add created_by
-                ephemeris_data=json.dumps(ephemeris_dict),
-                p0=ephemeris_dict["P0"],
-                dm=ephemeris_dict["DM"],
-                valid_from=ephemeris_dict["START"],
-                valid_to=ephemeris_dict["FINISH"],
-                comment=input["comment"],
-            )
-            return CreateEphemeris(ephemeris=ephemeris)
-        except IntegrityError:
-            # Handle the IntegrityError gracefully by grabbing the already created ephem
-            ephemeris = Ephemeris.objects.get(
-                pulsar=pulsar,
-                project=project,
-                ephemeris_data=json.dumps(ephemeris_dict),
-            )
-            return CreateEphemeris(ephemeris=ephemeris)
+        ephemeris = Ephemeris.get_or_create_from_text(
+            pulsar, project, input["ephemerisText"], comment=input["comment"]
+        )
+        return CreateEphemeris(ephemeris=ephemeris)
 
 
 class UpdateEphemeris(graphene.Mutation):
@@ -1,12 +1,10 @@
-import json
-
 import graphene
-from django.db import IntegrityError
+from django.db import transaction
 
-from dataportal.graphql.queries import ObservationNode
-from dataportal.models import Calibration, Ephemeris, Observation, Project, Pulsar, Telescope
+from dataportal.graphql.queries import IngestJobNode, ObservationNode
+from dataportal.models import Calibration, Ephemeris, IngestJob, Observation, Project, Pulsar, Telescope
+from dataportal.signals import update_observation_summaries
 from user_manage.graphql.decorators import permission_required
-from utils.ephemeris import parse_ephemeris_file
 
 
 class ObservationInput(graphene.InputObjectType):
@@ -47,122 +45,177 @@ class ObservationInput(graphene.InputObjectType):
     filterbankDm = graphene.Float()
 
 
+def observation_defaults(input, calibration, ephemeris):
+    """
+    The Observation field values set from an ObservationInput, other than the fields it is matched on.
+    """
+    defaults = {
+        "calibration": calibration,
+        "frequency": input["frequency"],
+        "bandwidth": input["bandwidth"],
+        "nchan": input["nchan"],
+        "nant": input["nant"],
+        "nant_eff": input["nantEff"],
+        "npol": input["npol"],
+        "obs_type": input["obsType"],
+        "raj": input["raj"],
+        "decj": input["decj"],
+        "duration": input["duration"],
+        "nbit": input["nbit"],
+        "tsamp": input["tsamp"],
+        # Fold mode specific values
+        "ephemeris": ephemeris,
+        "fold_nbin": None,
+        "fold_nchan": None,
+        "fold_tsubint": None,
+        # Backend search values
+        "filterbank_nbit": None,
+        "filterbank_npol": None,
+        "filterbank_nchan": None,
+        "filterbank_tsamp": None,
+        "filterbank_dm": None,
+    }
+    if input["obsType"] == "fold":
+        defaults["fold_nbin"] = input["foldNbin"]
+        defaults["fold_nchan"] = input["foldNchan"]
+        defaults["fold_tsubint"] = input["foldTsubint"]
+    if input["obsType"] == "search":
+        defaults["filterbank_nbit"] = input["filterbankNbit"]
+        defaults["filterbank_npol"] = input["filterbankNpol"]
+        defaults["filterbank_nchan"] = input["filterbankNchan"]
+        defaults["filterbank_tsamp"] = input["filterbankTsamp"]
+        defaults["filterbank_dm"] = input["filterbankDm"]
+    return defaults
+
+
+def in_bulk_or_raise(queryset, values, field_name):
+    """
+    Fetch the instances with the given values of a unique field in one query, raising
+    DoesNotExist like a get() would if any of them are missing.
+    """
+    instances = queryset.in_bulk(values, field_name=field_name)
+    missing = set(values) - set(instances)
+    if missing:
+        raise queryset.model.DoesNotExist(
+            f"{queryset.model.__name__} matching {field_name} {sorted(missing)} does not exist."
+        )
+    return instances
+
+
+def get_observation_foreign_keys(input):
+    pulsar = Pulsar.objects.get(name=input["pulsarName"])
+    telescope = Telescope.objects.get(name=input["telescopeName"])
+    project = Project.objects.get(code=input["projectCode"])
+    calibration = Calibration.objects.get(id=input["calibrationId"])
+    return pulsar, telescope, project, calibration
+
+
+def create_or_update_observation(input):
+    """
+    Create the observation described by an ObservationInput, or update it if it already exists.
+    """
+    # Get foreign key models
+    pulsar, telescope, project, calibration = get_observation_foreign_keys(input)
+
+    if input["obsType"] == "fold":
+        # Get Ephemeris from the ephemeris file
+        ephemeris = Ephemeris.get_or_create_from_text(pulsar, project, input["ephemerisText"])
+    else:
+        ephemeris = None
+    defaults = observation_defaults(input, calibration, ephemeris)
+
+    # Use get_or_create to create the observations with the required fields and everything else put as defaults
+    observation, created = Observation.objects.get_or_create(
+        pulsar=pulsar,
+        telescope=telescope,
+        project=project,
+        utc_start=input["utcStart"],
+        beam=input["beam"],
+        defaults=defaults,
+    )
+    if not created:
+        # If the observation already exists, update the values
+        for field, value in defaults.items():
+            setattr(observation, field, value)
+        observation.save()
+    return observation
+
+
 class CreateObservation(graphene.Mutation):
     class Arguments:
         input = ObservationInput()
+        # Queue the observation to be created by process_ingest_jobs and return the job instead
+        run_async = graphene.Boolean(default_value=False)
 
     observation = graphene.Field(ObservationNode)
+    ingest_job = graphene.Field(IngestJobNode)
 
     @permission_required("dataportal.add_observations")
-    def mutate(root, info, input=None):
+    def mutate(root, info, input=None, run_async=False):
+        if run_async:
+            # Check the foreign keys exist before queueing
+            get_observation_foreign_keys(input)
+            payload = dict(input)
+            if payload["utcStart"] is not None:
+                # Serialise the start time as the DateTime scalar would, as JSON would round it to milliseconds
+                payload["utcStart"] = graphene.DateTime.serialize(payload["utcStart"])
+            ingest_job = IngestJob.enqueue(IngestJob.OBSERVATION, payload, info.context.user)
+            return CreateObservation(observation=None, ingest_job=ingest_job)
+        return CreateObservation(observation=create_or_update_observation(input))
+
+
+class CreateObservations(graphene.Mutation):
+    """
+    Create or update a batch of observations.
+
+    Foreign keys are fetched with one query per model, the ephemerides, observations and summaries are written in one
+    transaction and each affected session and summary is recalculated once for the whole batch instead of once per
+    observation.
+    """
+
+    class Arguments:
+        inputs = graphene.List(graphene.NonNull(ObservationInput), required=True)
+
+    observations = graphene.List(ObservationNode)
+
+    @permission_required("dataportal.add_observations")
+    def mutate(root, info, inputs):
         # Get foreign key models
-        pulsar = Pulsar.objects.get(name=input["pulsarName"])
-        telescope = Telescope.objects.get(name=input["telescopeName"])
-        project = Project.objects.get(code=input["projectCode"])
-        calibration = Calibration.objects.get(id=input["calibrationId"])
+        pulsars = in_bulk_or_raise(Pulsar.objects.all(), {input["pulsarName"] for input in inputs}, "name")
+        telescopes = in_bulk_or_raise(Telescope.objects.all(), {input["telescopeName"] for input in inputs}, "name")
+        projects = in_bulk_or_raise(
+            Project.objects.select_related("main_project"), {input["projectCode"] for input in inputs}, "code"
+        )
+        calibrations = in_bulk_or_raise(Calibration.objects.all(), {input["calibrationId"] for input in inputs}, "id")
 
-        # Fold mode specific values
-        if input["obsType"] == "fold":
-            # Get Ephemeris from the ephemeris file
-            ephemeris_dict = parse_ephemeris_file(input["ephemerisText"])
-            try:
-                ephemeris, _ = Ephemeris.objects.get_or_create(
-                    pulsar=pulsar,
-                    project=project,
-                    # TODO add created_by
-                    ephemeris_data=json.dumps(ephemeris_dict),
-                    p0=ephemeris_dict["P0"],
-                    dm=ephemeris_dict["DM"],
-                    valid_from=ephemeris_dict["START"],
-                    valid_to=ephemeris_dict["FINISH"],
-                )
-            except IntegrityError:
-                # Handle the IntegrityError gracefully by grabbing the already created ephem
-                ephemeris = Ephemeris.objects.get(
-                    project=project,
-                    ephemeris_data=json.dumps(ephemeris_dict),
+        with transaction.atomic():
+            ephemerides = {}
+            observations = []
+            for input in inputs:
+                pulsar = pulsars[input["pulsarName"]]
+                project = projects[input["projectCode"]]
+                if input["obsType"] == "fold":
+                    # Observations of a pulsar share a handful of ephemerides so only look up each once
+                    ephemeris_key = (pulsar, project, input["ephemerisText"])
+                    if ephemeris_key not in ephemerides:
+                        ephemerides[ephemeris_key] = Ephemeris.get_or_create_from_text(*ephemeris_key)
+                    ephemeris = ephemerides[ephemeris_key]
+                else:
+                    ephemeris = None
+                observations.append(
+                    Observation(
+                        pulsar=pulsar,
+                        telescope=telescopes[input["telescopeName"]],
+                        project=project,
+                        utc_start=input["utcStart"],
+                        beam=input["beam"],
+                        **observation_defaults(input, calibrations[input["calibrationId"]], ephemeris),
+                    )
                 )
-            fold_nbin = input["foldNbin"]
-            fold_nchan = input["foldNchan"]
-            fold_tsubint = input["foldTsubint"]
-        else:
-            ephemeris = None
-            fold_nbin = None
-            fold_nchan = None
-            fold_tsubint = None
 
-        # Backend search values
-        if input["obsType"] == "search":
-            filterbank_nbit = input["filterbankNbit"]
-            filterbank_npol = input["filterbankNpol"]
-            filterbank_nchan = input["filterbankNchan"]
-            filterbank_tsamp = input["filterbankTsamp"]
-            filterbank_dm = input["filterbankDm"]
-        else:
-            filterbank_nbit = None
-            filterbank_npol = None
-            filterbank_nchan = None
-            filterbank_tsamp = None
-            filterbank_dm = None
-
-        # Use get_or_create to create the observations with the required fields and everything else put as defaults
-        observation, created = Observation.objects.get_or_create(
-            pulsar=pulsar,
-            telescope=telescope,
-            project=project,
-            utc_start=input["utcStart"],
-            beam=input["beam"],
-            defaults={
-                "calibration": calibration,
-                "frequency": input["frequency"],
-                "bandwidth": input["bandwidth"],
-                "nchan": input["nchan"],
-                "nant": input["nant"],
-                "nant_eff": input["nantEff"],
-                "npol": input["npol"],
-                "obs_type": input["obsType"],
-                "raj": input["raj"],
-                "decj": input["decj"],
-                "duration": input["duration"],
-                "nbit": input["nbit"],
-                "tsamp": input["tsamp"],
-                "ephemeris": ephemeris,
-                "fold_nbin": fold_nbin,
-                "fold_nchan": fold_nchan,
-                "fold_tsubint": fold_tsubint,
-                "filterbank_nbit": filterbank_nbit,
-                "filterbank_npol": filterbank_npol,
-                "filterbank_nchan": filterbank_nchan,
-                "filterbank_tsamp": filterbank_tsamp,
-                "filterbank_dm": filterbank_dm,
-            },
-        )
-        if not created:
-            # If the observation already exists, update the values
-            observation.calibration = calibration
-            observation.frequency = input["frequency"]
-            observation.bandwidth = input["bandwidth"]
-            observation.nchan = input["nchan"]
-            observation.nant = input["nant"]
-            observation.nant_eff = input["nantEff"]
-            observation.npol = input["npol"]
-            observation.obs_type = input["obsType"]
-            observation.raj = input["raj"]
-            observation.decj = input["decj"]
-            observation.duration = input["duration"]
-            observation.nbit = input["nbit"]
-            observation.tsamp = input["tsamp"]
-            observation.ephemeris = ephemeris
-            observation.fold_nbin = fold_nbin
-            observation.fold_nchan = fold_nchan
-            observation.fold_tsubint = fold_tsubint
-            observation.filterbank_nbit = filterbank_nbit
-            observation.filterbank_npol = filterbank_npol
-            observation.filterbank_nchan = filterbank_nchan
-            observation.filterbank_tsamp = filterbank_tsamp
-            observation.filterbank_dm = filterbank_dm
-            observation.save()
-        return CreateObservation(observation=observation)
+            observations = Observation.bulk_upsert(observations)
+            update_observation_summaries(observations)
+        return CreateObservations(observations=observations)
 
 
 class UpdateObservation(graphene.Mutation):
@@ -198,5 +251,6 @@ class DeleteObservation(graphene.Mutation):
 
 class Mutation(graphene.ObjectType):
     createObservation = CreateObservation.Field()
+    createObservations = CreateObservations.Field()
     updateObservation = UpdateObservation.Field()
     deleteObservation = DeleteObservation.Field()
@@ -1,7 +1,7 @@
 import graphene
 
-from dataportal.graphql.queries import ToaNode
-from dataportal.models import Toa
+from dataportal.graphql.queries import IngestJobNode, ToaNode
+from dataportal.models import IngestJob, PipelineRun, Project, Template, Toa
 from user_manage.graphql.decorators import permission_required
 
 
@@ -23,29 +23,43 @@ class ToaInput(graphene.InputObjectType):
 
 class CreateToaOutput(graphene.ObjectType):
     toa = graphene.List(ToaNode)
+    ingest_job = graphene.Field(IngestJobNode)
+
+
+def create_toas(input):
+    return Toa.bulk_create(
+        pipeline_run_id=input["pipelineRunId"],
+        project_short=input["projectShort"],
+        template_id=input["templateId"],
+        ephemeris_text=input["ephemerisText"],
+        toa_lines=input["toaLines"],
+        dm_corrected=input["dmCorrected"],
+        nsub_type=input["nsubType"],
+        npol=input["obsNpol"],
+        nchan=input["obsNchan"],
+    )
 
 
 class CreateToa(graphene.Mutation):
     class Arguments:
         input = ToaInput(required=True)
+        # Queue the ToAs to be created by process_ingest_jobs and return the job instead
+        run_async = graphene.Boolean(default_value=False)
 
     toa = graphene.List(ToaNode)
     Output = CreateToaOutput
 
     @permission_required("dataportal.add_toa")
-    def mutate(root, info, input):
-        created_toas = Toa.bulk_create(
-            pipeline_run_id=input["pipelineRunId"],
-            project_short=input["projectShort"],
-            template_id=input["templateId"],
-            ephemeris_text=input["ephemerisText"],
-            toa_lines=input["toaLines"],
-            dm_corrected=input["dmCorrected"],
-            nsub_type=input["nsubType"],
-            npol=input["obsNpol"],
-            nchan=input["obsNchan"],
-        )
-        return CreateToaOutput(toa=created_toas)
+    def mutate(root, info, input, run_async=False):
+        if run_async:
+            # Check the foreign keys exist and the lines are valid before queueing
+            PipelineRun.objects.get(id=input["pipelineRunId"])
+            project = Project.objects.get(short=input["projectShort"])
+            Template.objects.get(id=input["templateId"])
+            Toa.parse_lines(input["toaLines"], project)
+            ingest_job = IngestJob.enqueue(IngestJob.TOA, dict(input), info.context.user)
+            return CreateToaOutput(toa=None, ingest_job=ingest_job)
+        return CreateToaOutput(toa=create_toas(input))
 
 
 class UpdateToa(graphene.Mutation):
@@ -15,18 +15,19 @@ from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField, TypedFilter
 from graphql import GraphQLError
 
+from dataportal.caching import get_active_project_ids
 from dataportal.file_utils import get_file_list
 from dataportal.models import (
     Badge,
     Calibration,
     Ephemeris,
+    IngestJob,
     MainProject,
     Observation,
     ObservationSummary,
     PipelineImage,
     PipelineRun,
     Project,
-    ProjectMembership,
     Pulsar,
     PulsarFoldResult,
     PulsarFoldSummary,
@@ -59,6 +60,9 @@ def _observation_is_accessible(observation, request):
         return observation._is_accessible
     if request.user.is_superuser:
         return True
+    # Anonymous users see the data released by update_public_flags, as in the access policies
+    if not request.user.is_authenticated:
+        return observation.is_public
 
     request_now = getattr(request, "_dataportal_access_check_now", None)
     if request_now is None:
@@ -68,25 +72,7 @@ def _observation_is_accessible(observation, request):
     if observation.embargo_end_date is None or observation.embargo_end_date < request_now:
         return True
 
-    # After here we need to ensure no authenticated user can access, so we can skip the database query for
-    # unauthenticated users. In short annoymous users can't have project memeberships.
-    if not request.user.is_authenticated:
-        return False
-
-    membership_project_ids = getattr(request, "_dataportal_membership_project_ids", None)
-    membership_user_id = getattr(request, "_dataportal_membership_project_user_id", None)
-    current_user_id = request.user.id
-    if membership_project_ids is None or membership_user_id != current_user_id:
-        membership_project_ids = set(
-            ProjectMembership.objects.filter(
-                user=request.user,
-                is_active=True,
-            ).values_list("project_id", flat=True)
-        )
-        request._dataportal_membership_project_ids = membership_project_ids
-        request._dataportal_membership_project_user_id = current_user_id
-
-    return observation.project_id in membership_project_ids
+    return observation.project_id in get_active_project_ids(request.user)
 
 
 ###################################
@@ -1258,9 +1244,7 @@ class PulsarFoldResultConnection(relay.Connection):
             return None
 
         # Check if the ephemeris is embargoed
-        now = timezone.now()
-        embargo_end_date = ephemeris.created_at + ephemeris.project.embargo_period
-        return embargo_end_date >= now
+        return ephemeris.is_embargoed
 
     def resolve_folding_ephemeris_exists_but_inaccessible(self, instance):
         """
@@ -1602,9 +1586,13 @@ class PipelineImageNode(DjangoObjectType):
         return queryset.accessible_to(info.context.user)
 
     def resolve_pulsar_fold_result(self, info):
-        if self.pulsar_fold_result.observation.is_restricted(info.context.user):
-            return None
-        return self.pulsar_fold_result
+        # Images from PipelineImage.objects.accessible_to are flagged, so only images loaded some other way are
+        # checked here, by id rather than by loading the observation
+        if hasattr(self, "_observation_is_accessible"):
+            is_accessible = self._observation_is_accessible
+        else:
+            is_accessible = not Observation.restricted_ids(info.context.user, [self.pulsar_fold_result.observation_id])
+        return self.pulsar_fold_result if is_accessible else None
 
 
 class ToaConnection(relay.Connection):
@@ -1799,6 +1787,31 @@ class ToaNode(DjangoObjectType):
         return self.template
 
 
+class IngestJobNode(DjangoObjectType):
+    class Meta:
+        model = IngestJob
+        fields = [
+            "job_type",
+            "state",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "attempts",
+            "row_count",
+            "error",
+        ]
+
+    id_int = graphene.Int()
+    # Seconds the job took to run
+    duration = graphene.Float()
+
+    def resolve_id_int(self, info):
+        return self.id
+
+    def resolve_duration(self, info):
+        return self.duration
+
+
 class Query(graphene.ObjectType):
     node = relay.Node.Field()
 
@@ -1952,7 +1965,7 @@ class Query(graphene.ObjectType):
 
     @login_required
     def resolve_pipeline_image(self, info, **kwargs):
-        return PipelineImage.objects.accessible_to(info.context.user)
+        return PipelineImage.objects.accessible_to(info.context.user).select_related("pulsar_fold_result")
 
     toa = DjangoFilterConnectionField(
         ToaNode,
@@ -1972,6 +1985,15 @@ class Query(graphene.ObjectType):
 
         return queryset.accessible_to(info.context.user).order_by("mjd")
 
+    ingest_job = graphene.Field(IngestJobNode, id=graphene.Int(required=True))
+
+    @login_required
+    def resolve_ingest_job(self, info, id):
+        # Only the user who queued a job (or a superuser) can follow it
+        user = info.context.user
+        queryset = IngestJob.objects.all() if user.is_superuser else IngestJob.objects.filter(created_by=user)
+        return queryset.filter(id=id).first()
+
     badge = DjangoFilterConnectionField(BadgeNode)
 
     @login_required
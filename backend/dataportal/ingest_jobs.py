@@ -0,0 +1,116 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+import graphene
+from django.db import connection, transaction
+
+from dataportal.graphql.mutation_tables.observation import create_or_update_observation
+from dataportal.graphql.mutation_tables.toa import create_toas
+from dataportal.models import INGEST_JOB_HEARTBEAT_INTERVAL, IngestJob, Toa
+
+logger = logging.getLogger(__name__)
+
+
+def run_toa_job(payload):
+    return len(create_toas(payload))
+
+
+def run_residual_job(payload):
+    return len(Toa.update_residuals(payload["residualLines"]))
+
+
+def run_observation_job(payload):
+    # The payload was stored as JSON so the start time is the ISO 8601 string the DateTime scalar serialised
+    utc_start = payload.get("utcStart")
+    if utc_start is not None:
+        utc_start = graphene.DateTime.parse_value(utc_start)
+    create_or_update_observation(dict(payload, utcStart=utc_start))
+    return 1
+
+
+class IngestJobLost(Exception):
+    """
+    Raised when a worker no longer holds the job it is running.
+    """
+
+
+# Job type to the function that runs the job's payload and returns the number of rows it wrote
+INGEST_JOB_HANDLERS = {
+    IngestJob.TOA: run_toa_job,
+    IngestJob.RESIDUAL: run_residual_job,
+    IngestJob.OBSERVATION: run_observation_job,
+}
+
+
+@contextmanager
+def heartbeat(job):
+    """
+    Renew the lease of the job from a background thread until the block exits.
+
+    Yields:
+        threading.Event: Set once the lease is lost, e.g. the job was claimed again by another worker.
+    """
+    stop = threading.Event()
+    lease_lost = threading.Event()
+
+    def renew_lease():
+        try:
+            while not stop.wait(INGEST_JOB_HEARTBEAT_INTERVAL.total_seconds()):
+                if not job.renew_lease():
+                    lease_lost.set()
+                    break
+        except Exception:
+            logger.exception(f"heartbeat: could not renew the lease of {job.job_type} job {job.id}")
+        finally:
+            # The thread has its own database connection
+            connection.close()
+
+    thread = threading.Thread(target=renew_lease, daemon=True)
+    thread.start()
+    try:
+        yield lease_lost
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_ingest_job(job):
+    """
+    Run a claimed job in a transaction and record whether it succeeded.
+
+    A job that raises is marked as failed with the error and none of its writes are kept. The lease of the job is
+    renewed while it runs so other workers don't claim it again. If the lease is lost anyway, the job is left to the
+    worker that claimed it again and none of its writes are kept.
+    """
+    try:
+        with heartbeat(job) as lease_lost, transaction.atomic():
+            row_count = INGEST_JOB_HANDLERS[job.job_type](job.payload)
+            # Finishing in the same transaction locks the job row, so the writes are only committed if this attempt
+            # still holds the job
+            if lease_lost.is_set() or not job.finish(IngestJob.SUCCEEDED, row_count=row_count):
+                raise IngestJobLost()
+    except IngestJobLost:
+        logger.warning(
+            f"run_ingest_job: {job.job_type} job {job.id} was claimed again, discarding attempt {job.attempts}"
+        )
+    except Exception as e:
+        logger.exception(f"run_ingest_job: {job.job_type} job {job.id} failed")
+        job.finish(IngestJob.FAILED, error=str(e))
+    return job
+
+
+def process_ingest_jobs(max_jobs=None):
+    """
+    Claim and run queued jobs until the queue is empty or max_jobs have been run.
+
+    Returns:
+        list: The jobs that were run.
+    """
+    jobs = []
+    while max_jobs is None or len(jobs) < max_jobs:
+        job = IngestJob.claim()
+        if job is None:
+            break
+        jobs.append(run_ingest_job(job))
+    return jobs
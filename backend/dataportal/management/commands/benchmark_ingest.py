@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from benchmarks.ingest import IngestBenchmark, IngestBenchmarkConfig
+
+
+class RollbackBenchmark(Exception):
+    """Raised to roll back everything the benchmark wrote."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the ingest mutations, the post_save signal cascade and the summary recalculations on a "
+        "synthetic dataset and write rows/sec, query counts and peak memory per stage to a JSON report. "
+        "Everything is written inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pulsars", type=int, default=10, help="Number of synthetic pulsars")
+        parser.add_argument("--observations", type=int, default=10, help="Number of observations of each pulsar")
+        parser.add_argument("--nchan", type=int, default=16, help="Number of channels of ToAs per observation")
+        parser.add_argument("--nsubint", type=int, default=8, help="Number of subints of ToAs per observation")
+        parser.add_argument(
+            "--binary-fraction", type=float, default=0.5, help="Fraction of the pulsars with a binary ephemeris"
+        )
+        parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="Also record the peak Python allocations of each stage with tracemalloc, which slows it down",
+        )
+        parser.add_argument("--output", default="ingest_benchmark.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        config = IngestBenchmarkConfig(
+            n_pulsars=options["pulsars"],
+            n_observations=options["observations"],
+            nchan=options["nchan"],
+            nsubint=options["nsubint"],
+            binary_fraction=options["binary_fraction"],
+            trace_memory=options["trace_memory"],
+        )
+        self.stdout.write(
+            f"Ingesting {config.n_pulsars} pulsars x {config.n_observations} observations x "
+            f"{config.nchan * config.nsubint} ToAs"
+        )
+
+        try:
+            with transaction.atomic():
+                report = IngestBenchmark(config).run()
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
+
+        for name, stage in report["stages"].items():
+            self.stdout.write(
+                f"{name:<24} {stage['seconds']:8.3f} s {stage['rows_per_sec'] or 0:10.0f} rows/s "
+                f"{stage['queries']:8d} queries {stage['peak_rss_mb']:8.1f} MB peak RSS"
+            )
+        with open(options["output"], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote the report to {options['output']}"))
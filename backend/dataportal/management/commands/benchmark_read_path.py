@@ -0,0 +1,72 @@
+import json
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from benchmarks.ingest import IngestBenchmark, IngestBenchmarkConfig
+from benchmarks.read_path import READ_PATH_OPERATIONS, ReadPathHarness, create_role_users, get_dataset
+
+
+class RollbackBenchmark(Exception):
+    """Raised to roll back everything the benchmark wrote."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the frontend's GraphQL operations as an anonymous user, a project member and a superuser "
+        "against a synthetic dataset and report p50/p95 latency, SQL queries and rows fetched per operation. "
+        "Everything is written inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pulsars", type=int, default=20, help="Number of synthetic pulsars")
+        parser.add_argument("--observations", type=int, default=20, help="Number of observations of each pulsar")
+        parser.add_argument("--nchan", type=int, default=4, help="Number of channels of ToAs per observation")
+        parser.add_argument("--nsubint", type=int, default=4, help="Number of subints of ToAs per observation")
+        parser.add_argument("--repeat", type=int, default=20, help="Number of times each operation is run per role")
+        parser.add_argument(
+            "--operation", nargs="+", choices=list(READ_PATH_OPERATIONS), help="Only replay these operations"
+        )
+        parser.add_argument("--output", default="read_path_benchmark.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        config = IngestBenchmarkConfig(
+            n_pulsars=options["pulsars"],
+            n_observations=options["observations"],
+            nchan=options["nchan"],
+            nsubint=options["nsubint"],
+        )
+        self.stdout.write(f"Building {config.n_pulsars} pulsars x {config.n_observations} observations")
+
+        try:
+            with transaction.atomic():
+                ingest = IngestBenchmark(config)
+                ingest.populate()
+                harness = ReadPathHarness(
+                    get_dataset(ingest.project),
+                    create_role_users(ingest.project),
+                    operations=options["operation"],
+                    repeat=options["repeat"],
+                )
+                results = harness.run()
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
+
+        for result in results:
+            self.stdout.write(
+                f"{result.operation:<24} {result.role:<10} p50 {result.p50_ms:8.1f} ms p95 {result.p95_ms:8.1f} ms "
+                f"{result.queries:4d} queries {result.rows_fetched:8d} rows"
+            )
+        with open(options["output"], "w") as report_file:
+            json.dump(
+                {
+                    "config": asdict(config),
+                    "repeat": options["repeat"],
+                    "operations": [asdict(result) for result in results],
+                },
+                report_file,
+                indent=2,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Wrote the report to {options['output']}"))
@@ -0,0 +1,182 @@
+import io
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from benchmarks.synthetic import make_ephemeris_text, make_toa_lines
+from dataportal.models import (
+    Calibration,
+    Ephemeris,
+    MainProject,
+    Observation,
+    PipelineRun,
+    Project,
+    Pulsar,
+    Telescope,
+    Template,
+    Toa,
+)
+from utils.toa import toa_dict_to_line, toa_line_to_dict
+
+
+class RollbackBenchmark(Exception):
+    """Raised to roll back everything the benchmark wrote."""
+
+
+def legacy_bulk_create(pipeline_run, project, template, ephemeris, toa_lines, dm_corrected, nsub_type, npol, nchan):
+    """
+    The previous ingest path, one update_or_create per ToA line, kept as the baseline.
+    """
+    created_toas = []
+    for toa_line in toa_lines:
+        if "FORMAT" in toa_line:
+            continue
+        toa_line = toa_line.rstrip("\n")
+        toa_dict = toa_line_to_dict(toa_line)
+        assert toa_line == toa_dict_to_line(toa_dict)
+        toa, _ = Toa.objects.update_or_create(
+            observation=pipeline_run.observation,
+            project=project,
+            dm_corrected=dm_corrected,
+            obs_npol=npol,
+            obs_nchan=nchan,
+            chan=toa_dict["chan"],
+            nsub_type=nsub_type,
+            subint=toa_dict["subint"],
+            defaults={
+                "pipeline_run": pipeline_run,
+                "ephemeris": ephemeris,
+                "template": template,
+                "archive": toa_dict["archive"],
+                "freq_MHz": toa_dict["freq_MHz"],
+                "mjd": toa_dict["mjd"],
+                "mjd_err": toa_dict["mjd_err"],
+                "telescope": toa_dict["telescope"],
+                "fe": toa_dict["fe"],
+                "be": toa_dict["be"],
+                "f": toa_dict["f"],
+                "bw": toa_dict["bw"],
+                "tobs": toa_dict["tobs"],
+                "tmplt": toa_dict["tmplt"],
+                "gof": toa_dict.get("gof", None),
+                "nbin": toa_dict["nbin"],
+                "snr": toa_dict["snr"],
+                "nch": toa_dict["nch"],
+                "rcvr": toa_dict["rcvr"],
+                "length": toa_dict["length"],
+            },
+        )
+        created_toas.append(toa)
+    return created_toas
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ToA ingest rows/sec for the legacy per-line update_or_create path against Toa.bulk_create "
+        "and Toa.copy_from_tim_file. "
+        "Everything is written inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--nchan", type=int, default=1024, help="Number of channels in the synthetic .tim file")
+        parser.add_argument("--nsubint", type=int, default=16, help="Number of subints in the synthetic .tim file")
+        parser.add_argument("--skip-legacy", action="store_true", help="Only time the set-based upsert")
+
+    def handle(self, *args, **options):
+        nchan = options["nchan"]
+        toa_lines = make_toa_lines(nchan, options["nsubint"])
+        n_rows = len(toa_lines) - 1
+        self.stdout.write(f"Ingesting {n_rows} ToAs ({nchan} channels x {options['nsubint']} subints)")
+
+        try:
+            with transaction.atomic():
+                pipeline_run, project, template, ephemeris, ephemeris_text = self.create_fixtures()
+
+                if not options["skip_legacy"]:
+                    # Use a separate dm_corrected key space so both paths measure inserts
+                    start = time.perf_counter()
+                    legacy_bulk_create(pipeline_run, project, template, ephemeris, toa_lines, True, "1", 1, nchan)
+                    self.report("legacy update_or_create (insert)", n_rows, time.perf_counter() - start)
+
+                for label in ["set-based upsert (insert)", "set-based upsert (update)"]:
+                    start = time.perf_counter()
+                    Toa.bulk_create(
+                        pipeline_run_id=pipeline_run.id,
+                        project_short=project.short,
+                        template_id=template.id,
+                        ephemeris_text=ephemeris_text,
+                        toa_lines=toa_lines,
+                        dm_corrected=False,
+                        nsub_type="1",
+                        npol=1,
+                        nchan=nchan,
+                    )
+                    self.report(label, n_rows, time.perf_counter() - start)
+
+                tim_bytes = "".join(toa_lines).encode()
+                for label in ["COPY from .tim file (insert)", "COPY from .tim file (update)"]:
+                    start = time.perf_counter()
+                    Toa.copy_from_tim_file(
+                        tim_file=io.BytesIO(tim_bytes),
+                        pipeline_run_id=pipeline_run.id,
+                        project_short=project.short,
+                        template_id=template.id,
+                        ephemeris_text=ephemeris_text,
+                        dm_corrected=False,
+                        # Use a separate key space so the first pass measures inserts
+                        nsub_type="all",
+                        npol=1,
+                        nchan=nchan,
+                    )
+                    self.report(label, n_rows, time.perf_counter() - start)
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
+
+    def report(self, label, n_rows, seconds):
+        self.stdout.write(f"{label:<36} {seconds:8.3f} s {n_rows / seconds:12.0f} rows/s")
+
+    def create_fixtures(self):
+        telescope, _ = Telescope.objects.get_or_create(name="Benchmark Telescope")
+        main_project, _ = MainProject.objects.get_or_create(name="Benchmark", telescope=telescope)
+        project, _ = Project.objects.get_or_create(
+            code="BENCHMARK-TOA", defaults={"short": "BENCHTOA", "main_project": main_project}
+        )
+        pulsar, _ = Pulsar.objects.get_or_create(name="J0437-4715")
+        calibration = Calibration.objects.create(schedule_block_id="benchmark", calibration_type="pre")
+        observation = Observation.objects.create(
+            pulsar=pulsar,
+            telescope=telescope,
+            project=project,
+            calibration=calibration,
+            utc_start=datetime(2023, 10, 22, 4, 41, 7, tzinfo=timezone.utc),
+            frequency=1284.0,
+            bandwidth=856.0,
+            nchan=1024,
+            beam=1,
+            npol=4,
+            obs_type="fold",
+            raj="04:37:15.8961737",
+            decj="-47:15:09.11071",
+            duration=512.0,
+            nbit=8,
+            tsamp=0.0000047,
+            fold_nbin=1024,
+            fold_nchan=1024,
+            fold_tsubint=8,
+        )
+        ephemeris_text = make_ephemeris_text(pulsar.name)
+        ephemeris = Ephemeris.get_or_create_from_text(pulsar, project, ephemeris_text)
+        template = Template.objects.create(pulsar=pulsar, project=project, band="LBAND", template_hash="benchmark")
+        pipeline_run = PipelineRun.objects.create(
+            observation=observation,
+            ephemeris=ephemeris,
+            template=template,
+            pipeline_name="benchmark",
+            pipeline_version="0",
+            created_by="benchmark",
+            location="/tmp",
+        )
+        return pipeline_run, project, template, ephemeris, ephemeris_text
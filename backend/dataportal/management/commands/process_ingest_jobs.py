@@ -0,0 +1,54 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from dataportal.ingest_jobs import process_ingest_jobs
+from dataportal.models import IngestJob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the createToa, createResidual and createObservation jobs queued with runAsync. "
+        "Several workers can run at once as each job is claimed by a single worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-jobs", type=int, default=None, help="Exit after running this many jobs")
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of exiting once it is empty",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5.0, help="Seconds to wait between polls of an empty queue with --loop"
+        )
+
+    def handle(self, *args, **options):
+        n_succeeded = 0
+        n_failed = 0
+        while True:
+            max_jobs = options["max_jobs"]
+            if max_jobs is not None:
+                max_jobs -= n_succeeded + n_failed
+                if max_jobs <= 0:
+                    break
+            jobs = process_ingest_jobs(max_jobs)
+            for job in jobs:
+                if job.state == IngestJob.SUCCEEDED:
+                    n_succeeded += 1
+                    logger.info(
+                        f"process_ingest_jobs: {job.job_type} job {job.id} wrote {job.row_count} rows "
+                        f"in {job.duration:.1f}s"
+                    )
+                else:
+                    n_failed += 1
+                    self.stderr.write(f"{job.job_type} job {job.id} failed: {job.error}")
+            # process_ingest_jobs only returns once the queue is empty or max_jobs have run
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Ran {n_succeeded + n_failed} jobs, {n_failed} failed."))
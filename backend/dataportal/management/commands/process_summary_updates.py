@@ -0,0 +1,47 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from dataportal.models import SummaryUpdate
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate the Calibration sessions and summaries queued by saving observations. "
+        "Duplicate queued updates are coalesced so each summary is recalculated once per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000, help="Queued updates to coalesce per batch")
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of exiting once it is empty",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=10.0, help="Seconds to wait between polls of an empty queue with --loop"
+        )
+
+    def handle(self, *args, **options):
+        total_processed = 0
+        total_recalculated = 0
+        while True:
+            n_processed, n_recalculated = SummaryUpdate.process_queue(options["batch_size"])
+            total_processed += n_processed
+            total_recalculated += n_recalculated
+            if n_processed:
+                logger.info(
+                    f"process_summary_updates: Recalculated {n_recalculated} summaries "
+                    f"for {n_processed} queued updates"
+                )
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Recalculated {total_recalculated} summaries for {total_processed} queued updates.")
+        )
@@ -0,0 +1,98 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from dataportal.badges import BADGE_RULES, get_rule_badges, update_pulsar_badges
+from dataportal.models import MainProject, Pulsar, PulsarFoldResult
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    # Each worker process opens its own database connection on first use
+    django.setup()
+    connections.close_all()
+
+
+def _recompute_shard(shard, badges, dry_run):
+    pulsar_id, main_project_id = shard
+    return shard, update_pulsar_badges(pulsar_id, main_project_id, badges=badges, dry_run=dry_run)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-evaluate the badge rules for every pulsar's fold results and apply the changes in bulk, "
+        "for example after a rule's threshold changes. Pulsars are shared between worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pulsar", nargs="+", help="Only re-evaluate these pulsars (by name)")
+        parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the badge assignments that would be added and removed without writing them",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        # Print every changed assignment for a dry run, or when asked for verbose output
+        self.print_changes = dry_run or options["verbosity"] > 1
+        results = PulsarFoldResult.objects.all()
+        if options["pulsar"]:
+            results = results.filter(pulsar__name__in=options["pulsar"])
+        shards = list(
+            results.values_list("pulsar_id", "observation__project__main_project_id")
+            .distinct()
+            .order_by("pulsar_id", "observation__project__main_project_id")
+        )
+        pulsar_names = dict(Pulsar.objects.filter(id__in={shard[0] for shard in shards}).values_list("id", "name"))
+        main_project_names = dict(MainProject.objects.values_list("id", "name"))
+        badges = get_rule_badges()
+
+        totals = {name: [0, 0] for name in BADGE_RULES}
+        if options["workers"] > 1 and len(shards) > 1:
+            # Don't share the parent's database connection with the forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as executor:
+                shard_changes = executor.map(
+                    _recompute_shard,
+                    shards,
+                    [badges] * len(shards),
+                    [dry_run] * len(shards),
+                    chunksize=max(1, len(shards) // (options["workers"] * 4)),
+                )
+                for n_done, (shard, changes) in enumerate(shard_changes, start=1):
+                    self.report_shard(shard, changes, n_done, len(shards), totals, pulsar_names, main_project_names)
+        else:
+            for n_done, shard in enumerate(shards, start=1):
+                _, changes = _recompute_shard(shard, badges, dry_run)
+                self.report_shard(shard, changes, n_done, len(shards), totals, pulsar_names, main_project_names)
+
+        verb = ("Would add", "would remove") if dry_run else ("Added", "removed")
+        for name, (n_added, n_removed) in totals.items():
+            self.stdout.write(f"{name}: {verb[0]} {n_added}, {verb[1]} {n_removed}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb[0]} {sum(total[0] for total in totals.values())} and {verb[1]} "
+                f"{sum(total[1] for total in totals.values())} badge assignments across {len(shards)} pulsars."
+            )
+        )
+
+    def report_shard(self, shard, changes, n_done, n_shards, totals, pulsar_names, main_project_names):
+        pulsar_id, main_project_id = shard
+        label = f"{pulsar_names[pulsar_id]} ({main_project_names[main_project_id]})"
+        for name, (added, removed) in changes.items():
+            totals[name][0] += len(added)
+            totals[name][1] += len(removed)
+            if self.print_changes:
+                for pipeline_run_id in sorted(added):
+                    self.stdout.write(f"+ {label} {name}: pipeline run {pipeline_run_id}")
+                for pipeline_run_id in sorted(removed):
+                    self.stdout.write(f"- {label} {name}: pipeline run {pipeline_run_id}")
+        if n_done == n_shards or n_done % max(1, n_shards // 20) == 0:
+            logger.info(f"recompute_badges: Processed {n_done}/{n_shards} pulsars")
+            self.stderr.write(f"Processed {n_done}/{n_shards} pulsars")
@@ -0,0 +1,73 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from dataportal.orbital_phases import get_ephemeris_ids, recompute_ephemeris_phases
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    # Each worker process opens its own database connection on first use
+    django.setup()
+    connections.close_all()
+
+
+def _recompute_shard(ephemeris_id, pulsars, projects):
+    return recompute_ephemeris_phases(ephemeris_id, pulsars=pulsars, projects=projects)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate the binary orbital phase and day of year of observations and ToAs from their ephemerides "
+        "and write them in bulk without sending post_save, for example after an ephemeris is corrected. "
+        "Ephemerides are shared between worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pulsar", nargs="+", help="Only recompute these pulsars (by name)")
+        parser.add_argument("--project", nargs="+", help="Only recompute these projects (by short name)")
+        parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+
+    def handle(self, *args, **options):
+        pulsars = options["pulsar"]
+        projects = options["project"]
+        shards = get_ephemeris_ids(pulsars, projects)
+
+        n_observations = 0
+        n_toas = 0
+        if options["workers"] > 1 and len(shards) > 1:
+            # Don't share the parent's database connection with the forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as executor:
+                shard_counts = executor.map(
+                    _recompute_shard,
+                    shards,
+                    [pulsars] * len(shards),
+                    [projects] * len(shards),
+                    chunksize=max(1, len(shards) // (options["workers"] * 4)),
+                )
+                for n_done, counts in enumerate(shard_counts, start=1):
+                    n_observations += counts[0]
+                    n_toas += counts[1]
+                    self.report_progress(n_done, len(shards))
+        else:
+            for n_done, ephemeris_id in enumerate(shards, start=1):
+                counts = _recompute_shard(ephemeris_id, pulsars, projects)
+                n_observations += counts[0]
+                n_toas += counts[1]
+                self.report_progress(n_done, len(shards))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recomputed {n_observations} observations and {n_toas} ToAs across {len(shards)} ephemerides."
+            )
+        )
+
+    def report_progress(self, n_done, n_shards):
+        if n_done == n_shards or n_done % max(1, n_shards // 20) == 0:
+            logger.info(f"recompute_orbital_phases: Processed {n_done}/{n_shards} ephemerides")
+            self.stderr.write(f"Processed {n_done}/{n_shards} ephemerides")
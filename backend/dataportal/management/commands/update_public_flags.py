@@ -0,0 +1,21 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from dataportal.public_data import update_public_flags
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Flag the observations, ephemerides, templates and ToAs whose embargo has ended as public, so anonymous "
+        "users can see them. Run every minute, as embargoes end with the passing of time."
+    )
+
+    def handle(self, *args, **options):
+        n_released = update_public_flags()
+        summary = ", ".join(f"{model.__name__}: {count}" for model, count in n_released.items())
+        if any(n_released.values()):
+            logger.info(f"update_public_flags: Released rows of {summary}")
+        self.stdout.write(self.style.SUCCESS(f"Released rows of {summary}."))
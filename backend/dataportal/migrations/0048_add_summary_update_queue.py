@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0047_add_project_runtime_configuration"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SummaryUpdate",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "summary_type",
+                    models.CharField(
+                        choices=[("calibration", "calibration"), ("search", "search"), ("observation", "observation")],
+                        max_length=11,
+                    ),
+                ),
+                (
+                    "obs_type",
+                    models.CharField(
+                        choices=[("cal", "cal"), ("fold", "fold"), ("search", "search")], max_length=6, null=True
+                    ),
+                ),
+                (
+                    "band",
+                    models.CharField(
+                        choices=[
+                            ("UHF", "UHF"),
+                            ("LBAND", "LBAND"),
+                            ("SBAND_0", "SBAND_0"),
+                            ("SBAND_1", "SBAND_1"),
+                            ("SBAND_2", "SBAND_2"),
+                            ("SBAND_3", "SBAND_3"),
+                            ("SBAND_4", "SBAND_4"),
+                            ("OTHER", "OTHER"),
+                            ("UHF_NS", "UHF_NS"),
+                        ],
+                        max_length=7,
+                        null=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "calibration",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.CASCADE, to="dataportal.calibration"
+                    ),
+                ),
+                (
+                    "main_project",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.CASCADE, to="dataportal.mainproject"
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to="dataportal.project"),
+                ),
+                (
+                    "pulsar",
+                    models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to="dataportal.pulsar"),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+    ]
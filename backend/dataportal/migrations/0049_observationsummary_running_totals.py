@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0048_add_summary_update_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observationsummary",
+            name="max_utc_start",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="observationsummary",
+            name="min_utc_start",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="observationsummary",
+            name="total_bytes",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="observationsummary",
+            name="total_duration",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:07
+
+from django.db import migrations, models
+
+import dataportal.storage
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0049_observationsummary_running_totals"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="template",
+            name="template_file",
+            field=models.FileField(
+                null=True,
+                storage=dataportal.storage.ContentAddressedStorage(),
+                upload_to=dataportal.storage.get_template_content_location,
+            ),
+        ),
+    ]
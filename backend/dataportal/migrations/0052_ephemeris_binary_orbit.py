@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:32
+
+import json
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+from utils.binary_phase import get_binary_orbit
+
+# Ephemeris column of each orbital element, as of this migration
+BINARY_ORBIT_FIELDS = {
+    "t0": "binary_t0",
+    "ecc": "binary_ecc",
+    "om": "binary_om",
+    "omdot": "binary_omdot",
+    "pb": "binary_pb",
+    "pbdot": "binary_pbdot",
+    "fb": "binary_fb",
+}
+
+
+def set_binary_orbits(apps, schema_editor):
+    Ephemeris = apps.get_model("dataportal", "Ephemeris")
+    binaries = []
+    for ephemeris in Ephemeris.objects.exclude(ephemeris_data=None).only("id", "ephemeris_data").iterator():
+        ephemeris_dict = ephemeris.ephemeris_data
+        if isinstance(ephemeris_dict, str):
+            try:
+                ephemeris_dict = json.loads(ephemeris_dict)
+            except ValueError:
+                continue
+        orbit = get_binary_orbit(ephemeris_dict) if isinstance(ephemeris_dict, dict) else None
+        if orbit is None:
+            continue
+        for element, field in BINARY_ORBIT_FIELDS.items():
+            setattr(ephemeris, field, orbit[element])
+        binaries.append(ephemeris)
+    Ephemeris.objects.bulk_update(binaries, BINARY_ORBIT_FIELDS.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0051_add_ingest_job_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ephemeris",
+            name="binary_ecc",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeris",
+            name="binary_fb",
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name="ephemeris",
+            name="binary_om",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeris",
+            name="binary_omdot",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeris",
+            name="binary_pb",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeris",
+            name="binary_pbdot",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeris",
+            name="binary_t0",
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(set_binary_orbits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:24
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import DateTimeField, ExpressionWrapper, F, OuterRef, Subquery
+
+
+def set_embargo_end_dates(apps, schema_editor):
+    Project = apps.get_model("dataportal", "Project")
+    Observation = apps.get_model("dataportal", "Observation")
+    Ephemeris = apps.get_model("dataportal", "Ephemeris")
+    Template = apps.get_model("dataportal", "Template")
+    Toa = apps.get_model("dataportal", "Toa")
+    observation_start = Observation.objects.filter(pk=OuterRef("observation_id")).values("utc_start")
+    for project in Project.objects.only("id", "embargo_period"):
+        Ephemeris.objects.filter(project=project).update(embargo_end_date=F("created_at") + project.embargo_period)
+        Template.objects.filter(project=project).update(embargo_end_date=F("created_at") + project.embargo_period)
+        Toa.objects.filter(project=project).update(
+            embargo_end_date=ExpressionWrapper(
+                Subquery(observation_start) + project.embargo_period, output_field=DateTimeField()
+            )
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0052_ephemeris_binary_orbit"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ephemeris",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="template",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name="ephemeris",
+            name="embargo_end_date",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="embargo_end_date",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="toa",
+            name="embargo_end_date",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(set_embargo_end_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="ephemeris",
+            index=models.Index(fields=["embargo_end_date"], name="dataportal__embargo_ad21d1_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="template",
+            index=models.Index(fields=["embargo_end_date"], name="dataportal__embargo_3fdfcd_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="toa",
+            index=models.Index(fields=["embargo_end_date"], name="dataportal__embargo_ddfd7c_idx"),
+        ),
+    ]
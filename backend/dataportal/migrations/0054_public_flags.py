@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:49
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def set_public_flags(apps, schema_editor):
+    now = timezone.now()
+    for model_name in ["Observation", "Ephemeris", "Template", "Toa"]:
+        apps.get_model("dataportal", model_name).objects.filter(
+            Q(embargo_end_date__isnull=True) | Q(embargo_end_date__lt=now)
+        ).update(is_public=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0053_embargo_end_dates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ephemeris",
+            name="is_public",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="observation",
+            name="is_public",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="is_public",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="toa",
+            name="is_public",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(set_public_flags, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="ephemeris",
+            index=models.Index(
+                condition=models.Q(("is_public", True)), fields=["pulsar", "created_at"], name="ephemeris_public_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(
+                condition=models.Q(("is_public", True)), fields=["pulsar", "utc_start"], name="observation_public_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="template",
+            index=models.Index(
+                condition=models.Q(("is_public", True)), fields=["pulsar", "created_at"], name="template_public_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="toa",
+            index=models.Index(condition=models.Q(("is_public", True)), fields=["observation"], name="toa_public_idx"),
+        ),
+    ]
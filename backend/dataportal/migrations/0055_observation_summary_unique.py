@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:08
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+# Keep the latest of any summaries created twice by concurrent recalculations, the rest are recalculated anyway
+DELETE_DUPLICATE_SUMMARIES = """
+DELETE FROM dataportal_observationsummary
+WHERE id NOT IN (
+    SELECT MAX(id) FROM dataportal_observationsummary
+    GROUP BY COALESCE(pulsar_id, 0), COALESCE(main_project_id, 0), COALESCE(project_id, 0),
+        COALESCE(calibration_id, 0), COALESCE(obs_type, ''), COALESCE(band, '')
+)
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0054_public_flags"),
+    ]
+
+    operations = [
+        migrations.RunSQL(DELETE_DUPLICATE_SUMMARIES, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name="observationsummary",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.comparison.Coalesce("pulsar", 0),
+                django.db.models.functions.comparison.Coalesce("main_project", 0),
+                django.db.models.functions.comparison.Coalesce("project", 0),
+                django.db.models.functions.comparison.Coalesce("calibration", 0),
+                django.db.models.functions.comparison.Coalesce("obs_type", models.Value("")),
+                django.db.models.functions.comparison.Coalesce("band", models.Value("")),
+                name="unique_observation_summary",
+            ),
+        ),
+    ]
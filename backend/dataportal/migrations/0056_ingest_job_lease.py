@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:32
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_running_job_leases(apps, schema_editor):
+    # Running jobs keep the one hour timeout they were claimed with
+    apps.get_model("dataportal", "IngestJob").objects.filter(state="running").update(
+        lease_expires_at=F("started_at") + timedelta(hours=1)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dataportal", "0055_observation_summary_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingestjob",
+            name="lease_expires_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(set_running_job_leases, migrations.RunPython.noop),
+    ]
@@ -1,37 +1,59 @@
 import hashlib
 import json
 import math
+import os
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from datetime import timezone as dt_timezone
+from functools import partial
+from itertools import repeat
 
 import numpy as np
 import pytz
 from astropy.time import Time
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError, models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, models, transaction
 from django.db.models import (
+    Avg,
+    Count,
     DateTimeField,
-    Exists,
     ExpressionWrapper,
     F,
+    Func,
+    Max,
+    Min,
     Model,
     OuterRef,
     Q,
+    Subquery,
     Sum,
+    Value,
+    Window,
 )
 from django.db.models.constraints import UniqueConstraint
+from django.db.models.functions import Coalesce, NullIf, RowNumber, Sqrt
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from graphql import GraphQLError
 
 from user_manage.models import User
-from utils.binary_phase import get_binary_phase, is_binary
-from utils.ephemeris import parse_ephemeris_file
+from utils.binary_phase import get_binary_orbit, get_orbital_phase
+from utils.day_of_year import mjd_to_day_of_year
 from utils.observing_bands import get_band
-from utils.toa import toa_dict_to_line, toa_line_to_dict
-
-from .storage import OverwriteStorage, get_template_upload_location, get_upload_location
+from utils.toa import iter_chunks, iter_tim_lines, toa_columns_to_lines, toa_lines_to_columns
+
+from .caching import get_parsed_ephemeris, get_project_memberships
+from .storage import (
+    ContentAddressedStorage,
+    OverwriteStorage,
+    get_template_content_location,
+    get_upload_location,
+    get_uploaded_file_hash,
+)
 
 DATA_QUALITY_CHOICES = [
     ("unassessed", "unassessed"),
@@ -79,6 +101,11 @@ def default_ephemeris_end():
     return datetime.fromtimestamp(4294967295, tz=dt_timezone.utc)
 
 
+def is_embargo_over(embargo_end_date):
+    """The value of is_public for a row with the embargo end date, no date meaning it was never embargoed"""
+    return embargo_end_date is None or embargo_end_date < timezone.now()
+
+
 class Pulsar(models.Model):
     """
     Pulsar is used as a target for the observations so this can also be globular clusters
@@ -165,9 +192,35 @@ class Project(models.Model):
         help_text="Allow project ephemerides and templates to be selected as folding assets.",
     )
 
+    # The embargo_period last loaded from or saved to the database, None if unknown
+    previous_embargo_period = None
+
     def __str__(self):
         return f"{self.code}_{self.short}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        project = super().from_db(db, field_names, values)
+        if "embargo_period" not in project.get_deferred_fields():
+            project.previous_embargo_period = project.embargo_period
+        return project
+
+    def save(self, *args, **kwargs):
+        embargo_period_changed = not self._state.adding and self.embargo_period != self.previous_embargo_period
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if embargo_period_changed:
+                self.update_embargo_end_dates()
+        self.previous_embargo_period = self.embargo_period
+
+    def update_embargo_end_dates(self):
+        """
+        Re-derive the stored embargo end dates of the project's observations, ephemerides, templates and ToAs
+        from its embargo_period, with one UPDATE per table, and release or withhold their public data to match.
+        """
+        for model in [Observation, Ephemeris, Template, Toa]:
+            model.objects.filter(project=self).update_embargo_end_dates()
+
     def can_edit(self, user):
         """Check if a user can edit the project"""
         if user.is_superuser:
@@ -177,25 +230,19 @@ class Project(models.Model):
 
     def is_owner(self, user):
         """Check if a user is an owner of the project"""
-        return self.memberships.filter(
-            user=user,
-            project=self,
-            role=ProjectMembership.RoleChoices.OWNER,
-        ).exists()
+        role, _ = get_project_memberships(user).get(self.id, (None, False))
+        return role == ProjectMembership.RoleChoices.OWNER
 
     def is_manager(self, user):
         """Check if a user is a manager of the project"""
         if user.is_superuser:
             return True
 
-        return self.memberships.filter(
-            user=user,
-            project=self,
-            role__in=[
-                ProjectMembership.RoleChoices.MANAGER,
-                ProjectMembership.RoleChoices.OWNER,
-            ],
-        ).exists()
+        role, _ = get_project_memberships(user).get(self.id, (None, False))
+        return role in [
+            ProjectMembership.RoleChoices.MANAGER,
+            ProjectMembership.RoleChoices.OWNER,
+        ]
 
     def get_managers_and_owners(self):
         """Get all active managers and owners of the project"""
@@ -387,129 +434,234 @@ def _always_false_q():
     return Q(pk__isnull=True)
 
 
-def _with_membership_flag(queryset, user, project_field):
-    # This is a False value that can be read by django as an SQL queriable False.
-    has_membership = models.Value(False, output_field=models.BooleanField())
+@dataclass(frozen=True)
+class UserAccess:
+    """
+    What the access policies need to know about a user, resolved once per queryset so every policy compiles
+    to flat predicates on project ids and embargo dates instead of correlated ProjectMembership subqueries.
+    """
 
-    # Update if the user has any memberships.
-    if user.is_authenticated:
-        has_membership = Exists(
-            ProjectMembership.objects.filter(
-                user=user,
-                is_active=True,
-                project_id=OuterRef(f"{project_field}_id"),
-            )
+    is_superuser: bool
+    is_authenticated: bool
+    # The projects the user is an active member of: their ids if the memberships are already resolved for
+    # this request or in the shared cache, otherwise an uncorrelated subquery that the database evaluates
+    # once per statement, so an access check never adds a query of its own. None if there are none.
+    project_ids: object
+    now: datetime
+
+    @classmethod
+    def for_user(cls, user):
+        project_ids = None
+        if user.is_authenticated and not user.is_superuser:
+            memberships = get_project_memberships(user, load=False)
+            if memberships is None:
+                project_ids = ProjectMembership.objects.filter(user=user, is_active=True).values("project_id")
+            else:
+                project_ids = sorted(project_id for project_id, (_, is_active) in memberships.items() if is_active)
+                project_ids = project_ids or None
+        return cls(
+            is_superuser=user.is_superuser,
+            is_authenticated=user.is_authenticated,
+            project_ids=project_ids,
+            now=timezone.now(),
         )
-    return queryset.annotate(_has_membership=has_membership)
 
 
-def _with_accessibility_flag(queryset, policy):
-    return queryset.annotate(
-        _is_accessible=ExpressionWrapper(
-            policy,
-            output_field=models.BooleanField(),
-        )
-    )
+# Each policy compiles to a Q on the model's own fields, or on the fields of a related model when given the
+# lookup prefix of the relation, e.g. "ephemeris__".
+
+
+def _or_member(policy, access, prefix):
+    if access.project_ids is None:
+        return policy
+    return policy | Q(**{f"{prefix}project_id__in": access.project_ids})
 
 
-def _observation_access_policy(user):
-    if user.is_superuser:
+def _embargo_over_q(access, prefix):
+    if not access.is_authenticated:
+        # Anonymous users see the data released by update_public_flags, which runs every minute. The predicate
+        # doesn't change with the time, so it uses the partial public indexes and django-cachalot keeps their
+        # queries cached until a write to the table, such as the next release, invalidates them.
+        return Q(**{f"{prefix}is_public": True})
+    # A range predicate on the stored, indexed embargo end date
+    return Q(**{f"{prefix}embargo_end_date__lt": access.now})
+
+
+def _observation_access_policy(access, prefix=""):
+    if access.is_superuser:
         return _always_true_q()
-    now = timezone.now()
-    return Q(embargo_end_date__isnull=True) | Q(embargo_end_date__lt=now) | Q(_has_membership=True)
+    policy = _embargo_over_q(access, prefix)
+    if access.is_authenticated:
+        policy = Q(**{f"{prefix}embargo_end_date__isnull": True}) | policy
+    return _or_member(policy, access, prefix)
 
 
-def _ephemeris_access_policy(user):
-    if user.is_superuser:
+def _ephemeris_access_policy(access, prefix=""):
+    if access.is_superuser:
         return _always_true_q()
-    now = timezone.now()
-    if not user.is_authenticated:
-        return Q(_embargo_end__lt=now)
-    return Q(_embargo_end__lt=now) | Q(_has_membership=True)
+    return _or_member(_embargo_over_q(access, prefix), access, prefix)
 
 
-def _template_access_policy(user):
-    if not user.is_authenticated:
+def _template_access_policy(access, prefix=""):
+    if not access.is_authenticated:
         return _always_false_q()
-    if user.is_superuser:
+    if access.is_superuser:
         return _always_true_q()
-    now = timezone.now()
-    return Q(_embargo_end__lt=now) | Q(_has_membership=True)
+    return _or_member(_embargo_over_q(access, prefix), access, prefix)
 
 
-def _toa_access_policy(user):
-    if user.is_superuser:
+def _toa_access_policy(access, prefix=""):
+    if access.is_superuser:
         return _always_true_q()
-    now = timezone.now()
-    if not user.is_authenticated:
-        return Q(_embargo_end__lt=now)
-    return Q(_embargo_end__lt=now) | Q(_has_membership=True)
+    return _or_member(_embargo_over_q(access, prefix), access, prefix)
+
+
+def _related_access_policy(access, policy, relation):
+    # Rows without the related object don't pass, even though a LEFT JOIN gives them null embargo dates
+    return Q(**{f"{relation}__isnull": False}) & policy(access, f"{relation}__")
 
 
-class ObservationQuerySet(models.QuerySet):
+def _get_restricted_ids(model, user, ids):
+    ids = set(ids)
+    if not ids:
+        return set()
+    return ids - set(model.objects.filter(pk__in=ids).accessible_to(user).values_list("pk", flat=True))
+
+
+def _with_accessibility_flag(queryset, policy, flag="_is_accessible"):
+    return queryset.annotate(
+        **{
+            flag: ExpressionWrapper(
+                policy,
+                output_field=models.BooleanField(),
+            )
+        }
+    )
+
+
+class EmbargoQuerySet(models.QuerySet):
+    """
+    The rows of a model whose embargo_end_date is its embargo start plus the embargo_period of its project.
+
+    The stored end date and the is_public flag are set on save and by the bulk ingest paths, and they are
+    re-derived in the database when an UPDATE changes one of the embargo_fields. Anything writing those fields
+    with raw SQL must call update_embargo_end_dates itself.
+    """
+
+    # The fields the embargo end date is derived from
+    embargo_fields = {"project"}
+
+    def embargo_start(self):
+        raise NotImplementedError
+
+    def update(self, **kwargs):
+        if not self.embargo_fields & {self.model._meta.get_field(field).name for field in kwargs}:
+            return super().update(**kwargs)
+        with transaction.atomic():
+            # The update may change the fields the rows were filtered on
+            pks = list(self.values_list("pk", flat=True))
+            n_rows = super().update(**kwargs)
+            self.model.objects.filter(pk__in=pks).update_embargo_end_dates()
+        return n_rows
+
+    def update_embargo_end_dates(self):
+        """
+        Re-derive the stored embargo end dates of the rows with one UPDATE, and release or withhold their public
+        data to match.
+        """
+        embargo_period = Project.objects.filter(pk=OuterRef("project_id")).values("embargo_period")
+        with transaction.atomic():
+            super().update(
+                embargo_end_date=ExpressionWrapper(
+                    self.embargo_start() + Subquery(embargo_period), output_field=DateTimeField()
+                )
+            )
+            # Imported here as public_data imports the models
+            from dataportal.public_data import update_row_public_flags
+
+            update_row_public_flags(self)
+
+
+class ObservationQuerySet(EmbargoQuerySet):
+    embargo_fields = {"utc_start", "project"}
+
+    def embargo_start(self):
+        return F("utc_start")
+
+    def update(self, **kwargs):
+        if "utc_start" not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic():
+            pks = list(self.values_list("pk", flat=True))
+            n_rows = super().update(**kwargs)
+            # The embargo end dates of the ToAs derive from their observation's start
+            Toa.objects.filter(observation_id__in=pks).update_embargo_end_dates()
+        return n_rows
+
     def accessible_to(self, user):
-        qs = _with_membership_flag(self, user, "project")
-        qs = _with_accessibility_flag(qs, _observation_access_policy(user))
-        qs = qs.annotate(
-            _ephemeris_is_accessible=Exists(Ephemeris.objects.accessible_to(user).filter(pk=OuterRef("ephemeris_id")))
+        access = UserAccess.for_user(user)
+        policy = _observation_access_policy(access)
+        qs = _with_accessibility_flag(self, policy)
+        qs = _with_accessibility_flag(
+            qs, _related_access_policy(access, _ephemeris_access_policy, "ephemeris"), "_ephemeris_is_accessible"
         )
-        return qs.filter(_is_accessible=True)
+        return qs.filter(policy)
+
 
+class TemplateQuerySet(EmbargoQuerySet):
+    embargo_fields = {"created_at", "project"}
+
+    def embargo_start(self):
+        return F("created_at")
 
-class TemplateQuerySet(models.QuerySet):
     def accessible_to(self, user):
-        qs = _with_membership_flag(self, user, "project")
-        embargo_end = ExpressionWrapper(
-            F("created_at") + F("project__embargo_period"),
-            output_field=DateTimeField(),
-        )
-        qs = qs.annotate(_embargo_end=embargo_end)
-        return _with_accessibility_flag(qs, _template_access_policy(user)).filter(_is_accessible=True)
+        policy = _template_access_policy(UserAccess.for_user(user))
+        return _with_accessibility_flag(self, policy).filter(policy)
+
+
+class EphemerisQuerySet(EmbargoQuerySet):
+    embargo_fields = {"created_at", "project"}
 
+    def embargo_start(self):
+        return F("created_at")
 
-class EphemerisQuerySet(models.QuerySet):
     def accessible_to(self, user):
-        qs = _with_membership_flag(self, user, "project")
-        embargo_end = ExpressionWrapper(
-            F("created_at") + F("project__embargo_period"),
-            output_field=DateTimeField(),
-        )
-        qs = qs.annotate(_embargo_end=embargo_end)
-        return _with_accessibility_flag(qs, _ephemeris_access_policy(user)).filter(_is_accessible=True)
+        policy = _ephemeris_access_policy(UserAccess.for_user(user))
+        return _with_accessibility_flag(self, policy).filter(policy)
+
 
+class ToaQuerySet(EmbargoQuerySet):
+    embargo_fields = {"observation", "project"}
+
+    def embargo_start(self):
+        # An UPDATE can't join, so the ToAs read their observation's start with a subquery
+        return Subquery(Observation.objects.filter(pk=OuterRef("observation_id")).values("utc_start"))
 
-class ToaQuerySet(models.QuerySet):
     def accessible_to(self, user):
-        qs = _with_membership_flag(self, user, "project")
-        embargo_end = ExpressionWrapper(
-            F("observation__utc_start") + F("project__embargo_period"),
-            output_field=DateTimeField(),
-        )
-        qs = qs.annotate(_embargo_end=embargo_end)
-        qs = _with_accessibility_flag(qs, _toa_access_policy(user))
-        qs = qs.annotate(
-            _observation_is_accessible=Exists(
-                Observation.objects.accessible_to(user).filter(pk=OuterRef("observation_id"))
-            ),
-            _pipeline_run_observation_is_accessible=Exists(
-                Observation.objects.accessible_to(user).filter(pk=OuterRef("pipeline_run__observation_id"))
-            ),
-            _ephemeris_is_accessible=Exists(Ephemeris.objects.accessible_to(user).filter(pk=OuterRef("ephemeris_id"))),
-            _template_is_accessible=Exists(Template.objects.accessible_to(user).filter(pk=OuterRef("template_id"))),
-        )
-        return qs.filter(_is_accessible=True)
+        access = UserAccess.for_user(user)
+        policy = _toa_access_policy(access)
+        qs = _with_accessibility_flag(self, policy)
+        for flag, related_policy, relation in [
+            ("_observation_is_accessible", _observation_access_policy, "observation"),
+            ("_pipeline_run_observation_is_accessible", _observation_access_policy, "pipeline_run__observation"),
+            ("_ephemeris_is_accessible", _ephemeris_access_policy, "ephemeris"),
+            ("_template_is_accessible", _template_access_policy, "template"),
+        ]:
+            qs = _with_accessibility_flag(qs, _related_access_policy(access, related_policy, relation), flag)
+        return qs.filter(policy)
 
 
 class PipelineRunQuerySet(models.QuerySet):
     def accessible_to(self, user):
-        qs = self.annotate(
-            _observation_is_accessible=Exists(
-                Observation.objects.accessible_to(user).filter(pk=OuterRef("observation_id"))
-            ),
-            _ephemeris_is_accessible=Exists(Ephemeris.objects.accessible_to(user).filter(pk=OuterRef("ephemeris_id"))),
-            _template_is_accessible=Exists(Template.objects.accessible_to(user).filter(pk=OuterRef("template_id"))),
-        )
-        return qs.filter(_observation_is_accessible=True)
+        access = UserAccess.for_user(user)
+        qs = self
+        for flag, related_policy, relation in [
+            ("_observation_is_accessible", _observation_access_policy, "observation"),
+            ("_ephemeris_is_accessible", _ephemeris_access_policy, "ephemeris"),
+            ("_template_is_accessible", _template_access_policy, "template"),
+        ]:
+            qs = _with_accessibility_flag(qs, _related_access_policy(access, related_policy, relation), flag)
+        return qs.filter(_related_access_policy(access, _observation_access_policy, "observation"))
 
 
 class PulsarFoldResultQuerySet(models.QuerySet):
@@ -517,21 +669,40 @@ class PulsarFoldResultQuerySet(models.QuerySet):
         if user.is_superuser:
             return self
 
-        return self.filter(observation__in=Observation.objects.accessible_to(user))
+        return self.filter(
+            _related_access_policy(UserAccess.for_user(user), _observation_access_policy, "observation")
+        )
 
 
 class PipelineImageQuerySet(models.QuerySet):
     def accessible_to(self, user):
         if user.is_superuser:
-            return self
+            return _with_accessibility_flag(self, _always_true_q(), "_observation_is_accessible")
+
+        policy = _related_access_policy(
+            UserAccess.for_user(user), _observation_access_policy, "pulsar_fold_result__observation"
+        )
+        # Flag the images so resolvers know their observation's access is settled without another query
+        return _with_accessibility_flag(self, policy, "_observation_is_accessible").filter(policy)
 
-        return self.filter(pulsar_fold_result__observation__in=Observation.objects.accessible_to(user))
+
+# Ephemeris column of each orbital element of utils.binary_phase.get_binary_orbit
+BINARY_ORBIT_FIELDS = {
+    "t0": "binary_t0",
+    "ecc": "binary_ecc",
+    "om": "binary_om",
+    "omdot": "binary_omdot",
+    "pb": "binary_pb",
+    "pbdot": "binary_pbdot",
+    "fb": "binary_fb",
+}
 
 
 class Ephemeris(models.Model):
     pulsar = models.ForeignKey(Pulsar, models.CASCADE)
     project = models.ForeignKey(Project, models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on construction rather than by the insert so the embargo end date can be derived from it on save
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     ephemeris_data = models.JSONField(null=True)
     ephemeris_hash = models.CharField(max_length=32, editable=False, null=True)
@@ -540,21 +711,112 @@ class Ephemeris(models.Model):
     valid_from = models.DateTimeField(default=default_ephemeris_start)
     valid_to = models.DateTimeField(default=default_ephemeris_end)
     comment = models.TextField(null=True)
+    # created_at plus the project's embargo period, set on save
+    embargo_end_date = models.DateTimeField(null=True)
+    # Whether the embargo is over, set on save and by the update_public_flags command once it ends
+    is_public = models.BooleanField(default=False)
+
+    # The binary orbit, extracted from ephemeris_data on save so orbital phases can be calculated without
+    # parsing it. Null for isolated pulsars. pb and pbdot are set if the orbit is given by PB, otherwise fb
+    # holds FB0..FBn.
+    binary_t0 = models.FloatField(null=True)
+    binary_ecc = models.FloatField(null=True)
+    binary_om = models.FloatField(null=True)
+    binary_omdot = models.FloatField(null=True)
+    binary_pb = models.FloatField(null=True)
+    binary_pbdot = models.FloatField(null=True)
+    binary_fb = ArrayField(models.FloatField(), null=True)
 
     def clean(self, *args, **kwargs):
         # checking valid_to is later than valid_from
         if self.valid_from >= self.valid_to:
             raise ValidationError(_("valid_to must be later than valid_from"))
 
+    @staticmethod
+    def hash_ephemeris_data(ephemeris_data):
+        return hashlib.md5(json.dumps(ephemeris_data, sort_keys=True, indent=2).encode("utf-8")).hexdigest()
+
     def save(self, *args, **kwargs):
         Ephemeris.clean(self)
-        self.ephemeris_hash = hashlib.md5(
-            json.dumps(self.ephemeris_data, sort_keys=True, indent=2).encode("utf-8")
-        ).hexdigest()
+        self.ephemeris_hash = Ephemeris.hash_ephemeris_data(self.ephemeris_data)
+        self.set_binary_orbit()
+        self.embargo_end_date = self.created_at + self.project.embargo_period
+        self.is_public = is_embargo_over(self.embargo_end_date)
         super(Ephemeris, self).save(*args, **kwargs)
 
+    def set_binary_orbit(self):
+        """
+        Set the binary orbit columns from ephemeris_data.
+        """
+        ephemeris_dict = self.ephemeris_data
+        if isinstance(ephemeris_dict, str):
+            try:
+                ephemeris_dict = json.loads(ephemeris_dict)
+            except ValueError:
+                ephemeris_dict = None
+        # Anything but a parameter dictionary has no orbit to extract
+        orbit = get_binary_orbit(ephemeris_dict) if isinstance(ephemeris_dict, dict) else None
+        for element, field in BINARY_ORBIT_FIELDS.items():
+            setattr(self, field, None if orbit is None else orbit[element])
+
+    @property
+    def binary_orbit(self):
+        """
+        The orbital elements of the binary orbit columns, or None for an isolated pulsar.
+        """
+        if self.binary_t0 is None:
+            return None
+        return {element: getattr(self, field) for element, field in BINARY_ORBIT_FIELDS.items()}
+
+    def get_binary_phase(self, mjds):
+        """
+        Calculate the binary orbital phase at an array of barycentric MJDs from the binary orbit columns.
+
+        Returns:
+            numpy.ndarray: The phases, or None for an isolated pulsar.
+        """
+        orbit = self.binary_orbit
+        if orbit is None:
+            return None
+        return get_orbital_phase(mjds, **orbit)
+
     objects = EphemerisQuerySet.as_manager()
 
+    @classmethod
+    def get_or_create_from_text(cls, pulsar, project, ephemeris_text, comment=None):
+        """
+        Get or create the ephemeris for the text of a tempo2 par file.
+
+        The par file is parsed through the ephemeris cache and matched on the hash of the parsed
+        ephemeris, which uses the unique (project, ephemeris_hash) index instead of comparing the JSON.
+        """
+        ephemeris_dict = get_parsed_ephemeris(ephemeris_text)
+        ephemeris_data = json.dumps(ephemeris_dict)
+        ephemeris_hash = cls.hash_ephemeris_data(ephemeris_data)
+        try:
+            ephemeris, _ = cls.objects.get_or_create(
+                pulsar=pulsar,
+                project=project,
+                ephemeris_hash=ephemeris_hash,
+                defaults={
+                    # TODO add created_by
+                    "ephemeris_data": ephemeris_data,
+                    "p0": ephemeris_dict["P0"],
+                    "dm": ephemeris_dict["DM"],
+                    "valid_from": ephemeris_dict["START"],
+                    "valid_to": ephemeris_dict["FINISH"],
+                    "comment": comment,
+                },
+            )
+        except IntegrityError:
+            # Handle the IntegrityError gracefully by grabbing the already created ephem
+            ephemeris = cls.objects.get(
+                pulsar=pulsar,
+                project=project,
+                ephemeris_hash=ephemeris_hash,
+            )
+        return ephemeris
+
     @property
     def is_embargoed(self):
         """
@@ -562,8 +824,7 @@ class Ephemeris(models.Model):
         Embargo is based on ephemeris creation date + project embargo period.
         :return: bool
         """
-        embargo_end_date = self.created_at + self.project.embargo_period
-        return embargo_end_date >= datetime.now(tz=pytz.UTC)
+        return self.embargo_end_date >= datetime.now(tz=pytz.UTC)
 
     def is_restricted(self, user):
         """
@@ -574,7 +835,14 @@ class Ephemeris(models.Model):
         """
         if hasattr(self, "_is_accessible"):
             return not self._is_accessible
-        return not type(self).objects.filter(pk=self.pk).accessible_to(user).exists()
+        return self.pk in type(self).restricted_ids(user, [self.pk])
+
+    @classmethod
+    def restricted_ids(cls, user, ids):
+        """
+        The ids of the ephemerides the user can't access out of ids, answered with one query however many there are.
+        """
+        return _get_restricted_ids(cls, user, ids)
 
     class Meta:
         constraints = [
@@ -589,21 +857,38 @@ class Ephemeris(models.Model):
         indexes = [
             models.Index(fields=["created_at"]),
             models.Index(fields=["pulsar", "created_at"]),
+            models.Index(fields=["embargo_end_date"]),
+            models.Index(fields=["pulsar", "created_at"], condition=Q(is_public=True), name="ephemeris_public_idx"),
         ]
 
 
 class Template(models.Model):
     pulsar = models.ForeignKey(Pulsar, models.CASCADE)
     project = models.ForeignKey(Project, models.CASCADE)
-    template_file = models.FileField(upload_to=get_template_upload_location, storage=OverwriteStorage(), null=True)
+    template_file = models.FileField(
+        upload_to=get_template_content_location, storage=ContentAddressedStorage(), null=True
+    )
     template_hash = models.CharField(max_length=64, null=True)
 
     band = models.CharField(max_length=7, choices=BAND_CHOICES)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on construction rather than by the insert so the embargo end date can be derived from it on save
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # created_at plus the project's embargo period, set on save
+    embargo_end_date = models.DateTimeField(null=True)
+    # Whether the embargo is over, set on save and by the update_public_flags command once it ends
+    is_public = models.BooleanField(default=False)
 
     objects = TemplateQuerySet.as_manager()
 
+    def save(self, *args, **kwargs):
+        if self.template_file and not self.template_file._committed:
+            # A new file, e.g. from the admin, that get_template_content_location stores under its hash
+            self.template_hash = get_uploaded_file_hash(self.template_file.file)
+        self.embargo_end_date = self.created_at + self.project.embargo_period
+        self.is_public = is_embargo_over(self.embargo_end_date)
+        super().save(*args, **kwargs)
+
     @property
     def is_embargoed(self):
         """
@@ -611,8 +896,7 @@ class Template(models.Model):
         Embargo is based on template creation date + project embargo period.
         :return: bool
         """
-        embargo_end_date = self.created_at + self.project.embargo_period
-        return embargo_end_date >= datetime.now(tz=pytz.UTC)
+        return self.embargo_end_date >= datetime.now(tz=pytz.UTC)
 
     def is_restricted(self, user):
         """
@@ -620,7 +904,14 @@ class Template(models.Model):
         """
         if hasattr(self, "_is_accessible"):
             return not self._is_accessible
-        return not type(self).objects.filter(pk=self.pk).accessible_to(user).exists()
+        return self.pk in type(self).restricted_ids(user, [self.pk])
+
+    @classmethod
+    def restricted_ids(cls, user, ids):
+        """
+        The ids of the templates the user can't access out of ids, answered with one query however many there are.
+        """
+        return _get_restricted_ids(cls, user, ids)
 
     class Meta:
         constraints = [
@@ -634,6 +925,10 @@ class Template(models.Model):
                 name="Unique template for each pulsar, project and band.",
             )
         ]
+        indexes = [
+            models.Index(fields=["embargo_end_date"]),
+            models.Index(fields=["pulsar", "created_at"], condition=Q(is_public=True), name="template_public_idx"),
+        ]
 
 
 class Badge(models.Model):
@@ -675,16 +970,23 @@ class Calibration(models.Model):
             calibration: Calibration django model
                 A Calibration model instance.
         """
-        # Grab observations for the calibrator
-        observations = Observation.objects.filter(calibration=calibration)
-
-        start = observations.order_by("utc_start").first().utc_start
-        end = observations.order_by("utc_start").last().utc_start
-        all_projects = ", ".join({observation.project.short for observation in observations.all()})
-        n_observations = observations.count()
-        n_ant_min = observations.order_by("nant").first().nant
-        n_ant_max = observations.order_by("nant").last().nant
-        total_integration_time_seconds = sum(observations.all().values_list("duration", flat=True))
+        # Summarise the observations for the calibrator in a single query
+        session = Observation.objects.filter(calibration=calibration).aggregate(
+            start=Min("utc_start"),
+            end=Max("utc_start"),
+            all_projects=ArrayAgg("project__short", distinct=True, ordering="project__short", default=[]),
+            n_observations=Count("id"),
+            n_ant_min=Min("nant"),
+            n_ant_max=Max("nant"),
+            total_integration_time_seconds=Sum("duration"),
+        )
+        start = session["start"]
+        end = session["end"]
+        all_projects = ", ".join(session["all_projects"])
+        n_observations = session["n_observations"]
+        n_ant_min = session["n_ant_min"]
+        n_ant_max = session["n_ant_max"]
+        total_integration_time_seconds = session["total_integration_time_seconds"] or 0
 
         # Update the calibration values
         calibration.start = start
@@ -705,6 +1007,15 @@ class Calibration(models.Model):
         ordering = ["-start"]
 
 
+# Fields CreateObservation matches existing observations on
+OBSERVATION_KEY_FIELDS = ["pulsar_id", "telescope_id", "project_id", "utc_start", "beam"]
+OBSERVATION_UPSERT_BATCH_SIZE = 5000
+
+
+def observation_key(observation):
+    return tuple(getattr(observation, field) for field in OBSERVATION_KEY_FIELDS)
+
+
 class Observation(models.Model):
     pulsar = models.ForeignKey(Pulsar, models.CASCADE)
     telescope = models.ForeignKey(Telescope, models.CASCADE)
@@ -712,6 +1023,8 @@ class Observation(models.Model):
     calibration = models.ForeignKey(Calibration, models.SET_NULL, null=True, related_name="observations")
 
     embargo_end_date = models.DateTimeField(null=True)
+    # Whether the embargo is over, set on save and by the update_public_flags command once it ends
+    is_public = models.BooleanField(default=False)
 
     # Frequency fields
     band = models.CharField(max_length=7, choices=BAND_CHOICES)
@@ -751,25 +1064,138 @@ class Observation(models.Model):
 
     objects = ObservationQuerySet.as_manager()
 
+    # The OBSERVATION_SUMMARY_FIELDS values last loaded from or saved to the database, None if unknown
+    previous_values = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        observation = super().from_db(db, field_names, values)
+        observation.previous_values = observation.get_summary_values()
+        return observation
+
+    def get_summary_values(self):
+        if any(field in self.get_deferred_fields() for field in OBSERVATION_SUMMARY_FIELDS):
+            return None
+        return {field: getattr(self, field) for field in OBSERVATION_SUMMARY_FIELDS}
+
     def save(self, *args, **kwargs):
         Observation.clean(self)
-        if self.project.observation_band_override:
-            self.band = self.project.observation_band_override
-        else:
-            self.band = get_band(self.frequency, self.bandwidth)
-        self.day_of_year = (
-            self.utc_start.timetuple().tm_yday
-            + self.utc_start.hour / 24.0
-            + self.utc_start.minute / (24.0 * 60.0)
-            + self.utc_start.second / (24.0 * 60.0 * 60.0)
+        Observation.set_derived_fields([self])
+        utc_start_changed = not self._state.adding and (
+            self.previous_values is None or self.previous_values["utc_start"] != self.utc_start
         )
-        if self.ephemeris is not None:
-            ephemeris_dict = json.loads(self.ephemeris.ephemeris_data)
-            if is_binary(ephemeris_dict):
-                centre_obs_mjd = self.utc_start + timedelta(seconds=self.duration / 2)
-                self.binary_orbital_phase = get_binary_phase(np.array([Time(centre_obs_mjd).mjd]), ephemeris_dict)
-        self.embargo_end_date = self.utc_start + self.project.embargo_period
-        super(Observation, self).save(*args, **kwargs)
+        # Commit the observation together with the summary changes post_save applies for it, so a concurrent
+        # recalculation can't count it as well
+        with transaction.atomic():
+            super(Observation, self).save(*args, **kwargs)
+            if utc_start_changed:
+                # The embargo end dates of the ToAs derive from their observation's start
+                Toa.objects.filter(observation=self).update_embargo_end_dates()
+        self.previous_values = self.get_summary_values()
+
+    @classmethod
+    def set_derived_fields(cls, observations):
+        """
+        Set the band, day_of_year, binary_orbital_phase and embargo_end_date of the observations from their
+        other fields. Binary phases are calculated with one call per ephemeris rather than per observation.
+        """
+        ephemeris_observations = defaultdict(list)
+        for observation in observations:
+            if observation.project.observation_band_override:
+                observation.band = observation.project.observation_band_override
+            else:
+                observation.band = get_band(observation.frequency, observation.bandwidth)
+            observation.day_of_year = (
+                observation.utc_start.timetuple().tm_yday
+                + observation.utc_start.hour / 24.0
+                + observation.utc_start.minute / (24.0 * 60.0)
+                + observation.utc_start.second / (24.0 * 60.0 * 60.0)
+            )
+            observation.embargo_end_date = observation.utc_start + observation.project.embargo_period
+            observation.is_public = is_embargo_over(observation.embargo_end_date)
+            if observation.ephemeris is not None:
+                ephemeris_observations[observation.ephemeris].append(observation)
+
+        for ephemeris, binary_observations in ephemeris_observations.items():
+            if ephemeris.binary_orbit is None:
+                continue
+            centre_obs_mjds = cls.get_centre_mjds(
+                [observation.utc_start for observation in binary_observations],
+                [observation.duration for observation in binary_observations],
+            )
+            binary_phases = ephemeris.get_binary_phase(centre_obs_mjds)
+            for observation, binary_phase in zip(binary_observations, binary_phases):
+                observation.binary_orbital_phase = float(binary_phase)
+
+    @staticmethod
+    def get_centre_mjds(utc_starts, durations):
+        """
+        The MJDs of the middle of observations, from their start times and durations in seconds.
+        """
+        return Time(
+            [utc_start + timedelta(seconds=duration / 2) for utc_start, duration in zip(utc_starts, durations)]
+        ).mjd
+
+    @classmethod
+    def bulk_upsert(cls, observations):
+        """
+        Create or update many observations in one transaction.
+
+        Existing observations are matched on the same fields as CreateObservation (pulsar, telescope,
+        project, utc_start and beam) and the last of any duplicates in the input wins. post_save is not
+        sent so callers need to update the summaries themselves with update_observation_summaries. The
+        previous_values of updated observations are set from the rows they replace, so the summaries they
+        move out of (e.g. a different band or calibration) are updated too.
+
+        Args:
+            observations (list): Unsaved Observation instances.
+
+        Returns:
+            list: The saved observations in the same order as the input.
+        """
+        cls.set_derived_fields(observations)
+        keyed_observations = {}
+        for observation in observations:
+            keyed_observations[observation_key(observation)] = observation
+
+        existing_rows = {}
+        for keys in iter_chunks(list(keyed_observations), OBSERVATION_UPSERT_BATCH_SIZE):
+            existing = cls.objects.filter(
+                pulsar_id__in={key[0] for key in keys},
+                utc_start__in={key[3] for key in keys},
+            ).values("id", *dict.fromkeys(OBSERVATION_KEY_FIELDS + OBSERVATION_SUMMARY_FIELDS))
+            for row in existing:
+                existing_rows[tuple(row[field] for field in OBSERVATION_KEY_FIELDS)] = row
+
+        new_observations = []
+        updated_observations = []
+        for key, observation in keyed_observations.items():
+            if key in existing_rows:
+                observation.pk = existing_rows[key]["id"]
+                observation.previous_values = {
+                    field: existing_rows[key][field] for field in OBSERVATION_SUMMARY_FIELDS
+                }
+                updated_observations.append(observation)
+            else:
+                new_observations.append(observation)
+
+        update_fields = [
+            field.attname
+            for field in cls._meta.concrete_fields
+            if not field.primary_key and field.attname not in OBSERVATION_KEY_FIELDS
+        ]
+        with transaction.atomic():
+            cls.objects.bulk_create(new_observations, batch_size=OBSERVATION_UPSERT_BATCH_SIZE)
+            bulk_update_columns(
+                cls,
+                [observation.pk for observation in updated_observations],
+                {
+                    field: [getattr(observation, field) for observation in updated_observations]
+                    for field in update_fields
+                },
+                OBSERVATION_UPSERT_BATCH_SIZE,
+            )
+        return [keyed_observations[observation_key(observation)] for observation in observations]
 
     @property
     def is_embargoed(self):
@@ -798,7 +1224,14 @@ class Observation(models.Model):
         """
         if hasattr(self, "_is_accessible"):
             return not self._is_accessible
-        return not type(self).objects.filter(pk=self.pk).accessible_to(user).exists()
+        return self.pk in type(self).restricted_ids(user, [self.pk])
+
+    @classmethod
+    def restricted_ids(cls, user, ids):
+        """
+        The ids of the observations the user can't access out of ids, answered with one query however many there are.
+        """
+        return _get_restricted_ids(cls, user, ids)
 
     class Meta:
         indexes = [
@@ -806,12 +1239,37 @@ class Observation(models.Model):
             models.Index(fields=["pulsar", "utc_start"]),
             models.Index(fields=["project", "utc_start"]),
             models.Index(fields=["embargo_end_date"]),
+            models.Index(fields=["pulsar", "utc_start"], condition=Q(is_public=True), name="observation_public_idx"),
         ]
 
     def __str__(self):
         return f"{self.utc_start} {self.beam}"
 
 
+# Observation fields that ObservationSummary.apply_observation needs the previous values of
+OBSERVATION_SUMMARY_KEY_FIELDS = ["obs_type", "pulsar_id", "project_id", "calibration_id", "band"]
+OBSERVATION_SUMMARY_FIELDS = OBSERVATION_SUMMARY_KEY_FIELDS + [
+    "utc_start",
+    "duration",
+    "fold_tsubint",
+    "fold_nbin",
+    "fold_nchan",
+    "npol",
+]
+
+
+def observation_bytes(values):
+    """
+    The estimated disk space of a fold observation in bytes from its OBSERVATION_SUMMARY_FIELDS values.
+    """
+    size_fields = ["duration", "fold_tsubint", "fold_nbin", "fold_nchan", "npol"]
+    if any(not values[field] for field in size_fields):
+        return 0
+    return (
+        values["duration"] / values["fold_tsubint"] * values["fold_nbin"] * values["fold_nchan"] * values["npol"] * 2
+    )
+
+
 class ObservationSummary(Model):
     # Foreign Keys that can be none when they're summarising all instead of an individual model
     pulsar = models.ForeignKey(Pulsar, models.CASCADE, null=True)
@@ -831,18 +1289,24 @@ class ObservationSummary(Model):
     min_duration = models.FloatField(blank=True, null=True)
     max_duration = models.FloatField(blank=True, null=True)
 
-    @classmethod
-    def update_or_create(cls, obs_type, pulsar, main_project, project, calibration, band):
-        """
-        Every time a Observation is saved, we want to update the ObservationSummary
-        model so it accurately summaries all observations for the input filters.
+    # Running totals so single observations can be applied without rescanning, see apply_observation
+    min_utc_start = models.DateTimeField(blank=True, null=True)
+    max_utc_start = models.DateTimeField(blank=True, null=True)
+    total_duration = models.FloatField(blank=True, null=True)
+    total_bytes = models.FloatField(blank=True, null=True)
 
-        Parameters:
-            obs_type: str
-                A Pulsar model instance.
-            main_project: MainProject django model
-                A MainProject model instance.
+    @staticmethod
+    def lock(obs_type, pulsar, main_project, project, calibration, band):
+        """
+        Take a transaction level advisory lock on a summary key, whether or not its row exists yet, so
+        concurrent updates of the summary run one after another. Must be called inside a transaction.
         """
+        key = [getattr(value, "pk", value) for value in (obs_type, pulsar, main_project, project, calibration, band)]
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"observation_summary:{key}"])
+
+    @staticmethod
+    def get_filter_kwargs(obs_type, pulsar, main_project, project, calibration, band):
         # Create a kwargs for the filter that doesn't use the foreign keys that are none
         kwargs = {}
         if obs_type is not None:
@@ -857,74 +1321,422 @@ class ObservationSummary(Model):
             kwargs["calibration"] = calibration
         if band is not None:
             kwargs["band"] = band
-        all_observations = Observation.objects.filter(**kwargs)
-        if len(all_observations) == 0:
-            # No observations for this combo so do not create a summary
-            return None, False
-
-        min_utc = all_observations.order_by("utc_start").first().utc_start
-        max_utc = all_observations.order_by("utc_start").last().utc_start
-
-        observations = len(all_observations)
-        pulsars = len(all_observations.values_list("pulsar__name", flat=True).distinct())
-        projects = len(all_observations.values_list("project", flat=True).distinct())
-        observation_hours = all_observations.aggregate(total=Sum("duration"))["total"] / 3600
-        min_duration = all_observations.order_by("duration").first().duration
-        max_duration = all_observations.order_by("duration").last().duration
-
-        duration = max_utc - min_utc
+        return kwargs
+
+    @classmethod
+    def update_or_create(cls, obs_type, pulsar, main_project, project, calibration, band):
+        """
+        Every time a Observation is saved, we want to update the ObservationSummary
+        model so it accurately summaries all observations for the input filters.
+
+        All the values come from a single aggregate query over the matching observations.
+
+        Parameters:
+            obs_type: str
+                A Pulsar model instance.
+            main_project: MainProject django model
+                A MainProject model instance.
+        """
+        with transaction.atomic():
+            # Aggregate after taking the lock so the observations of a concurrent update are counted
+            cls.lock(obs_type, pulsar, main_project, project, calibration, band)
+            kwargs = cls.get_filter_kwargs(obs_type, pulsar, main_project, project, calibration, band)
+            aggregates = {
+                "observations": Count("id"),
+                "pulsars": Count("pulsar", distinct=True),
+                "projects": Count("project", distinct=True),
+                "min_utc_start": Min("utc_start"),
+                "max_utc_start": Max("utc_start"),
+                "total_duration": Sum("duration"),
+                "min_duration": Min("duration"),
+                "max_duration": Max("duration"),
+            }
+            if obs_type == "fold":
+                aggregates["total_bytes"] = Sum(
+                    F("duration") / NullIf(F("fold_tsubint"), 0) * F("fold_nbin") * F("fold_nchan") * F("npol") * 2,
+                    output_field=models.FloatField(),
+                )
+            values = Observation.objects.filter(**kwargs).aggregate(**aggregates)
+            if values["observations"] == 0:
+                # No observations for this combo so do not create a summary
+                return None, False
+
+            values["total_duration"] = values["total_duration"] or 0
+            values["total_bytes"] = values.get("total_bytes") or 0
+            # Update oc create the model
+            return ObservationSummary.objects.update_or_create(
+                pulsar=pulsar,
+                main_project=main_project,
+                project=project,
+                calibration=calibration,
+                obs_type=obs_type,
+                band=band,
+                defaults=cls.with_derived_values(values),
+            )
+
+    @staticmethod
+    def with_derived_values(values):
+        """
+        Add the summary values derived from the running totals to values.
+        """
+        values["observation_hours"] = values["total_duration"] / 3600
         # Add 1 day to the end result because the timespan should show the rounded up number of days
-        timespan_days = duration.days + 1
+        values["timespan_days"] = (values["max_utc_start"] - values["min_utc_start"]).days + 1
+        values["estimated_disk_space_gb"] = values["total_bytes"] / (1024**3)
+        return values
 
-        if obs_type == "fold":
-            try:
-                total_bytes = all_observations.aggregate(
-                    total_bytes=Sum(
-                        F("duration") / F("fold_tsubint") * F("fold_nbin") * F("fold_nchan") * F("npol") * 2
-                    )
-                )["total_bytes"]
-            except ZeroDivisionError:
-                total_bytes = 0
-        else:
-            total_bytes = 0
-        estimated_disk_space_gb = total_bytes / (1024**3)
-
-        # Update oc create the model
-        new_observation_summary, created = ObservationSummary.objects.update_or_create(
-            pulsar=pulsar,
-            main_project=main_project,
-            project=project,
-            calibration=calibration,
-            obs_type=obs_type,
-            band=band,
-            defaults={
-                "observations": observations,
-                "pulsars": pulsars,
-                "projects": projects,
-                "estimated_disk_space_gb": estimated_disk_space_gb,
-                "observation_hours": observation_hours,
-                "timespan_days": timespan_days,
-                "min_duration": min_duration,
-                "max_duration": max_duration,
-            },
+    @classmethod
+    def apply_observation(cls, obs_type, pulsar, main_project, project, calibration, band, observation, previous):
+        """
+        Update the summary by applying the change from a single saved observation to its stored totals
+        instead of rescanning all the matching observations.
+
+        Falls back to update_or_create when the change can't be applied as a delta: the summary doesn't exist
+        yet, the observation changed summaries, it has no duration, or it held a minimum or maximum that has
+        moved inwards.
+
+        Parameters:
+            observation: Observation django model
+                The saved observation, which must match the summary filters.
+            previous: dict or None
+                The observation's OBSERVATION_SUMMARY_FIELDS values before it was saved,
+                or None if it was just created.
+        """
+        with transaction.atomic():
+            # Concurrent saves apply their changes in turn instead of overwriting each other's totals
+            cls.lock(obs_type, pulsar, main_project, project, calibration, band)
+            summary = cls.objects.filter(
+                pulsar=pulsar,
+                main_project=main_project,
+                project=project,
+                calibration=calibration,
+                obs_type=obs_type,
+                band=band,
+            ).first()
+            current = {field: getattr(observation, field) for field in OBSERVATION_SUMMARY_FIELDS}
+            if (
+                summary is None
+                or None
+                in (
+                    summary.min_utc_start,
+                    summary.min_duration,
+                    summary.total_duration,
+                    summary.total_bytes,
+                    current["duration"],
+                )
+                or (previous is not None and not cls.can_apply_update(summary, previous, current))
+            ):
+                return cls.update_or_create(obs_type, pulsar, main_project, project, calibration, band)
+
+            if previous is None:
+                # A new observation, it may add to the distinct pulsars or projects when they aren't fixed
+                others = Observation.objects.filter(
+                    **cls.get_filter_kwargs(obs_type, pulsar, main_project, project, calibration, band)
+                ).exclude(pk=observation.pk)
+                summary.observations += 1
+                if pulsar is None and not others.filter(pulsar_id=current["pulsar_id"]).exists():
+                    summary.pulsars += 1
+                if project is None and not others.filter(project_id=current["project_id"]).exists():
+                    summary.projects += 1
+                previous_duration = 0
+                previous_bytes = 0
+            else:
+                previous_duration = previous["duration"]
+                previous_bytes = observation_bytes(previous)
+
+            summary.total_duration += current["duration"] - previous_duration
+            if obs_type == "fold":
+                summary.total_bytes += observation_bytes(current) - previous_bytes
+            summary.min_duration = min(summary.min_duration, current["duration"])
+            summary.max_duration = max(summary.max_duration, current["duration"])
+            summary.min_utc_start = min(summary.min_utc_start, current["utc_start"])
+            summary.max_utc_start = max(summary.max_utc_start, current["utc_start"])
+            values = cls.with_derived_values(
+                {
+                    "total_duration": summary.total_duration,
+                    "total_bytes": summary.total_bytes,
+                    "min_utc_start": summary.min_utc_start,
+                    "max_utc_start": summary.max_utc_start,
+                }
+            )
+            for field, value in values.items():
+                setattr(summary, field, value)
+            summary.save()
+            return summary, False
+
+    @staticmethod
+    def can_apply_update(summary, previous, current):
+        """
+        Check an update to an observation already in the summary can be applied as a delta.
+        """
+        if previous["duration"] is None:
+            return False
+        if any(previous[field] != current[field] for field in OBSERVATION_SUMMARY_KEY_FIELDS):
+            return False
+        # A minimum or maximum that moves inwards needs a rescan to find the new one
+        for field, minimum, maximum in [
+            ("duration", summary.min_duration, summary.max_duration),
+            ("utc_start", summary.min_utc_start, summary.max_utc_start),
+        ]:
+            if previous[field] == minimum and current[field] > minimum:
+                return False
+            if previous[field] == maximum and current[field] < maximum:
+                return False
+        return True
+
+    class Meta:
+        ordering = ["id"]
+        constraints = [
+            # The keys are NULL when summarising all, which never conflict (Postgres < 15 has no NULLS NOT
+            # DISTINCT), so coalesce them. This lets update_or_create from concurrent workers fall back to
+            # updating the row another worker created instead of creating a duplicate.
+            UniqueConstraint(
+                Coalesce("pulsar", 0),
+                Coalesce("main_project", 0),
+                Coalesce("project", 0),
+                Coalesce("calibration", 0),
+                Coalesce("obs_type", Value("")),
+                Coalesce("band", Value("")),
+                name="unique_observation_summary",
+            ),
+        ]
+
+
+class SummaryUpdate(models.Model):
+    """
+    A queued recalculation of a Calibration session, PulsarSearchSummary or ObservationSummary.
+
+    Saving observations queues the summaries that include them and the process_summary_updates command
+    recalculates each distinct summary in the queue once, however many observations queued it.
+    """
+
+    CALIBRATION = "calibration"
+    SEARCH_SUMMARY = "search"
+    OBSERVATION_SUMMARY = "observation"
+    SUMMARY_TYPES = [
+        (CALIBRATION, CALIBRATION),
+        (SEARCH_SUMMARY, SEARCH_SUMMARY),
+        (OBSERVATION_SUMMARY, OBSERVATION_SUMMARY),
+    ]
+
+    summary_type = models.CharField(max_length=11, choices=SUMMARY_TYPES)
+    obs_type = models.CharField(max_length=6, choices=OBS_TYPE_CHOICES, null=True)
+    pulsar = models.ForeignKey(Pulsar, models.CASCADE, null=True)
+    main_project = models.ForeignKey(MainProject, models.CASCADE, null=True)
+    project = models.ForeignKey(Project, models.CASCADE, null=True)
+    calibration = models.ForeignKey(Calibration, models.CASCADE, null=True)
+    band = models.CharField(max_length=7, choices=BAND_CHOICES, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def key(self):
+        return (
+            self.summary_type,
+            self.obs_type,
+            self.pulsar_id,
+            self.main_project_id,
+            self.project_id,
+            self.calibration_id,
+            self.band,
         )
-        if not created:
-            # If updating a model need to save the new values as defaults will not be used
-            new_observation_summary.observations
-            new_observation_summary.pulsars
-            new_observation_summary.projects
-            new_observation_summary.estimated_disk_space_gb
-            new_observation_summary.observation_hours
-            new_observation_summary.timespan_days
-            new_observation_summary.min_duration
-            new_observation_summary.max_duration
-            new_observation_summary.save()
-        return new_observation_summary, created
+
+    @classmethod
+    def recalculate(cls, summary_updates):
+        """
+        Recalculate each distinct summary in summary_updates once, sessions before summaries.
+        """
+        distinct_updates = {}
+        for summary_update in summary_updates:
+            distinct_updates.setdefault(summary_update.key, summary_update)
+
+        summary_type_order = [summary_type for summary_type, _ in cls.SUMMARY_TYPES]
+        # Recalculate in a fixed order so workers take the summary locks in the same order
+        for summary_update in sorted(
+            distinct_updates.values(),
+            key=lambda summary_update: (
+                summary_type_order.index(summary_update.summary_type),
+                str(summary_update.key),
+            ),
+        ):
+            if summary_update.summary_type == cls.CALIBRATION:
+                if summary_update.calibration is not None:
+                    Calibration.update_observation_session(summary_update.calibration)
+            elif summary_update.summary_type == cls.SEARCH_SUMMARY:
+                PulsarSearchSummary.update_or_create(summary_update.pulsar, summary_update.main_project)
+            else:
+                ObservationSummary.update_or_create(
+                    summary_update.obs_type,
+                    summary_update.pulsar,
+                    summary_update.main_project,
+                    summary_update.project,
+                    summary_update.calibration,
+                    summary_update.band,
+                )
+        return len(distinct_updates)
+
+    @classmethod
+    def process_queue(cls, batch_size):
+        """
+        Recalculate the summaries for the oldest batch_size queued updates and remove them from the queue.
+
+        The queued rows are locked with SKIP LOCKED so several workers can process the queue at once. Workers
+        that recalculate the same summary at once share its row, as unique_observation_summary makes the
+        update_or_create of the later one update the row instead of creating another.
+
+        Returns:
+            tuple: The number of queued updates processed and the number of distinct summaries recalculated.
+        """
+        with transaction.atomic():
+            summary_updates = list(
+                cls.objects.select_for_update(skip_locked=True, of=("self",))
+                .select_related("pulsar", "main_project", "project", "calibration")
+                .order_by("id")[:batch_size]
+            )
+            n_recalculated = cls.recalculate(summary_updates)
+            cls.objects.filter(id__in=[summary_update.id for summary_update in summary_updates]).delete()
+        return len(summary_updates), n_recalculated
 
     class Meta:
         ordering = ["id"]
 
 
+# How long a claimed ingest job is leased to its worker. A running job whose lease was not renewed in time is
+# assumed to have lost its worker and may be claimed again
+INGEST_JOB_LEASE = timedelta(minutes=5)
+# How often the worker renews the lease of the job it is running
+INGEST_JOB_HEARTBEAT_INTERVAL = timedelta(minutes=1)
+# Times a job is claimed before a lost job is failed instead of being run again
+INGEST_JOB_MAX_ATTEMPTS = 3
+
+
+class IngestJob(models.Model):
+    """
+    A queued createToa, createResidual or createObservation mutation.
+
+    Mutations called with runAsync validate their input, queue it as a job and return straight away.
+    The process_ingest_jobs command runs the queued jobs, and several workers can run at once as each
+    claims jobs with SKIP LOCKED.
+    """
+
+    TOA = "toa"
+    RESIDUAL = "residual"
+    OBSERVATION = "observation"
+    JOB_TYPES = [
+        (TOA, TOA),
+        (RESIDUAL, RESIDUAL),
+        (OBSERVATION, OBSERVATION),
+    ]
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATES = [
+        (QUEUED, QUEUED),
+        (RUNNING, RUNNING),
+        (SUCCEEDED, SUCCEEDED),
+        (FAILED, FAILED),
+    ]
+
+    job_type = models.CharField(max_length=11, choices=JOB_TYPES)
+    state = models.CharField(max_length=9, choices=STATES, default=QUEUED)
+    # The mutation input, as JSON
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    # Renewed by the worker while the job runs
+    lease_expires_at = models.DateTimeField(null=True)
+    attempts = models.IntegerField(default=0)
+    # The number of rows the job created or updated
+    row_count = models.IntegerField(null=True)
+    error = models.TextField(null=True)
+
+    @classmethod
+    def enqueue(cls, job_type, payload, user):
+        return cls.objects.create(
+            job_type=job_type, payload=payload, created_by=user if user.is_authenticated else None
+        )
+
+    @classmethod
+    def claim(cls):
+        """
+        Mark the oldest queued job, or a running job whose lease has expired, as running and return it.
+
+        Jobs are locked with SKIP LOCKED while they are claimed so each is claimed by a single worker.
+
+        Returns:
+            IngestJob: The claimed job, or None if there are no jobs to run.
+        """
+        while True:
+            now = timezone.now()
+            with transaction.atomic():
+                job = (
+                    cls.objects.select_for_update(skip_locked=True)
+                    .filter(Q(state=cls.QUEUED) | Q(state=cls.RUNNING, lease_expires_at__lt=now))
+                    .order_by("id")
+                    .first()
+                )
+                if job is None:
+                    return None
+                if job.attempts < INGEST_JOB_MAX_ATTEMPTS:
+                    job.state = cls.RUNNING
+                    job.started_at = now
+                    job.lease_expires_at = now + INGEST_JOB_LEASE
+                    job.attempts += 1
+                    job.save(update_fields=["state", "started_at", "lease_expires_at", "attempts"])
+                    return job
+                job.finish(cls.FAILED, error=f"The job was lost by its worker {job.attempts} times.")
+
+    def renew_lease(self):
+        """
+        Extend the lease of the running job so no other worker claims it.
+
+        Returns:
+            bool: False if the job is no longer running this attempt, e.g. it was claimed again.
+        """
+        self.lease_expires_at = timezone.now() + INGEST_JOB_LEASE
+        return (
+            IngestJob.objects.filter(id=self.id, state=self.RUNNING, attempts=self.attempts).update(
+                lease_expires_at=self.lease_expires_at
+            )
+            > 0
+        )
+
+    def finish(self, state, row_count=None, error=None):
+        """
+        Record the outcome of the running job.
+
+        Returns:
+            bool: False if the job is no longer running this attempt, in which case nothing is recorded.
+        """
+        finished_at = timezone.now()
+        finished = (
+            IngestJob.objects.filter(id=self.id, state=self.RUNNING, attempts=self.attempts).update(
+                state=state, row_count=row_count, error=error, finished_at=finished_at
+            )
+            > 0
+        )
+        if finished:
+            self.state = state
+            self.row_count = row_count
+            self.error = error
+            self.finished_at = finished_at
+        return finished
+
+    @property
+    def duration(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["state", "id"], name="ingest_job_state_idx"),
+        ]
+
+
 class PipelineRun(Model):
     """
     Details about the software and pipeline run to process data
@@ -1075,99 +1887,88 @@ class PulsarFoldSummary(models.Model):
             main_project: MainProject django model
                 A MainProject model instance.
         """
-        # Get all the fold observations for that pulsar
-        observations = (
-            Observation.objects.select_related("pulsar", "project")
-            .filter(pulsar=pulsar, project__main_project=main_project, obs_type="fold")
-            .order_by("utc_start")
+        # Summarise all the fold observations for that pulsar in one aggregate, the window functions
+        # pick out the latest observation and count the observations of each project for the most common one
+        observation_summary = (
+            Observation.objects.filter(pulsar=pulsar, project__main_project=main_project, obs_type="fold")
+            .annotate(
+                latest_rank=Window(RowNumber(), order_by=F("utc_start").desc()),
+                project_count=Window(Count("id"), partition_by=F("project__short")),
+                project_first_observation=Window(Min("utc_start"), partition_by=F("project__short")),
+            )
+            .aggregate(
+                number_of_observations=Count("id"),
+                first_observation=Min("utc_start"),
+                latest_observation=Max("utc_start"),
+                latest_observation_beam=Max("beam", filter=Q(latest_rank=1)),
+                latest_observation_duration=Max("duration", filter=Q(latest_rank=1)),
+                total_duration=Sum("duration"),
+                all_bands=ArrayAgg("band", distinct=True, ordering="band"),
+                all_projects=ArrayAgg("project__short", distinct=True, ordering="project__short"),
+                # Ties go to the project observed first
+                most_common_project=Func(
+                    ArrayAgg(
+                        "project__short",
+                        ordering=(F("project_count").desc(), F("project_first_observation").asc()),
+                    ),
+                    template="(%(expressions)s)[1]",
+                    output_field=models.CharField(),
+                ),
+            )
         )
 
-        # Process observation summary
-        first_observation = observations.first()
-        latest_observation = observations.last()
-
         # Early return if no fold observations exist for this pulsar/project combination.
         # This can occur when the signal handler fires for a non-fold observation
         # (e.g., search or cal), since this method only queries for obs_type="fold".
-        if first_observation is None or latest_observation is None:
+        if observation_summary["number_of_observations"] == 0:
             return
 
-        timespan = (latest_observation.utc_start - first_observation.utc_start).days + 1
-        number_of_observations = observations.count()
-        total_integration_hours = observations.aggregate(total=Sum("duration"))["total"] / 3600
-        last_integration_minutes = latest_observation.duration / 60
-        all_bands = ", ".join(list(set(observations.values_list("band", flat=True))))
-
-        # Process results summary
-        results = (
-            PulsarFoldResult.objects.select_related("pulsar", "pipeline_run", "observation")
-            .filter(pulsar=pulsar)
-            .order_by("observation__utc_start")
+        # Since SNR is proportional to the sqrt of the observation length
+        # we can normalise the SNR to an equivalent 5 minute observation
+        sn_5min = F("pipeline_run__sn") / NullIf(Sqrt("observation__duration"), 0.0) * math.sqrt(300)
+        result_summary = (
+            PulsarFoldResult.objects.filter(pulsar=pulsar)
+            .annotate(latest_rank=Window(RowNumber(), order_by=F("observation__utc_start").desc()))
+            .aggregate(
+                latest_pipeline_runs=Count("pipeline_run", filter=Q(latest_rank=1)),
+                last_sn=Max("pipeline_run__sn", filter=Q(latest_rank=1)),
+                highest_sn=Max(Coalesce("pipeline_run__sn", 0.0)),
+                lowest_sn=Min(Coalesce("pipeline_run__sn", 0.0)),
+                avg_sn_pipe=Avg(sn_5min),
+                max_sn_pipe=Max(sn_5min),
+            )
         )
-
-        last_result = results.last()
         # Early return if no PulsarFoldResults exist yet for this pulsar.
         # This can occur when the signal handler fires before any fold results have been created,
         # or when processing observations without associated pipeline runs.
-        if last_result is None or last_result.pipeline_run is None:
+        if result_summary["latest_pipeline_runs"] == 0:
             return
 
-        last_sn = last_result.pipeline_run.sn
-        sn_list = [result.pipeline_run.sn or 0 for result in results]
-        highest_sn = max(sn_list)
-        lowest_sn = min(sn_list)
-        # Since SNR is proportional to the sqrt of the observation length
-        # we can normalise the SNR to an equivalent 5 minute observation
-        sn_5min_list = []
-        for result in results:
-            if result.pipeline_run.sn is not None:
-                sn_5min_list.append(result.pipeline_run.sn / math.sqrt(result.observation.duration) * math.sqrt(300))
-        if len(sn_5min_list) > 0:
-            avg_sn_pipe = sum(sn_5min_list) / len(sn_5min_list)
-            max_sn_pipe = max(sn_5min_list)
-        else:
-            avg_sn_pipe = 0
-            max_sn_pipe = 0
-
-        # Process project summary
-        all_projects = ", ".join(list(set(observations.values_list("project__short", flat=True))))
-        most_common_project = cls.get_most_common_project(observations)
-
-        new_pulsar_fold_summary, created = PulsarFoldSummary.objects.update_or_create(
+        latest_observation_duration = observation_summary["latest_observation_duration"]
+        return PulsarFoldSummary.objects.update_or_create(
             pulsar=pulsar,
             main_project=main_project,
             defaults={
-                "first_observation": first_observation.utc_start,
-                "latest_observation": latest_observation.utc_start,
-                "latest_observation_beam": latest_observation.beam,
-                "timespan": timespan,
-                "number_of_observations": number_of_observations,
-                "total_integration_hours": total_integration_hours,
-                "last_integration_minutes": last_integration_minutes,
-                "all_bands": all_bands,
-                "last_sn": last_sn or 0,
-                "highest_sn": highest_sn or 0,
-                "lowest_sn": lowest_sn or 0,
-                "avg_sn_pipe": avg_sn_pipe,
-                "max_sn_pipe": max_sn_pipe,
-                "all_projects": all_projects,
-                "most_common_project": most_common_project,
+                "first_observation": observation_summary["first_observation"],
+                "latest_observation": observation_summary["latest_observation"],
+                "latest_observation_beam": observation_summary["latest_observation_beam"],
+                "timespan": (observation_summary["latest_observation"] - observation_summary["first_observation"]).days
+                + 1,
+                "number_of_observations": observation_summary["number_of_observations"],
+                "total_integration_hours": (observation_summary["total_duration"] or 0) / 3600,
+                "last_integration_minutes": (
+                    None if latest_observation_duration is None else latest_observation_duration / 60
+                ),
+                "all_bands": ", ".join(observation_summary["all_bands"]),
+                "last_sn": result_summary["last_sn"] or 0,
+                "highest_sn": result_summary["highest_sn"] or 0,
+                "lowest_sn": result_summary["lowest_sn"] or 0,
+                "avg_sn_pipe": result_summary["avg_sn_pipe"] or 0,
+                "max_sn_pipe": result_summary["max_sn_pipe"] or 0,
+                "all_projects": ", ".join(observation_summary["all_projects"]),
+                "most_common_project": observation_summary["most_common_project"],
             },
         )
-        if not created:
-            # If updating a model need to save the new values as defaults will not be used
-            new_pulsar_fold_summary.first_observation
-            new_pulsar_fold_summary.latest_observation
-            new_pulsar_fold_summary.latest_observation_beam
-            new_pulsar_fold_summary.timespan
-            new_pulsar_fold_summary.number_of_observations
-            new_pulsar_fold_summary.total_integration_hours
-            new_pulsar_fold_summary.last_integration_minutes
-            new_pulsar_fold_summary.all_bands
-            new_pulsar_fold_summary.all_projects
-            new_pulsar_fold_summary.most_common_project
-            new_pulsar_fold_summary.save()
-        return new_pulsar_fold_summary, created
 
 
 class PulsarSearchSummary(models.Model):
@@ -1348,6 +2149,226 @@ class PipelineImage(models.Model):
             self.url = self.image.url
         super(PipelineImage, self).save(*args, **kwargs)
 
+    @classmethod
+    def upsert_bundle(cls, pipeline_run_id, images):
+        """
+        Store all the images of a pipeline run and upsert their rows in one transaction.
+
+        Each file is streamed to storage in turn, then every row is written with a single
+        INSERT ... ON CONFLICT on the unique image key. If storing a file or writing the rows fails the
+        files already stored are deleted, and the files of replaced images stored under another name are
+        deleted once the rows are committed.
+
+        Parameters:
+            pipeline_run_id: int
+                The id of the PipelineRun the images were made by.
+            images: list of (dict, File)
+                The image_type, resolution and cleaned of each image, with the file to store for it.
+
+        Returns:
+            list of (PipelineImage, bool): The images in the same order, and whether each one is new.
+        """
+        pipeline_run = PipelineRun.objects.get(id=pipeline_run_id)
+        pulsar_fold_result = PulsarFoldResult.objects.select_related(
+            "observation__telescope", "observation__project", "observation__pulsar"
+        ).get(observation_id=pipeline_run.observation_id)
+        existing_images = {
+            (image_type, cleaned, resolution): image
+            for image_type, cleaned, resolution, image in pulsar_fold_result.images.values_list(
+                "image_type", "cleaned", "resolution", "image"
+            )
+        }
+        existing_keys = set(existing_images)
+
+        image_field = cls._meta.get_field("image")
+        pipeline_images = []
+        try:
+            for image_values, image_file in images:
+                pipeline_image = cls(
+                    pulsar_fold_result=pulsar_fold_result,
+                    image_type=image_values["image_type"],
+                    cleaned=image_values["cleaned"],
+                    resolution=image_values["resolution"],
+                )
+                file_name = image_field.generate_filename(pipeline_image, os.path.basename(image_file.name))
+                pipeline_image.image = image_field.storage.save(
+                    file_name, image_file, max_length=image_field.max_length
+                )
+                pipeline_image.url = pipeline_image.image.url
+                pipeline_images.append(pipeline_image)
+
+            with transaction.atomic():
+                cls.objects.bulk_create(
+                    pipeline_images,
+                    update_conflicts=True,
+                    unique_fields=["pulsar_fold_result", "image_type", "cleaned", "resolution"],
+                    update_fields=["image", "url"],
+                )
+        except Exception:
+            # Files stored over an existing image's file have already replaced it, so keep those
+            for pipeline_image in pipeline_images:
+                if pipeline_image.image.name not in existing_images.values():
+                    image_field.storage.delete(pipeline_image.image.name)
+            raise
+
+        stored_names = {pipeline_image.image.name for pipeline_image in pipeline_images}
+        replaced_names = {
+            existing_images[(pipeline_image.image_type, pipeline_image.cleaned, pipeline_image.resolution)]
+            for pipeline_image in pipeline_images
+            if (pipeline_image.image_type, pipeline_image.cleaned, pipeline_image.resolution) in existing_images
+        }
+        for replaced_name in replaced_names - stored_names - {"", None}:
+            transaction.on_commit(partial(image_field.storage.delete, replaced_name))
+        return [
+            (
+                pipeline_image,
+                (pipeline_image.image_type, pipeline_image.cleaned, pipeline_image.resolution) not in existing_keys,
+            )
+            for pipeline_image in pipeline_images
+        ]
+
+
+# The fields making up the Toa unique constraint, used as the ON CONFLICT target for upserts
+TOA_UNIQUE_FIELDS = [
+    "observation",
+    "project",
+    "dm_corrected",
+    "obs_npol",
+    "obs_nchan",
+    "chan",
+    "nsub_type",
+    "subint",
+]
+# The fields read from each line of a .tim file
+TOA_LINE_FIELDS = [
+    "archive",
+    "freq_MHz",
+    "mjd",
+    "mjd_err",
+    "telescope",
+    "fe",
+    "be",
+    "f",
+    "bw",
+    "tobs",
+    "tmplt",
+    "gof",
+    "nbin",
+    "snr",
+]
+# Line fields that are only kept for projects with toa_metadata_available
+TOA_METADATA_FIELDS = ["nch", "chan", "rcvr", "length", "subint"]
+# Lines of a .tim file parsed at once by Toa.copy_from_tim_file
+TOA_PARSE_CHUNK_SIZE = 10000
+# The fields set by a residual upload
+TOA_RESIDUAL_FIELDS = [
+    "day_of_year",
+    "binary_orbital_phase",
+    "residual_sec",
+    "residual_sec_err",
+    "residual_phase",
+    "residual_phase_err",
+]
+# Rows per UPDATE statement when saving residuals
+TOA_RESIDUAL_BATCH_SIZE = 10000
+# The fields a re-uploaded ToA overwrites
+TOA_UPSERT_FIELDS = [
+    "pipeline_run",
+    "ephemeris",
+    "template",
+    "archive",
+    "freq_MHz",
+    "mjd",
+    "mjd_err",
+    "telescope",
+    "fe",
+    "be",
+    "f",
+    "bw",
+    "tobs",
+    "tmplt",
+    "gof",
+    "nbin",
+    "snr",
+    "nch",
+    "rcvr",
+    "length",
+    "embargo_end_date",
+    "is_public",
+]
+# Rows per INSERT ... ON CONFLICT statement, keeps statements a sensible size for 1024ch x many subint files
+TOA_UPSERT_BATCH_SIZE = 5000
+
+
+def bulk_update_columns(model, ids, columns, batch_size):
+    """
+    Set columns of many rows with one UPDATE ... FROM unnest() statement per batch.
+
+    QuerySet.bulk_update builds a CASE WHEN expression per row per field, which is far slower than
+    the update itself once there are thousands of rows.
+
+    Args:
+        model: The model class to update.
+        ids (list): Primary keys of the rows to update.
+        columns (dict): Field name to a list of new values, in the same order as ids.
+        batch_size (int): Rows per UPDATE statement.
+    """
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    pk = model._meta.pk
+    fields = [model._meta.get_field(name) for name in columns]
+    value_columns = ", ".join(quote_name(field.column) for field in [pk] + fields)
+    arrays = ", ".join(
+        [f"%s::{pk.rel_db_type(connection)}[]"] + [f"%s::{field.db_type(connection)}[]" for field in fields]
+    )
+    assignments = ", ".join(f"{quote_name(field.column)} = v.{quote_name(field.column)}" for field in fields)
+    sql = (
+        f"UPDATE {table} SET {assignments} FROM unnest({arrays}) AS v({value_columns}) "
+        f"WHERE {table}.{quote_name(pk.column)} = v.{quote_name(pk.column)}"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(ids), batch_size):
+            cursor.execute(
+                sql,
+                [ids[start : start + batch_size]]
+                + [values[start : start + batch_size] for values in columns.values()],
+            )
+
+
+def parse_toa_lines(toa_lines, toa_metadata_available):
+    """
+    Parse lines of a .tim file into Toa field values, checking they convert back to the same lines.
+
+    Returns a tuple of values per line, ordered as TOA_LINE_FIELDS + TOA_METADATA_FIELDS.
+    Raises ValueError if a line is malformed, is missing a flag or doesn't convert back to the same line.
+    """
+    # Every flag but gof is required, and the metadata flags are when they're kept
+    required_fields = [field for field in TOA_LINE_FIELDS if field != "gof"]
+    if toa_metadata_available:
+        required_fields += TOA_METADATA_FIELDS
+    toa_values = [None] * len(toa_lines)
+    for block in toa_lines_to_columns(toa_lines):
+        missing_fields = [field for field in required_fields if field not in block.columns]
+        if missing_fields:
+            raise ValueError(
+                f"Malformed ToA line, missing the -{', -'.join(missing_fields)} flag(s).\n{toa_lines[block.rows[0]]}"
+            )
+        # Revert the columns back to lines and check they match before uploading
+        for row, output_toa_line in zip(block.rows.tolist(), toa_columns_to_lines(block)):
+            if toa_lines[row] != output_toa_line:
+                raise ValueError(
+                    "Assertion failed. toa_line and output_toa_line do not match.\n"
+                    f"{toa_lines[row]}\n{output_toa_line}"
+                )
+        columns = [
+            block.tolist(field) if field == "gof" else block.columns[field].tolist() for field in TOA_LINE_FIELDS
+        ]
+        for field in TOA_METADATA_FIELDS:
+            columns.append(block.columns[field].tolist() if toa_metadata_available else repeat(None))
+        for row, values in zip(block.rows.tolist(), zip(*columns)):
+            toa_values[row] = values
+    return toa_values
+
 
 class Toa(models.Model):
     # foreign keys
@@ -1404,19 +2425,29 @@ class Toa(models.Model):
     residual_phase = models.FloatField(null=True)  # pulse period phase
     residual_phase_err = models.FloatField(null=True)
 
+    # The observation's utc_start plus this ToA's project's embargo period, set on save
+    embargo_end_date = models.DateTimeField(null=True)
+    # Whether the embargo is over, set on save and by the update_public_flags command once it ends
+    is_public = models.BooleanField(default=False)
+
     objects = ToaQuerySet.as_manager()
 
+    def save(self, *args, **kwargs):
+        self.embargo_end_date = self.observation.utc_start + self.project.embargo_period
+        self.is_public = is_embargo_over(self.embargo_end_date)
+        super().save(*args, **kwargs)
+
     @property
     def is_embargoed(self):
         """
         Check if this ToA is embargoed based on its project's embargo period.
 
-        Uses the observation's utc_start and this ToA's project's embargo_period
-        to determine if the data is still under embargo.
+        Uses the embargo end date stored from the observation's utc_start and this
+        ToA's project's embargo_period to determine if the data is still under embargo.
 
         :return: bool - True if embargoed, False if public
         """
-        return self.observation.is_embargoed_for_project(self.project)
+        return self.embargo_end_date >= datetime.now(tz=pytz.UTC)
 
     def is_restricted(self, user):
         """
@@ -1424,7 +2455,14 @@ class Toa(models.Model):
         """
         if hasattr(self, "_is_accessible"):
             return not self._is_accessible
-        return not type(self).objects.filter(pk=self.pk).accessible_to(user).exists()
+        return self.pk in type(self).restricted_ids(user, [self.pk])
+
+    @classmethod
+    def restricted_ids(cls, user, ids):
+        """
+        The ids of the ToAs the user can't access out of ids, answered with one query however many there are.
+        """
+        return _get_restricted_ids(cls, user, ids)
 
     @classmethod
     def get_query(cls, **kwargs):
@@ -1448,90 +2486,242 @@ class Toa(models.Model):
         project = Project.objects.get(short=project_short)
         template = Template.objects.get(id=template_id)
 
-        ephemeris_dict = parse_ephemeris_file(ephemeris_text)
-        try:
-            ephemeris, _ = Ephemeris.objects.get_or_create(
-                pulsar=observation.pulsar,
-                project=project,
-                # TODO add created_by
-                ephemeris_data=json.dumps(ephemeris_dict),
-                p0=ephemeris_dict["P0"],
-                dm=ephemeris_dict["DM"],
-                valid_from=ephemeris_dict["START"],
-                valid_to=ephemeris_dict["FINISH"],
-            )
-        except IntegrityError:
-            # Handle the IntegrityError gracefully by grabbing the already created ephem
-            ephemeris = Ephemeris.objects.get(
-                pulsar=observation.pulsar,
-                project=project,
-                ephemeris_data=json.dumps(ephemeris_dict),
-            )
+        ephemeris = Ephemeris.get_or_create_from_text(observation.pulsar, project, ephemeris_text)
+        embargo_end_date = observation.utc_start + project.embargo_period
 
-        created_toas = []
-        for toa_line in toa_lines:
-            if "FORMAT" in toa_line:
-                continue
-            toa_line = toa_line.rstrip("\n")
-            # Loop over toa lines and turn into a dict
-            toa_dict = toa_line_to_dict(toa_line)
-            # Revert it back to a line and check it matches before uploading
-            output_toa_line = toa_dict_to_line(toa_dict)
-            if toa_line != output_toa_line:
-                raise GraphQLError(
-                    f"Assertion failed. toa_line and output_toa_line do not match.\n{toa_line}\n{output_toa_line}"
-                )
-            if not project.toa_metadata_available:
-                nch = None
-                chan = None
-                rcvr = None
-                length = None
-                subint = None
-            else:
-                nch = toa_dict["nch"]
-                chan = toa_dict["chan"]
-                rcvr = toa_dict["rcvr"]
-                length = toa_dict["length"]
-                subint = toa_dict["subint"]
-
-            # Create or update the TOA
-            toa, _ = Toa.objects.update_or_create(
-                # Lookup fields (unique constraint)
+        # Parse and validate the whole batch before writing anything so a bad line can't leave
+        # a partially ingested file behind. Lines that map onto the same unique key collapse
+        # onto one row (last line wins), matching the old per-line update_or_create behaviour.
+        toas_by_key = {}
+        line_keys = []
+        for toa_values in cls.parse_lines(toa_lines, project):
+            toa = Toa(
                 observation=observation,
                 project=project,
                 dm_corrected=dm_corrected,
                 obs_npol=npol,
                 obs_nchan=nchan,
-                chan=chan,
                 nsub_type=nsub_type,
-                subint=subint,
-                # Defaults (fields to update/create)
-                defaults={
-                    "pipeline_run": pipeline_run,
-                    "ephemeris": ephemeris,
-                    "template": template,
-                    "archive": toa_dict["archive"],
-                    "freq_MHz": toa_dict["freq_MHz"],
-                    "mjd": toa_dict["mjd"],
-                    "mjd_err": toa_dict["mjd_err"],
-                    "telescope": toa_dict["telescope"],
-                    "fe": toa_dict["fe"],
-                    "be": toa_dict["be"],
-                    "f": toa_dict["f"],
-                    "bw": toa_dict["bw"],
-                    "tobs": toa_dict["tobs"],
-                    "tmplt": toa_dict["tmplt"],
-                    "gof": toa_dict.get("gof", None),
-                    "nbin": toa_dict["nbin"],
-                    "snr": toa_dict["snr"],
-                    "nch": nch,
-                    "rcvr": rcvr,
-                    "length": length,
-                },
+                pipeline_run=pipeline_run,
+                ephemeris=ephemeris,
+                template=template,
+                embargo_end_date=embargo_end_date,
+                is_public=is_embargo_over(embargo_end_date),
+                **dict(zip(TOA_LINE_FIELDS + TOA_METADATA_FIELDS, toa_values)),
             )
-            created_toas.append(toa)
+            key = (toa.chan, toa.subint)
+            toas_by_key[key] = toa
+            line_keys.append(key)
+
+        cls.upsert(list(toas_by_key.values()))
+
+        return [toas_by_key[key] for key in line_keys]
+
+    @staticmethod
+    def parse_lines(toa_lines, project):
+        """
+        Parse and validate the toaLines of a createToa mutation for the project, see parse_toa_lines.
+
+        Raises GraphQLError if a line is invalid.
+        """
+        toa_lines = [toa_line.rstrip("\n") for toa_line in toa_lines if "FORMAT" not in toa_line]
+        try:
+            return parse_toa_lines(toa_lines, project.toa_metadata_available)
+        except ValueError as error:
+            raise GraphQLError(str(error)) from error
+
+    @classmethod
+    def upsert(cls, toas):
+        """
+        Write a batch of unsaved Toa instances with a set-based upsert keyed on the
+        unique constraint, instead of an update_or_create round trip per ToA.
+
+        The instances must not share a unique key. Their primary keys are set in place.
+        """
+        rows_with_keys = [toa for toa in toas if toa.chan is not None and toa.subint is not None]
+        # NULLs never conflict in a unique constraint (Postgres < 15), so ToAs without channel and
+        # subint metadata can't use ON CONFLICT and are matched with an IS NULL lookup instead.
+        rows_without_keys = [toa for toa in toas if toa.chan is None or toa.subint is None]
+
+        with transaction.atomic():
+            for start in range(0, len(rows_with_keys), TOA_UPSERT_BATCH_SIZE):
+                cls.objects.bulk_create(
+                    rows_with_keys[start : start + TOA_UPSERT_BATCH_SIZE],
+                    update_conflicts=True,
+                    unique_fields=TOA_UNIQUE_FIELDS,
+                    update_fields=TOA_UPSERT_FIELDS,
+                )
+            for toa in rows_without_keys:
+                saved_toa, _ = cls.objects.update_or_create(
+                    **{field: getattr(toa, field) for field in TOA_UNIQUE_FIELDS},
+                    defaults={field: getattr(toa, field) for field in TOA_UPSERT_FIELDS},
+                )
+                toa.pk = saved_toa.pk
+        return toas
+
+    @classmethod
+    def copy_from_tim_file(
+        cls,
+        tim_file,
+        pipeline_run_id,
+        project_short,
+        template_id,
+        ephemeris_text,
+        dm_corrected,
+        nsub_type,
+        npol,
+        nchan,
+    ):
+        """
+        Stream a .tim file (optionally gzip compressed) into the ToA table.
 
-        return created_toas
+        Each line is validated and COPY'd into a temporary staging table which is then merged into
+        the ToA table with a single INSERT ... ON CONFLICT, so memory use stays flat however large
+        the file is. As with bulk_create, lines with the same unique key collapse onto one row
+        (last line wins) and nothing is written if any line fails validation.
+
+        Returns the number of ToAs written.
+        """
+        pipeline_run = PipelineRun.objects.select_related("observation__pulsar").get(id=pipeline_run_id)
+        observation = pipeline_run.observation
+        project = Project.objects.get(short=project_short)
+        template = Template.objects.get(id=template_id)
+        ephemeris = Ephemeris.get_or_create_from_text(observation.pulsar, project, ephemeris_text)
+        toa_keys = {
+            "observation": observation,
+            "project": project,
+            "dm_corrected": dm_corrected,
+            "obs_npol": npol,
+            "obs_nchan": nchan,
+            "nsub_type": nsub_type,
+            "pipeline_run": pipeline_run,
+            "ephemeris": ephemeris,
+            "template": template,
+            "embargo_end_date": observation.utc_start + project.embargo_period,
+        }
+        toa_keys["is_public"] = is_embargo_over(toa_keys["embargo_end_date"])
+
+        if not project.toa_metadata_available:
+            # Every line collapses onto the single row with NULL chan and subint, which ON CONFLICT
+            # can't match, so only the last line needs keeping.
+            toa_values = None
+            for toa_lines in iter_chunks(iter_tim_lines(tim_file), TOA_PARSE_CHUNK_SIZE):
+                toa_values = parse_toa_lines(toa_lines, toa_metadata_available=False)[-1]
+            if toa_values is None:
+                return 0
+            cls.upsert([cls(**toa_keys, **dict(zip(TOA_LINE_FIELDS + TOA_METADATA_FIELDS, toa_values)))])
+            return 1
+
+        quote_name = connection.ops.quote_name
+        line_fields = [cls._meta.get_field(field) for field in TOA_LINE_FIELDS + TOA_METADATA_FIELDS]
+        line_columns = ", ".join(quote_name(field.column) for field in line_fields)
+        key_columns = ", ".join(quote_name(cls._meta.get_field(field).column) for field in toa_keys)
+        unique_columns = ", ".join(quote_name(cls._meta.get_field(field).column) for field in TOA_UNIQUE_FIELDS)
+        update_columns = ", ".join(
+            f"{column} = EXCLUDED.{column}"
+            for column in (quote_name(cls._meta.get_field(field).column) for field in TOA_UPSERT_FIELDS)
+        )
+        key_values = [value.pk if isinstance(value, models.Model) else value for value in toa_keys.values()]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE toa_staging ON COMMIT DROP AS "
+                f"SELECT 0 AS line_no, {line_columns} FROM {quote_name(cls._meta.db_table)} WITH NO DATA"
+            )
+            with cursor.copy(f"COPY toa_staging (line_no, {line_columns}) FROM STDIN") as copy:
+                line_no = 0
+                # Parse a chunk of lines at a time so memory stays bounded
+                for toa_lines in iter_chunks(iter_tim_lines(tim_file), TOA_PARSE_CHUNK_SIZE):
+                    for toa_values in parse_toa_lines(toa_lines, toa_metadata_available=True):
+                        # Prepare the values as the ORM would, e.g. the fractional -bw of narrow channels to an int
+                        copy.write_row(
+                            [line_no] + [field.get_prep_value(value) for field, value in zip(line_fields, toa_values)]
+                        )
+                        line_no += 1
+            cursor.execute(
+                f"INSERT INTO {quote_name(cls._meta.db_table)} ({key_columns}, {line_columns}) "
+                f"SELECT DISTINCT ON (chan, subint) {', '.join(['%s'] * len(key_values))}, {line_columns} "
+                f"FROM toa_staging ORDER BY chan, subint, line_no DESC "
+                f"ON CONFLICT ({unique_columns}) DO UPDATE SET {update_columns}",
+                key_values,
+            )
+            n_toas = cursor.rowcount
+            # ON COMMIT DROP doesn't fire when this runs inside an outer transaction
+            cursor.execute("DROP TABLE toa_staging")
+        return n_toas
+
+    @staticmethod
+    def parse_residual_lines(residual_lines):
+        """
+        Parse "id,mjd,residual,residual_err,residual_phase" lines into a dict of ToA id to
+        (mjd, residual, residual_err, residual_phase).
+
+        Raises ValueError if a line is malformed.
+        """
+        residual_info = {}
+        for residual_line in residual_lines:
+            # Loop over residual lines and and split them to get the important values
+            id, mjd, residual, residual_err, residual_phase = residual_line.split(",")
+            residual_info[int(id)] = (float(mjd), float(residual), float(residual_err), float(residual_phase))
+        return residual_info
+
+    @classmethod
+    def update_residuals(cls, residual_lines):
+        """
+        Set the residuals of ToAs from "id,mjd,residual,residual_err,residual_phase" lines.
+
+        ToAs are grouped by ephemeris so the day of year and binary orbital phase are calculated for all of
+        a group's MJDs at once from the ephemeris' binary orbit columns. Unknown ToA ids are ignored.
+
+        Returns the updated ToAs.
+        """
+        residual_info = cls.parse_residual_lines(residual_lines)
+
+        # Use a filter instead of thousands of individual gets for speed
+        toas = list(cls.objects.filter(id__in=residual_info.keys()))
+        toas_by_ephemeris = defaultdict(list)
+        for toa in toas:
+            toas_by_ephemeris[toa.ephemeris_id].append(toa)
+        # Only the period and binary orbit columns are needed, not the ephemeris JSON
+        ephemerides = Ephemeris.objects.only("id", "p0", *BINARY_ORBIT_FIELDS.values()).in_bulk(
+            toas_by_ephemeris.keys()
+        )
+
+        for ephemeris_id, ephemeris_toas in toas_by_ephemeris.items():
+            ephemeris = ephemerides[ephemeris_id]
+            mjd, residual, residual_err, residual_phase = np.array([residual_info[toa.id] for toa in ephemeris_toas]).T
+
+            # X axis types
+            day_of_year = mjd_to_day_of_year(mjd).tolist()
+            if ephemeris.binary_orbit is not None:
+                # If the pulsar is a binary then we need to calculate the phase
+                binary_orbital_phase = np.atleast_1d(ephemeris.get_binary_phase(mjd)).astype(float).tolist()
+            else:
+                binary_orbital_phase = [None] * len(ephemeris_toas)
+            # Y axis types
+            residual_sec_err = residual_err / 1e6  # Convert from ns to s
+            # Convert from ns to s the divide by period to convert to phase
+            residual_phase_err = residual_sec_err / ephemeris.p0
+
+            columns = zip(
+                day_of_year,
+                binary_orbital_phase,
+                residual.tolist(),
+                residual_sec_err.tolist(),
+                residual_phase.tolist(),
+                residual_phase_err.tolist(),
+            )
+            for toa, values in zip(ephemeris_toas, columns):
+                for field, value in zip(TOA_RESIDUAL_FIELDS, values):
+                    setattr(toa, field, value)
+
+        bulk_update_columns(
+            cls,
+            [toa.id for toa in toas],
+            {field: [getattr(toa, field) for toa in toas] for field in TOA_RESIDUAL_FIELDS},
+            batch_size=TOA_RESIDUAL_BATCH_SIZE,
+        )
+        return toas
 
     class Meta:
         constraints = [
@@ -1551,3 +2741,7 @@ class Toa(models.Model):
                 name="Unique ToA for observations, project and type of ToA (decimations).",
             )
         ]
+        indexes = [
+            models.Index(fields=["embargo_end_date"]),
+            models.Index(fields=["observation"], condition=Q(is_public=True), name="toa_public_idx"),
+        ]
@@ -0,0 +1,118 @@
+"""
+Recalculate the binary orbital phase and day of year stored on observations and ToAs, for example after an
+ephemeris is corrected or a pulsar turns out to be a binary.
+
+Rows are processed one ephemeris at a time, so the phases of a group are calculated with one vectorized call
+from the ephemeris' binary orbit columns. They are written with bulk_update_columns, which does not send
+post_save, so the summaries and other signal handlers are not re-run for values they do not depend on.
+"""
+
+from datetime import timezone
+
+import numpy as np
+
+from dataportal.models import BINARY_ORBIT_FIELDS, Ephemeris, Observation, Toa, bulk_update_columns
+from utils.day_of_year import datetime_to_day_of_year, mjd_to_day_of_year
+
+# Rows per UPDATE statement
+ORBITAL_PHASE_BATCH_SIZE = 10000
+
+
+def get_observations(pulsars=None, projects=None):
+    """
+    The observations of the named pulsars and projects (by short name), or all of them.
+    """
+    observations = Observation.objects.order_by()
+    if pulsars:
+        observations = observations.filter(pulsar__name__in=pulsars)
+    if projects:
+        observations = observations.filter(project__short__in=projects)
+    return observations
+
+
+def get_toas(pulsars=None, projects=None):
+    """
+    The ToAs of the named pulsars and projects (by short name), or all of them.
+    """
+    toas = Toa.objects.order_by()
+    if pulsars:
+        toas = toas.filter(observation__pulsar__name__in=pulsars)
+    if projects:
+        toas = toas.filter(project__short__in=projects)
+    return toas
+
+
+def get_ephemeris_ids(pulsars=None, projects=None):
+    """
+    The ids of the ephemerides used by the selected observations and ToAs.
+
+    Returns:
+        list: Sorted ids, followed by None if any observation has no ephemeris.
+    """
+    ephemeris_ids = set(get_observations(pulsars, projects).values_list("ephemeris_id", flat=True).distinct())
+    ephemeris_ids |= set(get_toas(pulsars, projects).values_list("ephemeris_id", flat=True).distinct())
+    return sorted(ephemeris_ids - {None}) + [None] * (None in ephemeris_ids)
+
+
+def get_orbital_phases(ephemeris, mjds):
+    """
+    The binary orbital phases at the MJDs as a list of floats, or of None if the pulsar is not a binary.
+    """
+    if ephemeris is None or ephemeris.binary_orbit is None:
+        return [None] * len(mjds)
+    return np.atleast_1d(ephemeris.get_binary_phase(np.asarray(mjds, dtype=np.float64))).astype(float).tolist()
+
+
+def recompute_ephemeris_phases(ephemeris_id, pulsars=None, projects=None):
+    """
+    Recalculate the binary orbital phase and day of year of the selected observations and ToAs of an ephemeris.
+
+    Parameters:
+        ephemeris_id: int or None
+            The ephemeris, or None for the observations without one, whose phases are cleared.
+        pulsars, projects: list, optional
+            Pulsar names and project short names to restrict the rows to.
+
+    Returns:
+        tuple: The number of observations and ToAs updated.
+    """
+    ephemeris = None
+    if ephemeris_id is not None:
+        ephemeris = Ephemeris.objects.only("id", *BINARY_ORBIT_FIELDS.values()).get(id=ephemeris_id)
+
+    observation_rows = list(
+        get_observations(pulsars, projects)
+        .filter(ephemeris_id=ephemeris_id)
+        .values_list("id", "utc_start", "duration")
+    )
+    if observation_rows:
+        observation_ids, utc_starts, durations = zip(*observation_rows)
+        day_of_year = datetime_to_day_of_year(
+            [utc_start.astimezone(timezone.utc).replace(tzinfo=None) for utc_start in utc_starts]
+        ).tolist()
+        # An observation without a duration has its phase calculated at its start
+        centre_mjds = Observation.get_centre_mjds(utc_starts, [duration or 0.0 for duration in durations])
+        bulk_update_columns(
+            Observation,
+            list(observation_ids),
+            {"day_of_year": day_of_year, "binary_orbital_phase": get_orbital_phases(ephemeris, centre_mjds)},
+            batch_size=ORBITAL_PHASE_BATCH_SIZE,
+        )
+
+    toa_rows = []
+    if ephemeris_id is not None:
+        toa_rows = list(get_toas(pulsars, projects).filter(ephemeris_id=ephemeris_id).values_list("id", "mjd"))
+    if toa_rows:
+        toa_ids, mjds = zip(*toa_rows)
+        mjds = np.asarray(mjds, dtype=np.float64)
+        bulk_update_columns(
+            Toa,
+            list(toa_ids),
+            {
+                "day_of_year": mjd_to_day_of_year(mjds).tolist(),
+                "binary_orbital_phase": get_orbital_phases(ephemeris, mjds),
+            },
+            batch_size=ORBITAL_PHASE_BATCH_SIZE,
+        )
+
+    return len(observation_rows), len(toa_rows)
@@ -0,0 +1,61 @@
+"""
+Keep the persisted is_public flags of observations, ephemerides, templates and ToAs in step with their embargo
+end dates.
+
+Anonymous users only see rows flagged as public, so their queries don't depend on the time and stay cached by
+django-cachalot until the table is written to. Embargoes end with the passing of time rather than a write, so the
+update_public_flags command, run every minute, releases the rows whose embargo has ended since it last ran. The
+UPDATE that releases them invalidates the cached queries of the table.
+"""
+
+from django.db.models import Q
+from django.utils import timezone
+
+from dataportal.models import Ephemeris, Observation, Template, Toa
+
+# The models with an embargo_end_date and is_public flag
+PUBLIC_DATA_MODELS = [Observation, Ephemeris, Template, Toa]
+
+
+def update_public_flags(now=None, projects=None):
+    """
+    Flag the rows whose embargo is over as public, and unflag any whose embargo was extended.
+
+    Parameters:
+        now: datetime, optional
+            The time to compare the embargo end dates with, the current time by default.
+        projects: list, optional
+            Projects to restrict the rows to.
+
+    Returns:
+        dict: The number of rows released of each model.
+    """
+    if now is None:
+        now = timezone.now()
+
+    n_released = {}
+    for model in PUBLIC_DATA_MODELS:
+        rows = model.objects.all()
+        if projects is not None:
+            rows = rows.filter(project__in=projects)
+        n_released[model] = update_row_public_flags(rows, now)
+    return n_released
+
+
+def update_row_public_flags(rows, now=None):
+    """
+    Flag the rows of a queryset of one of the PUBLIC_DATA_MODELS whose embargo is over as public, and unflag any
+    whose embargo was extended.
+
+    Returns:
+        int: The number of rows released.
+    """
+    if now is None:
+        now = timezone.now()
+    # Rows without an embargo end date were never embargoed
+    embargo_over = Q(embargo_end_date__isnull=True) | Q(embargo_end_date__lt=now)
+
+    rows = rows.order_by()
+    n_released = rows.filter(embargo_over, is_public=False).update(is_public=True)
+    rows.filter(is_public=True).exclude(embargo_over).update(is_public=False)
+    return n_released
@@ -1,4 +1,16 @@
-from rest_framework.serializers import BooleanField, CharField, FileField, IntegerField, Serializer
+from rest_framework.serializers import (
+    BooleanField,
+    CharField,
+    ChoiceField,
+    FileField,
+    IntegerField,
+    JSONField,
+    ListField,
+    Serializer,
+    ValidationError,
+)
+
+from .models import PipelineImage, Toa
 
 
 # Serializers define the API representation.
@@ -15,3 +27,50 @@ class UploadPipelineImageSerializer(Serializer):
     image_type = CharField(max_length=16)
     resolution = CharField(max_length=4)
     cleaned = BooleanField()
+
+
+class PipelineImageBundleEntrySerializer(Serializer):
+    file = CharField(max_length=255)
+    image_type = ChoiceField(choices=PipelineImage.IMAGE_TYPE_CHOICES)
+    resolution = ChoiceField(choices=PipelineImage.RESOLUTION_CHOICES)
+    cleaned = BooleanField()
+
+
+class UploadPipelineImageBundleSerializer(Serializer):
+    pipeline_run_id = IntegerField()
+    # A tar or zip archive of the images, or the images as separate files
+    bundle = FileField(required=False)
+    image_uploads = ListField(child=FileField(), required=False)
+    # A list of {"file", "image_type", "resolution", "cleaned"} describing each image, by file name
+    manifest = JSONField(binary=True)
+
+    def validate_manifest(self, manifest):
+        if not isinstance(manifest, list) or not manifest:
+            raise ValidationError("The manifest must be a non-empty list of images.")
+        entries = PipelineImageBundleEntrySerializer(data=manifest, many=True)
+        entries.is_valid(raise_exception=True)
+
+        files = [entry["file"] for entry in entries.validated_data]
+        if len(set(files)) != len(files):
+            raise ValidationError("Each file may only be listed once.")
+        keys = [(entry["image_type"], entry["cleaned"], entry["resolution"]) for entry in entries.validated_data]
+        if len(set(keys)) != len(keys):
+            raise ValidationError("Each image_type, resolution and cleaned combination may only be listed once.")
+        return entries.validated_data
+
+    def validate(self, data):
+        if ("bundle" in data) == ("image_uploads" in data):
+            raise ValidationError("Upload either a bundle or image_uploads.")
+        return data
+
+
+class UploadToaSerializer(Serializer):
+    toa_upload = FileField()
+    pipeline_run_id = IntegerField()
+    project_short = CharField(max_length=32)
+    template_id = IntegerField()
+    ephemeris_text = CharField(trim_whitespace=False)
+    dm_corrected = BooleanField()
+    nsub_type = ChoiceField(choices=Toa.NSUB_TYPES)
+    obs_npol = IntegerField()
+    obs_nchan = IntegerField()
@@ -1,16 +1,22 @@
-import numpy as np
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from dataportal.badges import clear_rule_badges_cache, update_pulsar_badges
+from dataportal.caching import bump_membership_version
 from dataportal.models import (
+    OBSERVATION_SUMMARY_KEY_FIELDS,
     Badge,
-    Calibration,
     Observation,
     ObservationSummary,
     PipelineRun,
+    ProjectMembership,
     PulsarFoldResult,
     PulsarFoldSummary,
-    PulsarSearchSummary,
+    SummaryUpdate,
 )
 
 
@@ -37,128 +43,159 @@ def handle_pulsar_fold_summary_update(sender, instance, **kwargs):
     PulsarFoldSummary.update_or_create(instance.observation.pulsar, instance.observation.project.main_project)
 
 
+def observation_summary_keys(observation):
+    """
+    The ObservationSummary (obs_type, pulsar, main_project, project, calibration, band) keys
+    that include the observation.
+    """
+    keys = []
+    if observation.obs_type in ("fold", "search"):
+        # Update fold or search summaries
+        main_project = observation.project.main_project
+        for pulsar in [observation.pulsar, None]:
+            for project in [observation.project, None]:
+                for band in [observation.band, None]:
+                    keys.append((observation.obs_type, pulsar, main_project, project, None, band))
+    # Always update calibration summaries
+    for project in [observation.project, None]:
+        keys.append((None, None, None, project, observation.calibration, None))
+    return keys
+
+
+def observation_summary_update(key):
+    obs_type, pulsar, main_project, project, calibration, band = key
+    return SummaryUpdate(
+        summary_type=SummaryUpdate.OBSERVATION_SUMMARY,
+        obs_type=obs_type,
+        pulsar=pulsar,
+        main_project=main_project,
+        project=project,
+        calibration=calibration,
+        band=band,
+    )
+
+
+def previous_observation(observation):
+    """
+    An unsaved Observation with the summary key fields the observation had before it was saved,
+    or None if they are unknown or unchanged.
+    """
+    previous = observation.previous_values
+    if previous is None or all(
+        previous[field] == getattr(observation, field) for field in OBSERVATION_SUMMARY_KEY_FIELDS
+    ):
+        return None
+    return Observation(**{field: previous[field] for field in OBSERVATION_SUMMARY_KEY_FIELDS})
+
+
+def observation_summary_updates(observation):
+    """
+    The SummaryUpdates for the Calibration session and the summaries that include the observation,
+    and the ones it was moved out of if it was saved with a different pulsar, project, band etc.
+    """
+    summary_updates = []
+    for summarised_observation in [observation, previous_observation(observation)]:
+        if summarised_observation is None:
+            continue
+        if summarised_observation.calibration is not None:
+            summary_updates.append(
+                SummaryUpdate(summary_type=SummaryUpdate.CALIBRATION, calibration=summarised_observation.calibration)
+            )
+        if summarised_observation.obs_type == "search":
+            summary_updates.append(
+                SummaryUpdate(
+                    summary_type=SummaryUpdate.SEARCH_SUMMARY,
+                    pulsar=summarised_observation.pulsar,
+                    main_project=summarised_observation.project.main_project,
+                )
+            )
+        summary_updates += [
+            observation_summary_update(key) for key in observation_summary_keys(summarised_observation)
+        ]
+    return summary_updates
+
+
+def update_observation_summaries(observations):
+    """
+    Update the Calibration sessions and summaries that include the observations.
+
+    With SUMMARY_UPDATE_QUEUE on, each distinct session and summary is queued for the process_summary_updates
+    command instead of being recalculated while the observations are saved.
+    """
+    summary_updates = {}
+    for observation in observations:
+        for summary_update in observation_summary_updates(observation):
+            summary_updates.setdefault(summary_update.key, summary_update)
+
+    if settings.SUMMARY_UPDATE_QUEUE:
+        SummaryUpdate.objects.bulk_create(summary_updates.values())
+    else:
+        SummaryUpdate.recalculate(summary_updates.values())
+
+
+def apply_observation_to_summaries(observation, previous):
+    """
+    Update the Calibration session and summaries that include a single saved observation, applying the
+    change to the stored ObservationSummary totals instead of rescanning their observations.
+    """
+    keys = observation_summary_keys(observation)
+    applied_keys = {observation_summary_update(key).key for key in keys}
+    SummaryUpdate.recalculate(
+        summary_update
+        for summary_update in observation_summary_updates(observation)
+        if summary_update.key not in applied_keys
+    )
+    # Apply in the same order SummaryUpdate.recalculate takes the summary locks
+    for obs_type, pulsar, main_project, project, calibration, band in sorted(
+        keys, key=lambda key: str(observation_summary_update(key).key)
+    ):
+        ObservationSummary.apply_observation(
+            obs_type, pulsar, main_project, project, calibration, band, observation, previous
+        )
+
+
 @receiver(post_save, sender=Observation)
-def handle_calibration_update(sender, instance, **kwargs):
+def handle_calibration_update(sender, instance, created, **kwargs):
     """
     Every time a Observation is saved, we want to update the Calibration
     to summarise the session and the ObservationSummary.
     """
-    Calibration.update_observation_session(instance.calibration)
-
-    if instance.obs_type == "search":
-        # Update the summary info (do this after the observation upload because there is no search pipeline products)
-        PulsarSearchSummary.update_or_create(instance.pulsar, instance.project.main_project)
-
-    if instance.obs_type == "fold":
-        # Update fold summaries
-        obs_type = "fold"
-        main_project = instance.project.main_project
-        calibration = None
-        for pulsar in [instance.pulsar, None]:
-            for project in [instance.project, None]:
-                for band in [instance.band, None]:
-                    ObservationSummary.update_or_create(obs_type, pulsar, main_project, project, calibration, band)
-    elif instance.obs_type == "search":
-        # Update search summaries
-        obs_type = "search"
-        main_project = instance.project.main_project
-        calibration = None
-        for pulsar in [instance.pulsar, None]:
-            for project in [instance.project, None]:
-                for band in [instance.band, None]:
-                    ObservationSummary.update_or_create(obs_type, pulsar, main_project, project, calibration, band)
-    # Always update calibration summaries
-    obs_type = None
-    pulsar = None
-    main_project = None
-    calibration = instance.calibration
-    band = None
-    for project in [instance.project, None]:
-        ObservationSummary.update_or_create(obs_type, pulsar, main_project, project, calibration, band)
+    previous = None if created else instance.previous_values
+    if settings.SUMMARY_UPDATE_QUEUE or (not created and previous is None):
+        update_observation_summaries([instance])
+    else:
+        apply_observation_to_summaries(instance, previous)
 
 
 @receiver(post_save, sender=PipelineRun)
 def handle_badge_creation(sender, instance, **kwargs):
     """
-    Every time a PipelineRun is saved, create badges based on the results.
+    Every time a PipelineRun is saved, re-evaluate the badge rules of dataportal.badges for the pulsar.
     """
     if instance.job_state != "Completed":
         # Only create badges for completed jobs
         return
 
-    # RFI badge
-    rfi_badge, created = Badge.objects.get_or_create(
-        name="Strong RFI",
-        description="Over 20% of RFI removed from observation",
-    )
-    if instance.percent_rfi_zapped > 0.2:
-        instance.badges.add(rfi_badge)
+    # Badges depend on all the fold results of the pulsar
+    update_pulsar_badges(instance.observation.pulsar, instance.observation.project.main_project)
 
-    # RM badge
-    rm_badge, created = Badge.objects.get_or_create(
-        name="RM Drift",
-        description="The Rotation Measure has drifted three weighted standard deviations from the weighted mean",
-    )
-    # Get median and std RM for the pulsar
-    pfrs_of_pulsar = PulsarFoldResult.objects.filter(
-        pulsar=instance.observation.pulsar,
-        observation__project__main_project=instance.observation.project.main_project,
-    )
-    rm_and_rm_error = (
-        pfrs_of_pulsar.exclude(pipeline_run__rm__isnull=True)
-        .exclude(pipeline_run__rm_err__isnull=True)
-        .values_list("pipeline_run__rm", "pipeline_run__rm_err")
-    )
-    if len(rm_and_rm_error) > 0:
-        rms, rm_errors = zip(*rm_and_rm_error)
-        rms_array = np.array(rms)
-        rms_errors_array = np.array(rm_errors)
-        # Calculate weighted mean and std
-        rms_weights = 1 / (rms_errors_array**2)
-        rms_weights /= np.sum(rms_weights)
-        rm_mean = np.average(rms_array, weights=rms_weights)
-        rm_std = np.sqrt(np.average((rms_array - rm_mean) ** 2, weights=rms_weights))
-        # Loop over pipeline runs for the pulsar and check if they have the RM badge
-        for pfr in pfrs_of_pulsar:
-            pipeline_run = pfr.pipeline_run
-            if pipeline_run.rm is None:
-                # Skip pipeline runs with no RM
-                continue
-            if abs(pipeline_run.rm - rm_mean) > 3 * rm_std and rm_std != 0:
-                pipeline_run.badges.add(rm_badge)
-            else:
-                pipeline_run.badges.remove(rm_badge)
-
-    # DM badge
-    dm_badge, created = Badge.objects.get_or_create(
-        name="DM Drift",
-        description="The DM has drifted away from the median DM of the pulsar enough to cause a dispersion of three profile bins",  # noqa
-    )
-    # Get median DM for the pulsar
-    dms = sorted(pfrs_of_pulsar.exclude(pipeline_run__dm__isnull=True).values_list("pipeline_run__dm", flat=True))
-    count = len(dms)
-    middle = count // 2
-    if count % 2 == 0:
-        # If even number of elements, take average of middle two elements
-        dm_median = (dms[middle - 1] + dms[middle]) / 2
-    else:
-        # If odd number of elements, take the middle element
-        dm_median = dms[middle]
-    # Loop over pipeline runs for the pulsar and check if they have the DM badge
-    for pfr in pfrs_of_pulsar:
-        pipeline_run = pfr.pipeline_run
-        if pipeline_run.dm is None:
-            # Skip pipeline runs with no DM
-            continue
-        # Get the duration os a bin in milliseconds
-        bin_duration_ms = pipeline_run.observation.ephemeris.p0 / pipeline_run.observation.fold_nbin * 1000
-        # Use this to calculate the DM required to cause a dispersion of one bin
-        dm_dispersion = (
-            bin_duration_ms
-            * pipeline_run.observation.frequency**3
-            / (8.3 * 10.0**6 * pipeline_run.observation.bandwidth)
-        )
-        if abs(pipeline_run.dm - dm_median) > 3 * dm_dispersion:
-            pipeline_run.badges.add(dm_badge)
-        else:
-            pipeline_run.badges.remove(dm_badge)
+
+@receiver(post_delete, sender=Badge)
+@receiver(post_save, sender=Badge)
+def handle_badge_change(sender, instance, **kwargs):
+    """
+    Forget the cached badge ids of the badge rules when a badge changes.
+    """
+    clear_rule_badges_cache()
+
+
+@receiver(post_delete, sender=ProjectMembership)
+@receiver(post_save, sender=ProjectMembership)
+def handle_project_membership_change(sender, instance, **kwargs):
+    """
+    Forget the resolved memberships of the user so their access changes as soon as the change is committed.
+
+    Bumping before the commit would let another request cache the memberships from before the change under
+    the new version.
+    """
+    transaction.on_commit(partial(bump_membership_version, instance.user_id))
@@ -1,21 +1,68 @@
 import hashlib
 import os
 import re
+import tarfile
+import uuid
+import zipfile
+from contextlib import contextmanager
 from datetime import datetime
 
+from django.core.files import File
 from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+# Bytes read at a time when hashing a file
+HASH_CHUNK_SIZE = 1024 * 1024
+# Limits on the files in an uploaded bundle, so a small archive can't unpack into a huge amount of data
+BUNDLE_MAX_FILES = 1000
+BUNDLE_MAX_FILE_SIZE = 100 * 1024 * 1024
+BUNDLE_MAX_TOTAL_SIZE = 1024 * 1024 * 1024
 
 
 def create_file_hash(opened_file):
     sha256_hash = hashlib.sha256()
-    # Open the file in binary mode
-    file_content = opened_file.read()
-    # Update the hash object with the file content
-    sha256_hash.update(file_content)
+    # Read the file in chunks so large files are never held in memory
+    for chunk in iter(lambda: opened_file.read(HASH_CHUNK_SIZE), b""):
+        sha256_hash.update(chunk)
     # Get the hexadecimal representation of the hash
     return sha256_hash.hexdigest()
 
 
+def get_uploaded_file_hash(uploaded_file):
+    """
+    Return the SHA-256 hex digest of an uploaded file, using the hash HashingFileUploadHandler made
+    while the file was received when there is one.
+    """
+    if getattr(uploaded_file, "sha256", None) is not None:
+        return uploaded_file.sha256
+    uploaded_file.seek(0)
+    file_hash = create_file_hash(uploaded_file)
+    uploaded_file.seek(0)
+    return file_hash
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spool uploaded files to temporary files, hashing each chunk as it is written.
+
+    The SHA-256 hex digest is set as the sha256 attribute of the uploaded file, so the file never
+    has to be read back to be hashed.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256_hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.sha256_hash.hexdigest()
+        return uploaded_file
+
+
 def get_upload_location(instance, filename):
     """
     This method provides a filename to store an uploaded image.
@@ -55,6 +102,22 @@ def get_template_upload_location(instance, filename):
     return f"{project_code}/{pulsar}/{band}/{created_at}_{file_basename}"
 
 
+def get_template_content_location(instance, filename):
+    """
+    This method provides a content addressed filename to store an uploaded template, so identical
+    template files are stored once.
+    Inputs:
+    instance: instance of a Template class with its template_hash set
+    filename: string
+
+    returns:
+    string:
+    """
+    template_hash = instance.template_hash
+    file_basename = os.path.basename(filename)
+    return f"templates/{template_hash[:2]}/{template_hash}/{file_basename}"
+
+
 def get_pipeline_upload_location(instance, filename):
     """
     This method provides a filename to store an uploaded file produced by a pipeline.
@@ -73,6 +136,71 @@ def get_pipeline_upload_location(instance, filename):
     return f"{telescope}/{project}/{psr}/{utc}/{beam}/{filename}"
 
 
+@contextmanager
+def open_file_bundle(bundle):
+    """
+    Open a tar (optionally compressed) or zip archive and provide its regular files by base name.
+
+    Members are only read when their file is, so each can be streamed to storage in turn without
+    extracting the whole archive. Directories, links and hidden files are skipped. A ValueError is raised
+    if the archive has more than BUNDLE_MAX_FILES files, or its files are larger than BUNDLE_MAX_FILE_SIZE
+    or BUNDLE_MAX_TOTAL_SIZE in total once unpacked. Reading a member never returns more than the size
+    its header gives.
+
+    Inputs:
+    bundle: file object of the archive
+
+    returns:
+    dict: base name to a django File of each member
+    """
+    if zipfile.is_zipfile(bundle):
+        bundle.seek(0)
+        with zipfile.ZipFile(bundle) as archive:
+            members = check_bundle_members(
+                (member for member in archive.infolist() if not member.is_dir()), lambda member: member.file_size
+            )
+            yield bundle_files(members, lambda member: member.filename, archive.open)
+        return
+
+    bundle.seek(0)
+    try:
+        archive = tarfile.open(fileobj=bundle, mode="r:*")
+    except tarfile.ReadError:
+        raise ValueError("The bundle is not a tar or zip archive.")
+    with archive:
+        # Iterate rather than getmembers() so an oversized member is rejected before its data is decompressed
+        members = check_bundle_members((member for member in archive if member.isfile()), lambda member: member.size)
+        yield bundle_files(members, lambda member: member.name, archive.extractfile)
+
+
+def check_bundle_members(members, get_size):
+    checked_members = []
+    total_size = 0
+    for member in members:
+        if len(checked_members) == BUNDLE_MAX_FILES:
+            raise ValueError(f"The bundle contains more than {BUNDLE_MAX_FILES} files.")
+        size = get_size(member)
+        if size > BUNDLE_MAX_FILE_SIZE:
+            raise ValueError(f"The bundle contains a file larger than {BUNDLE_MAX_FILE_SIZE} bytes.")
+        total_size += size
+        if total_size > BUNDLE_MAX_TOTAL_SIZE:
+            raise ValueError(f"The files in the bundle are larger than {BUNDLE_MAX_TOTAL_SIZE} bytes in total.")
+        checked_members.append(member)
+    return checked_members
+
+
+def bundle_files(members, get_name, open_member):
+    files = {}
+    for member in members:
+        name = os.path.basename(get_name(member))
+        if not name or name.startswith("."):
+            continue
+        if name in files:
+            raise ValueError(f"The bundle contains more than one file named {name}.")
+        files[name] = File(open_member(member), name=name)
+    return files
+
+
 def get_valid_filename(s):
     """
     Return the given string converted to a string that can be used for a clean
@@ -108,3 +236,24 @@ class OverwriteStorage(FileSystemStorage):
         use in the target storage system.
         """
         return get_valid_filename(name)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Provide a storage for files named by a hash of their content, where a file that already exists
+    has the same content so is kept rather than written again
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def get_valid_name(self, name):
+        return get_valid_filename(name)
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # Write under a unique name first so a concurrent upload of the same file never sees it half written
+        partial_name = super()._save(f"{name}.{uuid.uuid4().hex}.part", content)
+        os.replace(self.path(partial_name), self.path(name))
+        return name
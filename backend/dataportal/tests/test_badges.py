@@ -1,7 +1,23 @@
+import multiprocessing
 import os
+from io import StringIO
+from unittest.mock import patch
 
+import numpy as np
+from django.core.management import call_command
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
+from dataportal.badges import (
+    BADGE_RULES,
+    apply_badge_changes,
+    dm_drift,
+    get_rule_badges,
+    load_badge_columns,
+    rm_drift,
+    update_pulsar_badges,
+)
 from dataportal.models import Badge, Calibration, PipelineRun, Toa
 from dataportal.tests.test_base import BaseTestCaseWithTempMedia
 from dataportal.tests.testing_utils import create_basic_data, create_observation_pipeline_run_toa, setup_query_test
@@ -48,6 +64,13 @@ class BadgeTestCase(BaseTestCaseWithTempMedia):
         self.assertGreater(pipeline_run.percent_rfi_zapped, 0.2)
         self.assertIn(rfi_badge, pipeline_run.badges.all())
 
+        # The badge is only ever added, so it stays when the RFI drops
+        pipeline_run.percent_rfi_zapped = 0.1
+        pipeline_run.save()
+        self.assertIn(rfi_badge, pipeline_run.badges.all())
+        call_command("recompute_badges", stdout=StringIO(), stderr=StringIO())
+        self.assertIn(rfi_badge, pipeline_run.badges.all())
+
     def test_rm_badge(self):
         telescope, project, ephemeris, template = create_basic_data()
 
@@ -153,6 +176,147 @@ class BadgeTestCase(BaseTestCaseWithTempMedia):
         self.assertEqual(pr4.badges.filter(id=dm_badge.id).count(), 0)
 
 
+class BadgeEngineTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, project, ephemeris, template = create_basic_data()
+        self.pipeline_runs = []
+        for file_name, rm, rm_err, dm in [
+            ("2019-04-23-06:11:30_1_J0125-2327.json", 10.0, 0.1, 10.0),
+            ("2019-05-14-10:14:18_1_J0125-2327.json", 10.1, 0.1, 10.0005),
+            ("2019-12-15-17:22:31_1_J0125-2327.json", 200.0, 10.0, None),
+            ("2020-07-10-05:07:28_2_J0125-2327.json", None, None, 11.002),
+        ]:
+            observation, _, pipeline_run = create_observation_pipeline_run_toa(
+                os.path.join(TEST_DATA_DIR, file_name),
+                telescope,
+                template,
+                make_toas=False,
+                rm=rm,
+                rm_err=rm_err,
+                dm=dm,
+            )
+            self.pipeline_runs.append(pipeline_run)
+        self.pulsar = observation.pulsar
+        self.main_project = observation.project.main_project
+        self.rm_badge = Badge.objects.get(name="RM Drift")
+        self.dm_badge = Badge.objects.get(name="DM Drift")
+
+    def badge_ids(self, badge):
+        return set(badge.pipelinerun_set.values_list("id", flat=True))
+
+    def test_rules(self):
+        columns = load_badge_columns(self.pulsar, self.main_project)
+        order = [int(np.flatnonzero(columns["pipeline_run_id"] == pr.id)[0]) for pr in self.pipeline_runs]
+
+        evaluated, flagged = rm_drift(columns)
+        self.assertEqual(evaluated[order].tolist(), [True, True, True, False])
+        self.assertEqual(flagged[order].tolist(), [False, False, True, False])
+
+        evaluated, flagged = dm_drift(columns)
+        self.assertEqual(evaluated[order].tolist(), [True, True, False, True])
+        self.assertEqual(flagged[order].tolist(), [False, False, False, True])
+
+        self.assertEqual(self.badge_ids(self.rm_badge), {self.pipeline_runs[2].id})
+        self.assertEqual(self.badge_ids(self.dm_badge), {self.pipeline_runs[3].id})
+
+    def test_rules_without_values_evaluate_nothing(self):
+        PipelineRun.objects.update(rm=None, dm=None)
+        columns = load_badge_columns(self.pulsar, self.main_project)
+
+        for rule in (rm_drift, dm_drift):
+            evaluated, flagged = rule(columns)
+            self.assertFalse(evaluated.any())
+            self.assertFalse(flagged.any())
+
+    def test_only_changes_are_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            update_pulsar_badges(self.pulsar, self.main_project)
+
+        through_table = PipelineRun.badges.through._meta.db_table
+        for query in queries.captured_queries:
+            self.assertFalse(query["sql"].startswith(("INSERT", "DELETE")) and through_table in query["sql"])
+
+        pipeline_run_ids = np.array([pr.id for pr in self.pipeline_runs])
+        evaluated = np.array([True, True, True, True])
+        to_add, to_remove = apply_badge_changes(
+            self.rm_badge.id, pipeline_run_ids, evaluated, np.array([True, False, False, False])
+        )
+        self.assertEqual(to_add, {self.pipeline_runs[0].id})
+        self.assertEqual(to_remove, {self.pipeline_runs[2].id})
+        self.assertEqual(self.badge_ids(self.rm_badge), {self.pipeline_runs[0].id})
+
+        # Rows that were not evaluated keep their badges
+        to_add, to_remove = apply_badge_changes(
+            self.rm_badge.id, pipeline_run_ids, np.array([False, True, True, True]), np.zeros(4, dtype=bool)
+        )
+        self.assertEqual((to_add, to_remove), (set(), set()))
+        self.assertEqual(self.badge_ids(self.rm_badge), {self.pipeline_runs[0].id})
+
+    def recompute_badges(self, *args):
+        stdout = StringIO()
+        call_command("recompute_badges", *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_recompute_badges(self):
+        # Simulate assignments made under different thresholds
+        PipelineRun.badges.through.objects.filter(badge=self.rm_badge).delete()
+        self.pipeline_runs[0].badges.add(self.dm_badge)
+
+        output = self.recompute_badges("--dry-run")
+
+        self.assertIn(f"+ J0125-2327 (MeerTIME) RM Drift: pipeline run {self.pipeline_runs[2].id}", output)
+        self.assertIn(f"- J0125-2327 (MeerTIME) DM Drift: pipeline run {self.pipeline_runs[0].id}", output)
+        self.assertIn("Would add 1 and would remove 1 badge assignments across 1 pulsars.", output)
+        self.assertEqual(self.badge_ids(self.rm_badge), set())
+        self.assertEqual(self.badge_ids(self.dm_badge), {self.pipeline_runs[0].id, self.pipeline_runs[3].id})
+
+        output = self.recompute_badges("--pulsar", "J0125-2327")
+
+        self.assertIn("Added 1 and removed 1 badge assignments across 1 pulsars.", output)
+        self.assertEqual(self.badge_ids(self.rm_badge), {self.pipeline_runs[2].id})
+        self.assertEqual(self.badge_ids(self.dm_badge), {self.pipeline_runs[3].id})
+        self.assertIn("Added 0 and removed 0", self.recompute_badges())
+
+    def test_rule_badges_are_resolved_once(self):
+        with patch("dataportal.badges.cache.get", return_value=None) as mock_get:
+            badge_ids = get_rule_badges()
+        mock_get.assert_called_once()
+        self.assertEqual(set(badge_ids), set(BADGE_RULES))
+        self.assertEqual(badge_ids["RM Drift"], self.rm_badge.id)
+
+        with patch("dataportal.badges.cache.get", return_value=badge_ids):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(get_rule_badges(), badge_ids)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+
+# Worker processes only see committed data, so this can't run inside a TestCase transaction
+class RecomputeBadgesWorkersTestCase(TransactionTestCase):
+    def test_workers_match_serial(self):
+        if multiprocessing.current_process().daemon:
+            self.skipTest("Worker processes can't be started from a parallel test runner process")
+        telescope, project, ephemeris, template = create_basic_data()
+        for file_name, dm in [
+            ("2019-04-23-06:11:30_1_J0125-2327.json", 10.0),
+            ("2019-05-14-10:14:18_1_J0125-2327.json", 10.0005),
+            ("2020-07-10-05:07:28_2_J0125-2327.json", 11.002),
+            ("2023-04-17-15:08:35_1_J0437-4715.json", 20.0),
+        ]:
+            create_observation_pipeline_run_toa(
+                os.path.join(TEST_DATA_DIR, file_name), telescope, template, make_toas=False, dm=dm
+            )
+        assignments = set(PipelineRun.badges.through.objects.values_list("pipelinerun_id", "badge_id"))
+        PipelineRun.badges.through.objects.all().delete()
+
+        stdout = StringIO()
+        call_command("recompute_badges", "--workers", "2", stdout=stdout, stderr=StringIO())
+
+        self.assertIn(f"Added {len(assignments)} and removed 0 badge assignments across 2 pulsars.", stdout.getvalue())
+        self.assertEqual(
+            set(PipelineRun.badges.through.objects.values_list("pipelinerun_id", "badge_id")), assignments
+        )
+
+
 # Using TransactionTestCase for this test as it might require transaction management
 class SessionTimingJumpBadgeTestCase(BaseTestCaseWithTempMedia, TransactionTestCase):
     def test_session_timing_jump_badge(self):
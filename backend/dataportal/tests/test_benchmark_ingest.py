@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from dataportal.models import Observation, Pulsar, Toa
+
+
+class BenchmarkIngestTestCase(TestCase):
+    def test_writes_report_and_rolls_back(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command(
+                "benchmark_ingest",
+                "--pulsars=2",
+                "--observations=3",
+                "--nchan=2",
+                "--nsubint=2",
+                "--trace-memory",
+                f"--output={output}",
+                stdout=StringIO(),
+            )
+            with open(output) as report_file:
+                report = json.load(report_file)
+
+        self.assertEqual(report["config"]["n_pulsars"], 2)
+        stages = report["stages"]
+        self.assertEqual(
+            list(stages),
+            [
+                "create_observation",
+                "create_pipeline_run",
+                "create_toa",
+                "create_residual",
+                "post_save_cascade",
+                "summary_recalculation",
+            ],
+        )
+        self.assertEqual(stages["create_observation"]["rows"], 6)
+        self.assertEqual(stages["create_pipeline_run"]["rows"], 6)
+        self.assertEqual(stages["create_toa"]["rows"], 24)
+        self.assertEqual(stages["create_residual"]["rows"], 24)
+        for stage in stages.values():
+            self.assertGreater(stage["queries"], 0)
+            self.assertGreater(stage["rows_per_sec"], 0)
+            self.assertGreater(stage["peak_rss_mb"], 0)
+            self.assertIsNotNone(stage["peak_traced_mb"])
+        # Everything the benchmark wrote is rolled back
+        self.assertFalse(Observation.objects.exists())
+        self.assertFalse(Toa.objects.exists())
+        self.assertFalse(Pulsar.objects.exists())
@@ -0,0 +1,162 @@
+import json
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from graphene_django.utils.testing import GraphQLTestCase
+
+from dataportal.models import Calibration, Ephemeris, Observation, ObservationSummary, Project, Telescope
+from dataportal.signals import observation_summary_keys
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data
+
+OBSERVATION_FILES = [
+    "2019-04-23-06:11:30_1_J0125-2327.json",
+    "2019-05-14-10:14:18_1_J0125-2327.json",
+    "2019-12-15-17:22:31_1_J0125-2327.json",
+    "2020-07-10-05:07:28_2_J0125-2327.json",
+]
+
+CREATE_OBSERVATIONS = """
+    mutation ($inputs: [ObservationInput!]!) {
+        createObservations(inputs: $inputs) {
+            observations {
+                id
+                utcStart
+                beam
+                nant
+            }
+        }
+    }
+"""
+
+
+class CreateObservationsTestCase(BaseTestCaseWithTempMedia, GraphQLTestCase):
+    def setUp(self):
+        create_basic_data()
+        Telescope.objects.create(name="MeerKAT")
+        self.calibration = Calibration.objects.create(calibration_type="pre")
+        user = get_user_model().objects.create_superuser(username="admin", email="admin@example.com", password="x")
+        self.client.force_login(user)
+
+        self.inputs = []
+        for file_name in OBSERVATION_FILES:
+            with open(os.path.join(TEST_DATA_DIR, file_name), "r") as json_file:
+                meertime_data = json.load(json_file)
+            utc_start = datetime.strptime(f"{meertime_data['utcStart']} +0000", "%Y-%m-%d-%H:%M:%S %z")
+            observation_input = {
+                key: value
+                for key, value in meertime_data.items()
+                if key not in ("schedule_block_id", "cal_type", "cal_location")
+            }
+            observation_input["utcStart"] = utc_start.isoformat()
+            observation_input["calibrationId"] = self.calibration.id
+            self.inputs.append(observation_input)
+
+    def create_observations(self, inputs):
+        response = self.query(CREATE_OBSERVATIONS, variables={"inputs": inputs})
+        return json.loads(response.content)
+
+    def test_creates_observations_with_derived_fields(self):
+        content = self.create_observations(self.inputs)
+
+        self.assertNotIn("errors", content)
+        self.assertEqual(len(content["data"]["createObservations"]["observations"]), 4)
+        self.assertEqual(Observation.objects.count(), 4)
+        for observation in Observation.objects.all():
+            derived_fields = (
+                observation.band,
+                observation.day_of_year,
+                observation.embargo_end_date,
+                observation.binary_orbital_phase,
+            )
+            self.assertIsNotNone(observation.binary_orbital_phase)
+            # Saving one at a time derives the same values
+            observation.save()
+            self.assertEqual(
+                derived_fields[:3], (observation.band, observation.day_of_year, observation.embargo_end_date)
+            )
+            self.assertAlmostEqual(derived_fields[3], observation.binary_orbital_phase, places=12)
+
+    def test_updates_summaries_once_per_key(self):
+        with patch(
+            "dataportal.models.ObservationSummary.update_or_create", wraps=ObservationSummary.update_or_create
+        ) as mock_update:
+            self.create_observations(self.inputs)
+
+        called_keys = [call.args for call in mock_update.call_args_list]
+        expected_keys = {
+            key for observation in Observation.objects.all() for key in observation_summary_keys(observation)
+        }
+        self.assertEqual(len(called_keys), len(expected_keys))
+        self.assertEqual(set(called_keys), expected_keys)
+
+        project = Project.objects.get(code="SCI-20180516-MB-05")
+        summary = ObservationSummary.objects.get(
+            obs_type="fold", pulsar=None, main_project=project.main_project, project=None, calibration=None, band=None
+        )
+        self.assertEqual(summary.observations, 4)
+        self.calibration.refresh_from_db()
+        self.assertEqual(self.calibration.n_observations, 4)
+
+    def test_reupload_updates_existing_observations(self):
+        first_ids = [
+            observation["id"]
+            for observation in self.create_observations(self.inputs)["data"]["createObservations"]["observations"]
+        ]
+
+        self.inputs[1]["nant"] = 12
+        content = self.create_observations(self.inputs + [dict(self.inputs[2], nant=13)])
+
+        observations = content["data"]["createObservations"]["observations"]
+        self.assertEqual([observation["id"] for observation in observations[:4]], first_ids)
+        self.assertEqual(observations[4]["id"], first_ids[2])
+        self.assertEqual(Observation.objects.count(), 4)
+        self.assertEqual(
+            list(Observation.objects.order_by("utc_start").values_list("nant", flat=True)),
+            [self.inputs[0]["nant"], 12, 13, self.inputs[3]["nant"]],
+        )
+
+    def test_reupload_updates_the_summaries_observations_move_out_of(self):
+        self.create_observations(self.inputs)
+        band = Observation.objects.get(utc_start=self.inputs[0]["utcStart"]).band
+
+        self.create_observations([dict(self.inputs[0], frequency=816.0, bandwidth=544.0)])
+
+        observation = Observation.objects.get(utc_start=self.inputs[0]["utcStart"])
+        self.assertNotEqual(observation.band, band)
+        for summary_band in [band, observation.band]:
+            summary = ObservationSummary.objects.get(
+                obs_type="fold",
+                pulsar=observation.pulsar,
+                main_project=observation.project.main_project,
+                project=observation.project,
+                calibration=None,
+                band=summary_band,
+            )
+            self.assertEqual(
+                summary.observations,
+                Observation.objects.filter(
+                    pulsar=observation.pulsar, project=observation.project, band=summary_band
+                ).count(),
+            )
+
+    def test_missing_foreign_key_writes_nothing(self):
+        content = self.create_observations(self.inputs + [dict(self.inputs[0], pulsarName="J0000+0000")])
+
+        self.assertIn("errors", content)
+        self.assertIn("J0000+0000", content["errors"][0]["message"])
+        self.assertFalse(Observation.objects.exists())
+
+    def test_failed_summary_update_writes_nothing(self):
+        ephemeris_count = Ephemeris.objects.count()
+        with patch(
+            "dataportal.graphql.mutation_tables.observation.update_observation_summaries",
+            side_effect=ValueError("Summary update failed"),
+        ):
+            content = self.create_observations(self.inputs)
+
+        self.assertIn("errors", content)
+        self.assertFalse(Observation.objects.exists())
+        self.assertEqual(Ephemeris.objects.count(), ephemeris_count)
@@ -0,0 +1,110 @@
+import io
+import os
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+
+from dataportal.models import Ephemeris, Observation, Project, Template, Toa
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+
+TIMING_DIR = os.path.join(TEST_DATA_DIR, "timing_files")
+TOA_16CH = os.path.join(TIMING_DIR, "J0437-4715_2023-10-22-04:41:07_zap.16ch1p1t.ar.tim")
+
+
+class EmbargoEndDateTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, self.template = create_basic_data()
+        self.observation, _, self.pipeline_run = create_observation_pipeline_run_toa(
+            os.path.join(TIMING_DIR, "2023-10-22-04:41:07_1_J0437-4715.json"),
+            telescope,
+            self.template,
+        )
+        self.project = self.observation.project
+
+    def toa_kwargs(self, project_short="PTA"):
+        return {
+            "pipeline_run_id": self.pipeline_run.id,
+            "project_short": project_short,
+            "template_id": self.template.id,
+            "ephemeris_text": os.path.join(TEST_DATA_DIR, "J0125-2327.par"),
+            "dm_corrected": False,
+            "nsub_type": "1",
+            "npol": 1,
+            "nchan": 16,
+        }
+
+    def assertEmbargoEndDates(self):
+        for observation in Observation.objects.select_related("project"):
+            self.assertEqual(observation.embargo_end_date, observation.utc_start + observation.project.embargo_period)
+        for model in [Ephemeris, Template]:
+            for instance in model.objects.select_related("project"):
+                self.assertEqual(instance.embargo_end_date, instance.created_at + instance.project.embargo_period)
+        for toa in Toa.objects.select_related("observation", "project"):
+            self.assertEqual(toa.embargo_end_date, toa.observation.utc_start + toa.project.embargo_period)
+
+    def test_embargo_end_dates_are_set_on_save(self):
+        self.assertEqual(Toa.objects.count(), 1)
+
+        self.assertEmbargoEndDates()
+
+    def test_bulk_toa_ingest_sets_embargo_end_dates(self):
+        with open(TOA_16CH, "r") as toa_file:
+            toa_lines = toa_file.readlines()
+        Toa.bulk_create(toa_lines=toa_lines, **self.toa_kwargs())
+        with open(TOA_16CH, "rb") as toa_file:
+            Toa.copy_from_tim_file(tim_file=io.BytesIO(toa_file.read()), **self.toa_kwargs("TPA"))
+
+        self.assertEqual(Toa.objects.filter(embargo_end_date=None).count(), 0)
+        self.assertEqual(Toa.objects.filter(project__short="TPA").count(), 16)
+        self.assertEmbargoEndDates()
+
+    def test_changing_embargo_period_updates_embargo_end_dates(self):
+        project = Project.objects.get(id=self.project.id)
+        project.embargo_period = timedelta(days=30)
+        project.save()
+
+        self.assertEqual(Toa.objects.get().embargo_end_date, self.observation.utc_start + timedelta(days=30))
+        self.assertEmbargoEndDates()
+
+    def test_saving_unchanged_embargo_period_leaves_embargo_end_dates(self):
+        Toa.objects.update(embargo_end_date=None)
+
+        project = Project.objects.get(id=self.project.id)
+        project.description = "Changed"
+        project.save()
+
+        self.assertIsNone(Toa.objects.get().embargo_end_date)
+
+    def test_access_policies_compare_embargo_end_dates(self):
+        for model in [Observation, Ephemeris, Toa]:
+            sql = str(model.objects.accessible_to(AnonymousUser()).query)
+            self.assertIn("embargo_end_date", sql)
+            self.assertNotIn("embargo_period", sql)
+
+    def test_queryset_updates_rederive_embargo_end_dates(self):
+        released = timezone.now() - timedelta(days=3650)
+        for model in [Ephemeris, Template]:
+            model.objects.update(created_at=released)
+        Observation.objects.update(utc_start=released)
+
+        self.assertEmbargoEndDates()
+        for model in [Observation, Ephemeris, Template, Toa]:
+            self.assertFalse(model.objects.filter(is_public=False).exists())
+
+        other_project = Project.objects.get(short="TPA")
+        other_project.embargo_period = timedelta(days=36500)
+        other_project.save()
+        Toa.objects.update(project=other_project)
+
+        self.assertEmbargoEndDates()
+        self.assertFalse(Toa.objects.get().is_public)
+
+    def test_changing_observation_start_updates_toa_embargo_end_dates(self):
+        observation = Observation.objects.get(id=self.observation.id)
+        observation.utc_start -= timedelta(days=3650)
+        observation.save()
+
+        self.assertEmbargoEndDates()
+        self.assertTrue(Toa.objects.get().is_public)
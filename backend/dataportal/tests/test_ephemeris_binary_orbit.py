@@ -0,0 +1,58 @@
+import json
+import os
+from unittest.mock import patch
+
+import numpy as np
+
+from dataportal.models import BINARY_ORBIT_FIELDS, Ephemeris, Project, Pulsar
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data
+from utils.binary_phase import get_binary_phase, get_T0
+
+PAR_FILE = os.path.join(TEST_DATA_DIR, "J0125-2327.par")
+
+
+class EphemerisBinaryOrbitTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        create_basic_data()
+        self.pulsar = Pulsar.objects.get(name="J0125-2327")
+        self.project = Project.objects.get(short="PTA")
+        with open(PAR_FILE, "r") as par_file:
+            self.ephemeris = Ephemeris.get_or_create_from_text(self.pulsar, self.project, par_file.read())
+        self.ephemeris_dict = json.loads(self.ephemeris.ephemeris_data)
+
+    def test_binary_orbit_is_extracted_on_save(self):
+        ephemeris = Ephemeris.objects.get(id=self.ephemeris.id)
+
+        # ELL1 orbits are converted to the periastron T0, eccentricity and omega of EPS1 and EPS2
+        self.assertEqual(ephemeris.binary_t0, get_T0(self.ephemeris_dict))
+        self.assertEqual(ephemeris.binary_pb, self.ephemeris_dict["PB"])
+        self.assertAlmostEqual(
+            ephemeris.binary_ecc, np.hypot(self.ephemeris_dict["EPS1"], self.ephemeris_dict["EPS2"]), delta=1e-15
+        )
+        self.assertIsNone(ephemeris.binary_fb)
+
+    def test_binary_phase_matches_ephemeris_data(self):
+        mjds = np.linspace(58000, 60000, 50)
+        ephemeris = Ephemeris.objects.only(*BINARY_ORBIT_FIELDS.values()).get(id=self.ephemeris.id)
+
+        with patch("dataportal.models.json.loads") as mock_loads:
+            binary_phases = ephemeris.get_binary_phase(mjds)
+
+        mock_loads.assert_not_called()
+        np.testing.assert_allclose(binary_phases, get_binary_phase(mjds, self.ephemeris_dict), atol=1e-12)
+
+    def test_isolated_pulsar_has_no_binary_orbit(self):
+        isolated_dict = {
+            key: value
+            for key, value in self.ephemeris_dict.items()
+            if key.split("_")[0] not in ("BINARY", "PB", "TASC", "EPS1", "EPS2", "A1")
+        }
+        self.ephemeris.ephemeris_data = json.dumps(isolated_dict)
+        self.ephemeris.save()
+        self.ephemeris.refresh_from_db()
+
+        for field in BINARY_ORBIT_FIELDS.values():
+            self.assertIsNone(getattr(self.ephemeris, field))
+        self.assertIsNone(self.ephemeris.binary_orbit)
+        self.assertIsNone(self.ephemeris.get_binary_phase(np.array([59000.0])))
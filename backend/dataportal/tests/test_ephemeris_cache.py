@@ -0,0 +1,87 @@
+import json
+import os
+from unittest.mock import patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from dataportal.caching import clear_ephemeris_cache, get_parsed_ephemeris
+from dataportal.models import Ephemeris, Project, Pulsar
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data
+from utils.ephemeris import parse_ephemeris_file
+
+PAR_FILE = os.path.join(TEST_DATA_DIR, "J0125-2327.par")
+
+
+class EphemerisCacheTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        clear_ephemeris_cache()
+        self.addCleanup(clear_ephemeris_cache)
+        with open(PAR_FILE, "r") as par_file:
+            self.par_text = par_file.read()
+
+    def test_text_is_parsed_once(self):
+        with patch("dataportal.caching.parse_ephemeris_file", wraps=parse_ephemeris_file) as mock_parse:
+            ephemeris_dicts = [get_parsed_ephemeris(self.par_text) for _ in range(5)]
+
+        self.assertEqual(mock_parse.call_count, 1)
+        self.assertEqual(ephemeris_dicts[0], parse_ephemeris_file(self.par_text))
+        self.assertTrue(all(ephemeris_dict == ephemeris_dicts[0] for ephemeris_dict in ephemeris_dicts))
+
+    def test_returns_copies(self):
+        ephemeris_dict = get_parsed_ephemeris(self.par_text)
+        ephemeris_dict["P0"] = None
+
+        self.assertIsNotNone(get_parsed_ephemeris(self.par_text)["P0"])
+
+    def test_paths_are_not_cached(self):
+        with patch("dataportal.caching.parse_ephemeris_file", wraps=parse_ephemeris_file) as mock_parse:
+            get_parsed_ephemeris(PAR_FILE)
+            get_parsed_ephemeris(PAR_FILE)
+
+        self.assertEqual(mock_parse.call_count, 2)
+
+
+class EphemerisGetOrCreateFromTextTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        clear_ephemeris_cache()
+        self.addCleanup(clear_ephemeris_cache)
+        create_basic_data()
+        self.pulsar = Pulsar.objects.get(name="J0125-2327")
+        self.project = Project.objects.get(short="PTA")
+        with open(PAR_FILE, "r") as par_file:
+            self.par_text = par_file.read()
+
+    def test_matches_existing_ephemeris_by_hash(self):
+        ephemeris = Ephemeris.get_or_create_from_text(self.pulsar, self.project, self.par_text)
+
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                self.assertEqual(
+                    Ephemeris.get_or_create_from_text(self.pulsar, self.project, self.par_text).id, ephemeris.id
+                )
+
+        # Repeated lookups may be answered by cachalot, but any query that runs must use the hash
+        self.assertGreater(len(queries.captured_queries), 0)
+        for query in queries.captured_queries:
+            self.assertIn('"ephemeris_hash" =', query["sql"])
+            self.assertNotIn('"ephemeris_data" =', query["sql"])
+        self.assertEqual(Ephemeris.objects.filter(project=self.project).count(), 1)
+
+    def test_hash_matches_save(self):
+        ephemeris = Ephemeris.get_or_create_from_text(self.pulsar, self.project, self.par_text, comment="first")
+
+        self.assertEqual(ephemeris.ephemeris_data, json.dumps(parse_ephemeris_file(self.par_text)))
+        self.assertEqual(ephemeris.ephemeris_hash, Ephemeris.hash_ephemeris_data(ephemeris.ephemeris_data))
+        self.assertEqual(ephemeris.comment, "first")
+        self.assertEqual(
+            Ephemeris.get_or_create_from_text(self.pulsar, self.project, self.par_text, comment="second").id,
+            ephemeris.id,
+        )
+
+    def test_whitespace_differences_share_an_ephemeris(self):
+        ephemeris = Ephemeris.get_or_create_from_text(self.pulsar, self.project, self.par_text)
+        padded_text = "\n".join(f"  {line}   " for line in self.par_text.splitlines()) + "\n\n"
+
+        self.assertEqual(Ephemeris.get_or_create_from_text(self.pulsar, self.project, padded_text).id, ephemeris.id)
@@ -14,6 +14,7 @@ from dataportal.models import (
     Ephemeris,
     MainProject,
     Observation,
+    PipelineImage,
     PipelineRun,
     Project,
     ProjectMembership,
@@ -639,6 +640,52 @@ class GraphQLAccessControlTestCase(BaseTestCaseWithTempMedia, GraphQLTestCase):
         expanded_queries = len(captured)
         self.assertLessEqual(expanded_queries, baseline_queries + 2)
 
+    def test_pipeline_image_fold_results_query_count_stays_flat_with_more_images(self):
+        query = """
+            query {
+              pipelineImage {
+                edges {
+                  node {
+                    id
+                    pulsarFoldResult { id }
+                  }
+                }
+              }
+            }
+        """
+        superuser = get_user_model().objects.create_superuser(
+            username="super", email="super@example.com", password="pw"
+        )
+        pulsar_fold_result = PulsarFoldResult.objects.get(observation=self.observation_public_ephem_public)
+
+        def data_queries(captured):
+            # The session is saved on some requests and not others
+            return len([query for query in captured.captured_queries if "dataportal_" in query["sql"]])
+
+        for user in [superuser, self.member_user, self.outsider_user]:
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                PipelineImage.objects.all().delete()
+                PipelineImage.objects.create(
+                    pulsar_fold_result=pulsar_fold_result, image_type="profile", resolution="high"
+                )
+                with CaptureQueriesContext(connection) as captured:
+                    content = json.loads(self.query(query).content)
+                self.assertNotIn("errors", content)
+                baseline_queries = data_queries(captured)
+
+                for image_type in ["phase-time", "phase-freq", "bandpass", "snr-cumul"]:
+                    PipelineImage.objects.create(
+                        pulsar_fold_result=pulsar_fold_result, image_type=image_type, resolution="high"
+                    )
+                with CaptureQueriesContext(connection) as captured:
+                    content = json.loads(self.query(query).content)
+                self.assertNotIn("errors", content)
+                self.assertEqual(data_queries(captured), baseline_queries)
+                edges = content["data"]["pipelineImage"]["edges"]
+                self.assertEqual(len(edges), 5)
+                self.assertTrue(all(edge["node"]["pulsarFoldResult"] for edge in edges))
+
     def test_is_restricted_uses_annotation_without_extra_queries(self):
         observation_items = list(Observation.objects.accessible_to(self.outsider_user))
         ephemeris_items = list(Ephemeris.objects.accessible_to(self.member_user))
@@ -687,3 +734,38 @@ class GraphQLAccessControlTestCase(BaseTestCaseWithTempMedia, GraphQLTestCase):
             self.assertTrue(toa.is_restricted(self.outsider_user))
         with self.assertNumQueries(1):
             self.assertFalse(toa.is_restricted(self.member_user))
+
+    def test_access_policies_compile_to_flat_predicates(self):
+        public_observations = [self.observation_public_ephem_public, self.observation_public_ephem_embargoed]
+        for user, expected in [
+            (
+                self.member_user,
+                {
+                    Observation: [*public_observations, self.observation_embargoed],
+                    Toa: [self.toa, self.toa_embargoed],
+                    PipelineRun: [
+                        self.pipeline_run_public,
+                        self.pipeline_run_embargoed,
+                        self.pipeline_run_on_embargoed_observation,
+                    ],
+                    PulsarFoldResult: PulsarFoldResult.objects.all(),
+                },
+            ),
+            (
+                self.outsider_user,
+                {
+                    Observation: public_observations,
+                    Toa: [self.toa],
+                    PipelineRun: [self.pipeline_run_public, self.pipeline_run_embargoed],
+                    PulsarFoldResult: PulsarFoldResult.objects.filter(observation__in=public_observations),
+                },
+            ),
+        ]:
+            for model, expected_rows in expected.items():
+                with self.subTest(user=user.username, model=model.__name__):
+                    queryset = model.objects.accessible_to(user)
+                    self.assertNotIn("EXISTS", str(queryset.query))
+                    # Memberships are a subquery of the same statement, not a query per row
+                    with self.assertNumQueries(1):
+                        rows = list(queryset)
+                    self.assertCountEqual(rows, list(expected_rows))
@@ -0,0 +1,383 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+from graphene_django.utils.testing import GraphQLTestCase
+
+from dataportal.ingest_jobs import INGEST_JOB_HANDLERS, heartbeat, run_ingest_job
+from dataportal.models import (
+    INGEST_JOB_LEASE,
+    INGEST_JOB_MAX_ATTEMPTS,
+    Calibration,
+    IngestJob,
+    Observation,
+    PipelineRun,
+    Telescope,
+    Template,
+    Toa,
+)
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, setup_timing_obs
+
+CREATE_OBSERVATION = """
+    mutation ($input: ObservationInput!) {
+        createObservation(input: $input, runAsync: true) {
+            observation {
+                id
+            }
+            ingestJob {
+                idInt
+                state
+            }
+        }
+    }
+"""
+
+CREATE_TOA = """
+    mutation ($input: ToaInput!) {
+        createToa(input: $input, runAsync: true) {
+            ingestJob {
+                idInt
+                state
+            }
+        }
+    }
+"""
+
+CREATE_RESIDUAL = """
+    mutation ($residualLines: [String]!) {
+        createResidual(input: {residualLines: $residualLines}, runAsync: true) {
+            toa {
+                id
+            }
+            ingestJob {
+                idInt
+                state
+            }
+        }
+    }
+"""
+
+INGEST_JOB = """
+    query ($id: Int!) {
+        ingestJob(id: $id) {
+            jobType
+            state
+            rowCount
+            error
+            attempts
+            duration
+        }
+    }
+"""
+
+
+def observation_input(calibration):
+    with open(os.path.join(TEST_DATA_DIR, "2019-04-23-06:11:30_1_J0125-2327.json"), "r") as json_file:
+        meertime_data = json.load(json_file)
+    utc_start = datetime.strptime(f"{meertime_data['utcStart']} +0000", "%Y-%m-%d-%H:%M:%S %z")
+    input = {
+        key: value
+        for key, value in meertime_data.items()
+        if key not in ("schedule_block_id", "cal_type", "cal_location")
+    }
+    input["utcStart"] = utc_start.isoformat()
+    input["calibrationId"] = calibration.id
+    return input
+
+
+class IngestJobMutationTestCase(BaseTestCaseWithTempMedia, GraphQLTestCase):
+    def setUp(self):
+        create_basic_data()
+        Telescope.objects.create(name="MeerKAT")
+        self.calibration = Calibration.objects.create(calibration_type="pre")
+        self.user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="x"
+        )
+        self.client.force_login(self.user)
+
+    def process_ingest_jobs(self, *args):
+        stdout = StringIO()
+        call_command("process_ingest_jobs", *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_async_observation_is_queued_then_created_by_the_worker(self):
+        response = self.query(CREATE_OBSERVATION, variables={"input": observation_input(self.calibration)})
+        content = json.loads(response.content)
+
+        self.assertNotIn("errors", content)
+        self.assertIsNone(content["data"]["createObservation"]["observation"])
+        self.assertEqual(content["data"]["createObservation"]["ingestJob"]["state"], "QUEUED")
+        self.assertFalse(Observation.objects.exists())
+
+        output = self.process_ingest_jobs()
+
+        self.assertIn("Ran 1 jobs, 0 failed.", output)
+        self.assertEqual(Observation.objects.count(), 1)
+        job_id = content["data"]["createObservation"]["ingestJob"]["idInt"]
+        job = json.loads(self.query(INGEST_JOB, variables={"id": job_id}).content)["data"]["ingestJob"]
+        self.assertEqual(job["jobType"], "OBSERVATION")
+        self.assertEqual(job["state"], "SUCCEEDED")
+        self.assertEqual(job["rowCount"], 1)
+        self.assertEqual(job["attempts"], 1)
+        self.assertGreaterEqual(job["duration"], 0)
+
+    def test_async_observation_keeps_the_full_start_time(self):
+        utc_start = datetime.fromisoformat(observation_input(self.calibration)["utcStart"]) + timedelta(
+            microseconds=123456
+        )
+        input = dict(observation_input(self.calibration), utcStart=utc_start.isoformat())
+
+        for _ in range(2):
+            content = json.loads(self.query(CREATE_OBSERVATION, variables={"input": input}).content)
+            self.assertNotIn("errors", content)
+            self.process_ingest_jobs()
+
+        # The second job updates the observation the first created
+        self.assertEqual(list(Observation.objects.values_list("utc_start", flat=True)), [utc_start])
+
+    def test_async_observation_without_a_start_time_is_recorded_as_failed(self):
+        job = IngestJob.enqueue(
+            IngestJob.OBSERVATION, dict(observation_input(self.calibration), utcStart=None), self.user
+        )
+
+        self.process_ingest_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, IngestJob.FAILED)
+        self.assertFalse(Observation.objects.exists())
+
+    def test_async_observation_with_a_missing_foreign_key_is_not_queued(self):
+        input = dict(observation_input(self.calibration), pulsarName="J0000+0000")
+        content = json.loads(self.query(CREATE_OBSERVATION, variables={"input": input}).content)
+
+        self.assertIn("errors", content)
+        self.assertFalse(IngestJob.objects.exists())
+
+    def test_failed_job_is_recorded_and_writes_nothing(self):
+        job = IngestJob.enqueue(
+            IngestJob.OBSERVATION, dict(observation_input(self.calibration), projectCode="missing"), self.user
+        )
+
+        self.process_ingest_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, IngestJob.FAILED)
+        self.assertIn("does not exist", job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(Observation.objects.exists())
+
+    def test_ingest_job_is_only_visible_to_its_creator(self):
+        job = IngestJob.enqueue(IngestJob.RESIDUAL, {"residualLines": []}, self.user)
+        other_user = get_user_model().objects.create(username="other")
+        self.client.force_login(other_user)
+
+        content = json.loads(self.query(INGEST_JOB, variables={"id": job.id}).content)
+
+        self.assertIsNone(content["data"]["ingestJob"])
+
+
+class IngestJobResidualTestCase(BaseTestCaseWithTempMedia, GraphQLTestCase):
+    def setUp(self):
+        _, self.user = setup_timing_obs()
+        self.client.force_login(self.user)
+
+    def test_async_residuals_are_applied_by_the_worker(self):
+        toas = list(Toa.objects.order_by("id")[:5])
+        residual_lines = [f"{toa.id},{toa.mjd},{n},0.1,0.5" for n, toa in enumerate(toas)]
+
+        content = json.loads(self.query(CREATE_RESIDUAL, variables={"residualLines": residual_lines}).content)
+
+        self.assertNotIn("errors", content)
+        self.assertFalse(Toa.objects.filter(residual_sec__isnull=False).exists())
+
+        call_command("process_ingest_jobs", "--max-jobs", "1", stdout=StringIO())
+
+        job = IngestJob.objects.get(id=content["data"]["createResidual"]["ingestJob"]["idInt"])
+        self.assertEqual(job.state, IngestJob.SUCCEEDED)
+        self.assertEqual(job.row_count, 5)
+        for n, toa in enumerate(toas):
+            self.assertEqual(Toa.objects.get(id=toa.id).residual_sec, n)
+
+    def test_async_malformed_residuals_are_not_queued(self):
+        content = json.loads(self.query(CREATE_RESIDUAL, variables={"residualLines": ["1,60000.0,0.5"]}).content)
+
+        self.assertIn("errors", content)
+        self.assertFalse(IngestJob.objects.exists())
+
+    def test_async_malformed_toas_are_not_queued(self):
+        with open(os.path.join(TEST_DATA_DIR, "timing_files/J0437-4715_2023-10-22-04:41:07_zap.16ch1p1t.ar.tim")) as f:
+            toa_lines = f.readlines()
+        input = {
+            "pipelineRunId": PipelineRun.objects.first().id,
+            "projectShort": "PTA",
+            "ephemerisText": "",
+            "templateId": Template.objects.first().id,
+            "toaLines": toa_lines,
+            "dmCorrected": False,
+            "nsubType": "1",
+            "obsNpol": 1,
+            "obsNchan": 16,
+        }
+
+        content = json.loads(
+            self.query(
+                CREATE_TOA,
+                variables={
+                    "input": dict(input, toaLines=[line.replace(" -chan ", " -channel ") for line in toa_lines])
+                },
+            ).content
+        )
+        self.assertIn("missing the -chan flag", content["errors"][0]["message"])
+        self.assertFalse(IngestJob.objects.exists())
+
+        content = json.loads(self.query(CREATE_TOA, variables={"input": input}).content)
+        self.assertNotIn("errors", content)
+        self.assertEqual(IngestJob.objects.get().job_type, IngestJob.TOA)
+
+
+class IngestJobClaimTestCase(BaseTestCaseWithTempMedia):
+    def test_claims_queued_jobs_in_order(self):
+        first = IngestJob.objects.create(job_type=IngestJob.RESIDUAL, payload={"residualLines": []})
+        second = IngestJob.objects.create(job_type=IngestJob.RESIDUAL, payload={"residualLines": []})
+
+        self.assertEqual(IngestJob.claim(), first)
+        self.assertEqual(IngestJob.claim(), second)
+        self.assertIsNone(IngestJob.claim())
+        first.refresh_from_db()
+        self.assertEqual(first.state, IngestJob.RUNNING)
+        self.assertEqual(first.attempts, 1)
+
+    def test_reclaims_jobs_lost_by_their_worker(self):
+        started_at = timezone.now() - timedelta(hours=2)
+        lost = IngestJob.objects.create(
+            job_type=IngestJob.RESIDUAL,
+            payload={"residualLines": []},
+            state=IngestJob.RUNNING,
+            started_at=started_at,
+            lease_expires_at=timezone.now() - timedelta(seconds=1),
+            attempts=1,
+        )
+        exhausted = IngestJob.objects.create(
+            job_type=IngestJob.RESIDUAL,
+            payload={"residualLines": []},
+            state=IngestJob.RUNNING,
+            started_at=started_at,
+            lease_expires_at=timezone.now() - timedelta(seconds=1),
+            attempts=INGEST_JOB_MAX_ATTEMPTS,
+        )
+        # A long running job is kept while its worker renews the lease
+        IngestJob.objects.create(
+            job_type=IngestJob.RESIDUAL,
+            payload={"residualLines": []},
+            state=IngestJob.RUNNING,
+            started_at=started_at,
+            lease_expires_at=timezone.now() + INGEST_JOB_LEASE,
+            attempts=1,
+        )
+
+        self.assertEqual(IngestJob.claim(), lost)
+        self.assertIsNone(IngestJob.claim())
+        lost.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(lost.attempts, 2)
+        self.assertEqual(exhausted.state, IngestJob.FAILED)
+        self.assertIn("lost by its worker", exhausted.error)
+
+    def test_renew_lease(self):
+        IngestJob.objects.create(job_type=IngestJob.RESIDUAL, payload={"residualLines": []})
+        job = IngestJob.claim()
+        IngestJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now())
+
+        self.assertTrue(job.renew_lease())
+        self.assertGreater(IngestJob.objects.get(id=job.id).lease_expires_at, timezone.now())
+
+        # The job was claimed again by another worker
+        IngestJob.objects.filter(id=job.id).update(attempts=job.attempts + 1)
+        self.assertFalse(job.renew_lease())
+
+    def test_heartbeat_renews_the_lease_while_the_job_runs(self):
+        IngestJob.objects.create(job_type=IngestJob.RESIDUAL, payload={"residualLines": []})
+        job = IngestJob.claim()
+        renewed = threading.Event()
+
+        def renew_lease():
+            renewed.set()
+            return True
+
+        with (
+            patch("dataportal.ingest_jobs.INGEST_JOB_HEARTBEAT_INTERVAL", timedelta(milliseconds=10)),
+            patch.object(job, "renew_lease", side_effect=renew_lease),
+        ):
+            with heartbeat(job):
+                self.assertTrue(renewed.wait(5))
+
+    def test_heartbeat_reports_a_lost_lease(self):
+        IngestJob.objects.create(job_type=IngestJob.RESIDUAL, payload={"residualLines": []})
+        job = IngestJob.claim()
+
+        with (
+            patch("dataportal.ingest_jobs.INGEST_JOB_HEARTBEAT_INTERVAL", timedelta(milliseconds=10)),
+            patch.object(job, "renew_lease", return_value=False),
+        ):
+            with heartbeat(job) as lease_lost:
+                self.assertTrue(lease_lost.wait(5))
+
+    def test_finish(self):
+        IngestJob.objects.create(job_type=IngestJob.RESIDUAL, payload={"residualLines": []})
+        job = IngestJob.claim()
+        stale = IngestJob.objects.get(id=job.id)
+        # The job was claimed again by another worker
+        job.attempts += 1
+        IngestJob.objects.filter(id=job.id).update(attempts=job.attempts)
+
+        self.assertFalse(stale.finish(IngestJob.FAILED, error="The first worker failed"))
+        self.assertEqual(IngestJob.objects.get(id=job.id).state, IngestJob.RUNNING)
+
+        self.assertTrue(job.finish(IngestJob.SUCCEEDED, row_count=3))
+        job.refresh_from_db()
+        self.assertEqual(job.state, IngestJob.SUCCEEDED)
+        self.assertEqual(job.row_count, 3)
+        self.assertIsNone(job.error)
+
+
+# Using TransactionTestCase so the other worker's claim is committed while the first worker is still running the job
+class IngestJobLeaseTestCase(TransactionTestCase):
+    def test_job_claimed_again_while_running_keeps_none_of_its_writes(self):
+        IngestJob.objects.create(job_type=IngestJob.RESIDUAL, payload={"residualLines": []})
+        job = IngestJob.claim()
+        # The first worker stalled past its lease
+        IngestJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        reclaimed = []
+
+        def claim_from_another_worker():
+            try:
+                reclaimed.append(IngestJob.claim())
+            finally:
+                connection.close()
+
+        def claimed_again(payload):
+            Telescope.objects.create(name="Written by the first worker")
+            # Another worker claims the job while the first worker is still running it
+            worker = threading.Thread(target=claim_from_another_worker)
+            worker.start()
+            worker.join()
+            return 1
+
+        with patch.dict(INGEST_JOB_HANDLERS, {IngestJob.RESIDUAL: claimed_again}):
+            run_ingest_job(job)
+
+        self.assertEqual(reclaimed, [job])
+        self.assertFalse(Telescope.objects.filter(name="Written by the first worker").exists())
+        job.refresh_from_db()
+        self.assertEqual(job.state, IngestJob.RUNNING)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(job.finished_at)
@@ -0,0 +1,131 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.test import override_settings
+
+from dataportal import caching
+from dataportal.caching import bump_membership_version, get_active_project_ids, get_project_memberships
+from dataportal.models import Observation, Project, ProjectMembership, UserAccess
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import create_basic_data
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class MembershipResolverTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        create_basic_data()
+        self.pta = Project.objects.get(short="PTA")
+        self.tpa = Project.objects.get(short="TPA")
+        self.user = get_user_model().objects.create(username="member")
+        ProjectMembership.objects.create(user=self.user, project=self.pta, role=ProjectMembership.RoleChoices.OWNER)
+        ProjectMembership.objects.create(user=self.user, project=self.tpa, is_active=False)
+
+    def get_user(self):
+        # A new user object, as each request loads
+        return get_user_model().objects.get(id=self.user.id)
+
+    def test_memberships_are_resolved_once_per_user_object(self):
+        user = self.get_user()
+
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertEqual(
+                    get_project_memberships(user),
+                    {
+                        self.pta.id: (ProjectMembership.RoleChoices.OWNER, True),
+                        self.tpa.id: (ProjectMembership.RoleChoices.MEMBER, False),
+                    },
+                )
+                self.assertEqual(get_active_project_ids(user), {self.pta.id})
+                self.assertTrue(self.pta.is_owner(user))
+                self.assertTrue(self.pta.is_manager(user))
+                self.assertFalse(self.tpa.is_manager(user))
+
+    def test_membership_changes_apply_once_committed(self):
+        user = self.get_user()
+        self.assertEqual(get_active_project_ids(user), {self.pta.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            membership = ProjectMembership.objects.get(project=self.tpa)
+            membership.is_active = True
+            membership.save()
+            # Nothing is invalidated until the change is committed
+            self.assertEqual(get_active_project_ids(user), {self.pta.id})
+        self.assertEqual(get_active_project_ids(user), {self.pta.id, self.tpa.id})
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                ProjectMembership.objects.get(project=self.pta).delete()
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+
+    def test_local_membership_versions_are_bounded(self):
+        user = self.get_user()
+        get_project_memberships(user)
+        other_users = [
+            get_user_model().objects.create(username=f"other{n}", email=f"other{n}@example.com") for n in range(3)
+        ]
+
+        with patch.object(caching, "MEMBERSHIP_LOCAL_VERSIONS_SIZE", 2):
+            ProjectMembership.objects.filter(project=self.tpa).update(is_active=True)
+            bump_membership_version(self.user.id)
+            for other_user in other_users:
+                bump_membership_version(other_user.id)
+
+            self.assertEqual(len(caching._local_membership_versions), 2)
+            self.assertNotIn(self.user.id, caching._local_membership_versions)
+            # The memberships resolved before the evicted change are still stale
+            self.assertEqual(get_active_project_ids(user), {self.pta.id, self.tpa.id})
+
+    def test_membership_changes_apply_immediately(self):
+        user = self.get_user()
+        self.assertEqual(get_active_project_ids(user), {self.pta.id})
+
+        ProjectMembership.objects.filter(project=self.tpa).update(is_active=True)
+        # Changes made with save and delete are seen straight away by the same user object
+        membership = ProjectMembership.objects.get(project=self.tpa)
+        with self.captureOnCommitCallbacks(execute=True):
+            membership.save()
+        self.assertEqual(get_active_project_ids(user), {self.pta.id, self.tpa.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProjectMembership.objects.get(project=self.pta).delete()
+        self.assertEqual(get_active_project_ids(user), {self.tpa.id})
+        self.assertFalse(self.pta.is_owner(user))
+
+    def test_anonymous_user_has_no_memberships(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_project_memberships(AnonymousUser()), {})
+            self.assertEqual(get_active_project_ids(AnonymousUser()), frozenset())
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_memberships_are_shared_between_requests_until_they_change(self):
+        self.addCleanup(cache.clear)
+        get_project_memberships(self.get_user())
+
+        user = self.get_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_project_ids(user), {self.pta.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProjectMembership.objects.filter(project=self.tpa).get().delete()
+
+        user = self.get_user()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_project_memberships(user), {self.pta.id: (ProjectMembership.RoleChoices.OWNER, True)})
+
+    def test_access_policies_use_resolved_memberships(self):
+        user = self.get_user()
+        # Without resolved memberships the policies use a subquery rather than add a query
+        self.assertIsInstance(UserAccess.for_user(user).project_ids, QuerySet)
+
+        get_project_memberships(user)
+
+        self.assertEqual(UserAccess.for_user(user).project_ids, [self.pta.id])
+        with self.assertNumQueries(1):
+            list(Observation.objects.accessible_to(user))
@@ -229,11 +229,18 @@ class ModelsCoverageTestCase(TestCase):
 
         with patch("dataportal.models.Observation.objects.filter") as mocked_filter:
             fake_qs = Mock()
-            fake_qs.__len__ = Mock(return_value=1)
-            fake_qs.order_by.return_value.first.return_value = SimpleNamespace(utc_start=self.now, duration=10)
-            fake_qs.order_by.return_value.last.return_value = SimpleNamespace(utc_start=self.now, duration=10)
-            fake_qs.values_list.return_value.distinct.return_value = [self.pulsar.name]
-            fake_qs.aggregate.side_effect = [{"total": 3600}, ZeroDivisionError()]
+            fake_qs.aggregate.return_value = {
+                "observations": 1,
+                "pulsars": 1,
+                "projects": 1,
+                "min_utc_start": self.now,
+                "max_utc_start": self.now,
+                "total_duration": 3600,
+                "min_duration": 10,
+                "max_duration": 10,
+                # Every observation had a zero fold_tsubint
+                "total_bytes": None,
+            }
             mocked_filter.return_value = fake_qs
 
             with patch("dataportal.models.ObservationSummary.objects.update_or_create") as mocked_uoc:
@@ -256,6 +263,11 @@ class ModelsCoverageTestCase(TestCase):
                 )
                 self.assertFalse(created)
                 self.assertEqual(updated.pulsar, self.pulsar)
+                self.assertEqual(fake_qs.aggregate.call_count, 1)
+                defaults = mocked_uoc.call_args.kwargs["defaults"]
+                self.assertEqual(defaults["observation_hours"], 1)
+                self.assertEqual(defaults["timespan_days"], 1)
+                self.assertEqual(defaults["estimated_disk_space_gb"], 0)
 
     def test_fold_and_search_summary_query_helpers_and_early_returns(self):
         self.assertGreaterEqual(PulsarFoldSummary.get_query(main_project="All").count(), 0)
@@ -403,7 +415,7 @@ class ModelsCoverageTestCase(TestCase):
         ProjectMembership.objects.create(user=self.other_user, project=self.project, is_active=True)
         self.assertFalse(self.toa.is_restricted(self.other_user))
 
-        with patch("dataportal.models.parse_ephemeris_file") as mock_parse:
+        with patch("dataportal.caching.parse_ephemeris_file") as mock_parse:
             mock_parse.return_value = {
                 "P0": 0.5,
                 "DM": 12.3,
@@ -427,7 +439,7 @@ class ModelsCoverageTestCase(TestCase):
                     self.assertTrue(mock_get.called)
 
         with patch(
-            "dataportal.models.parse_ephemeris_file",
+            "dataportal.caching.parse_ephemeris_file",
             return_value={
                 "P0": 0.5,
                 "DM": 12.3,
@@ -435,17 +447,16 @@ class ModelsCoverageTestCase(TestCase):
                 "FINISH": (self.now + timedelta(days=1)).isoformat(),
             },
         ):
-            with patch("dataportal.models.toa_line_to_dict", return_value={"archive": "x"}):
-                with patch("dataportal.models.toa_dict_to_line", return_value="different"):
-                    with self.assertRaises(GraphQLError):
-                        Toa.bulk_create(
-                            pipeline_run_id=self.pipeline_run.id,
-                            project_short=self.project.short,
-                            template_id=self.template.id,
-                            ephemeris_text="FAKE",
-                            toa_lines=["abc\n"],
-                            dm_corrected=False,
-                            nsub_type="1",
-                            npol=2,
-                            nchan=16,
-                        )
+            with patch("dataportal.models.toa_columns_to_lines", return_value=["different"]):
+                with self.assertRaises(GraphQLError):
+                    Toa.bulk_create(
+                        pipeline_run_id=self.pipeline_run.id,
+                        project_short=self.project.short,
+                        template_id=self.template.id,
+                        ephemeris_text="FAKE",
+                        toa_lines=["abc 1.0 60000.0 1.000 meerkat -fe KAT\n"],
+                        dm_corrected=False,
+                        nsub_type="1",
+                        npol=2,
+                        nchan=16,
+                    )
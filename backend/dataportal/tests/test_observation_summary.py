@@ -0,0 +1,171 @@
+import os
+from datetime import timedelta
+from threading import Thread
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from dataportal.models import Calibration, Observation, ObservationSummary
+from dataportal.signals import observation_summary_keys
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+
+OBSERVATION_FILES = [
+    "2019-04-23-06:11:30_1_J0125-2327.json",
+    "2019-05-14-10:14:18_1_J0125-2327.json",
+    "2019-12-15-17:22:31_1_J0125-2327.json",
+]
+SUMMARY_FIELDS = [
+    "observations",
+    "pulsars",
+    "projects",
+    "estimated_disk_space_gb",
+    "observation_hours",
+    "timespan_days",
+    "min_duration",
+    "max_duration",
+    "min_utc_start",
+    "max_utc_start",
+    "total_duration",
+    "total_bytes",
+]
+
+
+def observation_queries(queries):
+    return [query["sql"] for query in queries.captured_queries if 'FROM "dataportal_observation"' in query["sql"]]
+
+
+class ObservationSummaryTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, template = create_basic_data()
+        self.calibration = Calibration.objects.create(calibration_type="pre")
+        self.observations = [
+            create_observation_pipeline_run_toa(
+                os.path.join(TEST_DATA_DIR, file_name), telescope, template, self.calibration, make_toas=False
+            )[0]
+            for file_name in OBSERVATION_FILES
+        ]
+
+    def assert_summaries_match_full_recalculation(self):
+        keys = {key for observation in Observation.objects.all() for key in observation_summary_keys(observation)}
+        for key in keys:
+            summary = ObservationSummary.objects.get(
+                obs_type=key[0], pulsar=key[1], main_project=key[2], project=key[3], calibration=key[4], band=key[5]
+            )
+            applied = {field: getattr(summary, field) for field in SUMMARY_FIELDS}
+            recalculated, _ = ObservationSummary.update_or_create(*key)
+            recalculated.refresh_from_db()
+            for field in SUMMARY_FIELDS:
+                expected = getattr(recalculated, field)
+                if isinstance(expected, float):
+                    self.assertAlmostEqual(applied[field], expected, places=6, msg=f"{field} of {key}")
+                else:
+                    self.assertEqual(applied[field], expected, msg=f"{field} of {key}")
+
+    def test_update_or_create_is_one_aggregate_query(self):
+        observation = self.observations[0]
+        with CaptureQueriesContext(connection) as queries:
+            summary, _ = ObservationSummary.update_or_create(
+                "fold", None, observation.project.main_project, None, None, None
+            )
+
+        self.assertEqual(len(observation_queries(queries)), 1)
+        self.assertEqual(summary.observations, 3)
+        self.assertEqual(summary.pulsars, 1)
+        self.assertEqual(summary.total_duration, sum(observation.duration for observation in self.observations))
+        self.assertEqual(
+            summary.timespan_days, (self.observations[2].utc_start - self.observations[0].utc_start).days + 1
+        )
+        self.assertGreater(summary.estimated_disk_space_gb, 0)
+
+    def test_new_observations_are_applied_without_rescanning(self):
+        self.assert_summaries_match_full_recalculation()
+
+        observation = Observation.objects.get(pk=self.observations[0].pk)
+        observation.pk = None
+        observation.utc_start += timedelta(days=400)
+        with CaptureQueriesContext(connection) as queries:
+            observation.save()
+
+        # The calibration session is a single aggregate, but no summary is recalculated from scratch
+        for sql in observation_queries(queries):
+            self.assertNotIn('AS "total_duration"', sql)
+        self.assert_summaries_match_full_recalculation()
+
+    def test_updated_observations_are_applied(self):
+        observation = Observation.objects.get(pk=self.observations[1].pk)
+        # Outwards from the current maximum duration is applied as a delta
+        observation.duration *= 10
+        observation.save()
+        self.assert_summaries_match_full_recalculation()
+
+        # Shrinking the maximum duration needs a rescan
+        observation.duration = 1
+        observation.save()
+        self.assert_summaries_match_full_recalculation()
+
+        # Moving to a different band changes summaries
+        observation.frequency = 816.0
+        observation.bandwidth = 544.0
+        observation.save()
+        self.assertNotEqual(observation.band, "LBAND")
+        self.assert_summaries_match_full_recalculation()
+
+    def test_summary_updates_hold_a_lock_on_the_summary(self):
+        observation = self.observations[0]
+        key = ("fold", None, observation.project.main_project, None, None, None)
+
+        def try_lock():
+            # A separate connection, as each thread has its own
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT pg_try_advisory_xact_lock(hashtext(%s))",
+                        [f"observation_summary:{[getattr(value, 'pk', value) for value in key]}"],
+                    )
+                    results.append(cursor.fetchone()[0])
+            finally:
+                connection.close()
+
+        results = []
+        with transaction.atomic():
+            ObservationSummary.lock(*key)
+            thread = Thread(target=try_lock)
+            thread.start()
+            thread.join()
+        self.assertEqual(results, [False])
+
+        with CaptureQueriesContext(connection) as queries:
+            observation.save()
+        lock_queries = [query["sql"] for query in queries.captured_queries if "pg_advisory_xact_lock" in query["sql"]]
+        self.assertEqual(len(lock_queries), len(observation_summary_keys(observation)))
+
+
+class CalibrationSessionTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, template = create_basic_data()
+        self.calibration = Calibration.objects.create(calibration_type="pre")
+        self.observations = [
+            create_observation_pipeline_run_toa(
+                os.path.join(TEST_DATA_DIR, file_name), telescope, template, self.calibration, make_toas=False
+            )[0]
+            for file_name in OBSERVATION_FILES
+        ]
+        Observation.objects.filter(pk=self.observations[1].pk).update(nant=self.observations[0].nant + 10)
+
+    def test_update_observation_session_is_one_aggregate_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            calibration = Calibration.update_observation_session(self.calibration)
+
+        self.assertEqual(len(observation_queries(queries)), 1)
+        nants = list(Observation.objects.values_list("nant", flat=True))
+        self.assertEqual(calibration.start, self.observations[0].utc_start)
+        self.assertEqual(calibration.end, self.observations[2].utc_start)
+        self.assertEqual(calibration.all_projects, self.observations[0].project.short)
+        self.assertEqual(calibration.n_observations, 3)
+        self.assertEqual(calibration.n_ant_min, min(nants))
+        self.assertEqual(calibration.n_ant_max, max(nants))
+        self.assertEqual(
+            calibration.total_integration_time_seconds,
+            sum(observation.duration for observation in self.observations),
+        )
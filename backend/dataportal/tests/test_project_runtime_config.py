@@ -18,6 +18,7 @@ from dataportal.models import (
     Template,
     Toa,
 )
+from utils.toa import toa_dict_to_line
 
 
 class ProjectRuntimeConfigTest(TestCase):
@@ -30,7 +31,7 @@ class ProjectRuntimeConfigTest(TestCase):
         cls.calibration = Calibration.objects.create(schedule_block_id="cal-01", calibration_type="pre")
 
     def create_observation(self, project, frequency=1400.0, bandwidth=400.0):
-        with patch("dataportal.signals.ObservationSummary.update_or_create"):
+        with patch("dataportal.models.ObservationSummary.update_or_create"):
             return Observation.objects.create(
                 pulsar=self.pulsar,
                 telescope=self.telescope,
@@ -89,7 +90,6 @@ class ProjectRuntimeConfigTest(TestCase):
 
     def create_toa(self, project):
         pipeline_run, template = self.create_toa_dependencies(project)
-        toa_line = "toa line\n"
         toa_dict = {
             "archive": "archive.ar",
             "freq_MHz": 1400.0,
@@ -110,10 +110,11 @@ class ProjectRuntimeConfigTest(TestCase):
             "length": 30,
             "subint": 2,
         }
+        toa_line = toa_dict_to_line(toa_dict) + "\n"
 
         with (
             patch(
-                "dataportal.models.parse_ephemeris_file",
+                "dataportal.caching.parse_ephemeris_file",
                 return_value={
                     "P0": 0.5,
                     "DM": 12.3,
@@ -121,8 +122,6 @@ class ProjectRuntimeConfigTest(TestCase):
                     "FINISH": (timezone.now() + timedelta(days=1)).isoformat(),
                 },
             ),
-            patch("dataportal.models.toa_line_to_dict", return_value=toa_dict),
-            patch("dataportal.models.toa_dict_to_line", return_value=toa_line.rstrip("\n")),
         ):
             return Toa.bulk_create(
                 pipeline_run_id=pipeline_run.id,
@@ -342,6 +342,23 @@ class ProtectedMediaTestCase(BaseTestCaseWithTempMedia):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(b"fake public template data", b"".join(response.streaming_content))
 
+    def test_shared_template_file_accessible_through_any_template(self):
+        """A template file shared by identical templates is accessible if any of them is"""
+        Template.objects.create(
+            pulsar=self.pulsar,
+            project=self.project,
+            template_file=self.embargoed_template_path,
+            band="UHF",
+            template_hash="embargoed_abc123",
+        )
+        self.client.force_login(self.non_member)
+        response = self.client.get(f"/media/{self.embargoed_template_path}")
+        self.assertEqual(response.status_code, 403)
+
+        Template.objects.filter(band="UHF").update(created_at=timezone.now() - timedelta(days=600))
+        response = self.client.get(f"/media/{self.embargoed_template_path}")
+        self.assertEqual(response.status_code, 200)
+
     def test_template_all_bands_accessible(self):
         """Test templates in different bands are handled"""
         bands = ["UHF", "LBAND", "SBAND_0"]
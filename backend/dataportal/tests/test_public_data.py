@@ -0,0 +1,82 @@
+import os
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.utils import timezone
+
+from dataportal.graphql.queries import _observation_is_accessible
+from dataportal.models import Ephemeris, Observation, Project, Template, Toa
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+
+
+class PublicDataTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, template = create_basic_data()
+        self.observation, _, _ = create_observation_pipeline_run_toa(
+            os.path.join(TEST_DATA_DIR, "2019-04-23-06:11:30_1_J0125-2327.json"), telescope, template
+        )
+        self.user = get_user_model().objects.create(username="user", email="user@example.com")
+
+    def update_public_flags(self):
+        stdout = StringIO()
+        call_command("update_public_flags", stdout=stdout)
+        return stdout.getvalue()
+
+    def test_is_public_is_set_on_save(self):
+        # The observation is from 2019, and the ephemerides and templates were only just created
+        self.assertTrue(Observation.objects.get(id=self.observation.id).is_public)
+        self.assertTrue(Toa.objects.get().is_public)
+        self.assertFalse(Ephemeris.objects.filter(is_public=True).exists())
+        self.assertFalse(Template.objects.filter(is_public=True).exists())
+
+    def test_command_releases_data_whose_embargo_has_ended(self):
+        n_ephemerides = Ephemeris.objects.count()
+        Ephemeris.objects.update(embargo_end_date=timezone.now() - timedelta(seconds=1))
+
+        output = self.update_public_flags()
+
+        self.assertIn(f"Released rows of Observation: 0, Ephemeris: {n_ephemerides}, Template: 0, Toa: 0.", output)
+        self.assertFalse(Ephemeris.objects.filter(is_public=False).exists())
+        self.assertIn(
+            "Released rows of Observation: 0, Ephemeris: 0, Template: 0, Toa: 0.", self.update_public_flags()
+        )
+
+    def test_extending_an_embargo_withholds_public_data(self):
+        project = Project.objects.get(id=self.observation.project_id)
+        project.embargo_period = timedelta(days=36500)
+        project.save()
+
+        self.assertFalse(Observation.objects.get(id=self.observation.id).is_public)
+        self.assertFalse(Toa.objects.get().is_public)
+        self.assertFalse(Observation.objects.accessible_to(AnonymousUser()).exists())
+
+    def test_anonymous_users_only_see_released_data(self):
+        Observation.objects.update(is_public=False)
+        Toa.objects.update(is_public=False)
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+
+        # Until the command runs, only users who are logged in see data whose embargo has ended
+        self.assertFalse(Observation.objects.accessible_to(AnonymousUser()).exists())
+        self.assertFalse(Toa.objects.accessible_to(AnonymousUser()).exists())
+        self.assertFalse(_observation_is_accessible(Observation.objects.get(id=self.observation.id), request))
+        self.assertTrue(Observation.objects.accessible_to(self.user).exists())
+        self.assertTrue(Toa.objects.accessible_to(self.user).exists())
+
+        self.update_public_flags()
+
+        self.assertTrue(Observation.objects.accessible_to(AnonymousUser()).exists())
+        self.assertTrue(Toa.objects.accessible_to(AnonymousUser()).exists())
+        self.assertTrue(_observation_is_accessible(Observation.objects.get(id=self.observation.id), request))
+
+    def test_anonymous_queries_do_not_depend_on_the_time(self):
+        for model in [Observation, Ephemeris, Toa]:
+            sql, params = model.objects.accessible_to(AnonymousUser()).query.sql_with_params()
+            self.assertIn("is_public", sql)
+            self.assertNotIn("embargo_end_date", sql.split(" WHERE ")[1])
+            self.assertFalse(any(isinstance(param, datetime) for param in params))
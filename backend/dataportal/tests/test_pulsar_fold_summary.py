@@ -0,0 +1,82 @@
+import math
+import os
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from dataportal.models import Observation, PipelineRun, Project, PulsarFoldResult, PulsarFoldSummary
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+
+OBSERVATION_FILES = [
+    "2019-04-23-06:11:30_1_J0125-2327.json",
+    "2019-05-14-10:14:18_1_J0125-2327.json",
+    "2019-12-15-17:22:31_1_J0125-2327.json",
+    "2020-07-10-05:07:28_2_J0125-2327.json",
+]
+
+
+class PulsarFoldSummaryTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, template = create_basic_data()
+        self.observations = []
+        self.pipeline_runs = []
+        for file_name in OBSERVATION_FILES:
+            observation, _, pipeline_run = create_observation_pipeline_run_toa(
+                os.path.join(TEST_DATA_DIR, file_name), telescope, template, make_toas=False
+            )
+            self.observations.append(observation)
+            self.pipeline_runs.append(pipeline_run)
+        self.pulsar = self.observations[0].pulsar
+        self.main_project = self.observations[0].project.main_project
+
+        # Two observations each for two projects, the one observed first wins the tie
+        tpa = Project.objects.get(short="TPA")
+        Observation.objects.filter(pk__in=[self.observations[0].pk, self.observations[3].pk]).update(project=tpa)
+        for pipeline_run, sn in zip(self.pipeline_runs, [50.0, None, 400.0, 20.0]):
+            PipelineRun.objects.filter(pk=pipeline_run.pk).update(sn=sn)
+
+    def test_summary_values(self):
+        with CaptureQueriesContext(connection) as queries:
+            summary, _ = PulsarFoldSummary.update_or_create(self.pulsar, self.main_project)
+
+        selects = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("SELECT COUNT(")]
+        self.assertEqual(len(selects), 2)
+
+        observations = sorted(self.observations, key=lambda observation: observation.utc_start)
+        sn_5min = [
+            sn / math.sqrt(observation.duration) * math.sqrt(300)
+            for observation, sn in zip(self.observations, [50.0, None, 400.0, 20.0])
+            if sn is not None
+        ]
+        self.assertEqual(summary.first_observation, observations[0].utc_start)
+        self.assertEqual(summary.latest_observation, observations[-1].utc_start)
+        self.assertEqual(summary.latest_observation_beam, observations[-1].beam)
+        self.assertEqual(summary.timespan, (observations[-1].utc_start - observations[0].utc_start).days + 1)
+        self.assertEqual(summary.number_of_observations, 4)
+        self.assertAlmostEqual(
+            summary.total_integration_hours, sum(observation.duration for observation in observations) / 3600
+        )
+        self.assertAlmostEqual(summary.last_integration_minutes, observations[-1].duration / 60)
+        self.assertEqual(summary.all_bands, "LBAND, UHF")
+        self.assertEqual(summary.last_sn, 20.0)
+        self.assertEqual(summary.highest_sn, 400.0)
+        self.assertEqual(summary.lowest_sn, 0)
+        self.assertAlmostEqual(summary.avg_sn_pipe, sum(sn_5min) / len(sn_5min))
+        self.assertAlmostEqual(summary.max_sn_pipe, max(sn_5min))
+        self.assertEqual(summary.all_projects, "PTA, TPA")
+        self.assertEqual(summary.most_common_project, "TPA")
+
+    def test_most_common_project(self):
+        Observation.objects.filter(pk=self.observations[0].pk).update(project=Project.objects.get(short="PTA"))
+
+        summary, _ = PulsarFoldSummary.update_or_create(self.pulsar, self.main_project)
+
+        self.assertEqual(summary.most_common_project, "PTA")
+
+    def test_no_results(self):
+        PulsarFoldResult.objects.all().delete()
+        PulsarFoldSummary.objects.all().delete()
+
+        self.assertIsNone(PulsarFoldSummary.update_or_create(self.pulsar, self.main_project))
+        self.assertFalse(PulsarFoldSummary.objects.exists())
@@ -0,0 +1,48 @@
+import os
+from unittest import skipUnless
+
+from django.test import TestCase
+
+from benchmarks.ingest import IngestBenchmark
+from benchmarks.read_path import (
+    READ_PATH_BUDGET_DATASET,
+    READ_PATH_OPERATIONS,
+    READ_PATH_QUERY_BUDGETS,
+    ROLES,
+    ReadPathHarness,
+    create_role_users,
+    get_dataset,
+)
+from benchmarks.relay_operations import FRONTEND_SRC_DIR, load_relay_operations
+
+
+@skipUnless(os.path.isdir(FRONTEND_SRC_DIR), "The frontend sources are not available")
+class ReadPathBudgetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ingest = IngestBenchmark(READ_PATH_BUDGET_DATASET)
+        ingest.populate()
+        cls.dataset = get_dataset(ingest.project)
+        cls.project = ingest.project
+
+    def test_frontend_operations_compile(self):
+        documents = load_relay_operations()
+
+        for operation in READ_PATH_OPERATIONS:
+            self.assertIn(operation, documents)
+            self.assertNotIn("...", documents[operation].replace("... on", ""))
+            self.assertNotIn("@arguments", documents[operation])
+
+    def test_operations_are_within_query_budgets(self):
+        harness = ReadPathHarness(self.dataset, create_role_users(self.project), repeat=1)
+
+        results = harness.run()
+
+        self.assertEqual(len(results), len(READ_PATH_OPERATIONS) * len(ROLES))
+        for result in results:
+            self.assertGreater(result.rows_fetched, 0)
+            self.assertLessEqual(
+                result.queries,
+                READ_PATH_QUERY_BUDGETS[result.operation],
+                msg=f"{result.operation} as {result.role}",
+            )
@@ -0,0 +1,117 @@
+import json
+import multiprocessing
+import os
+from io import StringIO
+from unittest.mock import MagicMock
+
+import numpy as np
+from django.core.management import call_command
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.test import TransactionTestCase
+
+from dataportal.models import Ephemeris, Observation, Toa
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+from utils.binary_phase import get_binary_phase
+from utils.day_of_year import mjd_to_day_of_year
+
+OBSERVATION_FILES = [
+    "2019-04-23-06:11:30_1_J0125-2327.json",
+    "2019-05-14-10:14:18_1_J0125-2327.json",
+    "2023-04-17-15:08:35_1_J0437-4715.json",
+]
+
+
+def create_observations():
+    telescope, _, _, template = create_basic_data()
+    for file_name in OBSERVATION_FILES:
+        create_observation_pipeline_run_toa(os.path.join(TEST_DATA_DIR, file_name), telescope, template)
+    for n, toa in enumerate(Toa.objects.order_by("id")):
+        toa.mjd = 58600.123456789 + 20 * n
+        toa.save()
+    # Observation.save sets the values the command should reproduce
+    expected = {
+        "observations": {
+            id: (day_of_year, binary_orbital_phase)
+            for id, day_of_year, binary_orbital_phase in Observation.objects.values_list(
+                "id", "day_of_year", "binary_orbital_phase"
+            )
+        },
+        "toas": {},
+    }
+    for toa in Toa.objects.select_related("ephemeris"):
+        mjds = np.array([float(toa.mjd)])
+        binary_phase = get_binary_phase(mjds, json.loads(toa.ephemeris.ephemeris_data))[0]
+        expected["toas"][toa.id] = (mjd_to_day_of_year(mjds)[0], binary_phase)
+    # Make every stored value stale
+    Observation.objects.update(day_of_year=0, binary_orbital_phase=None)
+    Toa.objects.update(day_of_year=0, binary_orbital_phase=None)
+    return expected
+
+
+class RecomputeOrbitalPhasesTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        self.expected = create_observations()
+
+    def recompute_orbital_phases(self, *args):
+        stdout = StringIO()
+        call_command("recompute_orbital_phases", *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def assertRecomputed(self, model, expected):
+        for id, day_of_year, binary_orbital_phase in model.objects.values_list(
+            "id", "day_of_year", "binary_orbital_phase"
+        ):
+            self.assertEqual(day_of_year, expected[id][0])
+            self.assertAlmostEqual(binary_orbital_phase, expected[id][1], delta=1e-9)
+
+    def test_recompute_orbital_phases(self):
+        receiver = MagicMock()
+        post_save.connect(receiver, dispatch_uid="test_recompute_orbital_phases")
+        self.addCleanup(post_save.disconnect, dispatch_uid="test_recompute_orbital_phases")
+
+        output = self.recompute_orbital_phases()
+
+        self.assertIn("Recomputed 3 observations and 3 ToAs across 3 ephemerides.", output)
+        self.assertRecomputed(Observation, self.expected["observations"])
+        self.assertRecomputed(Toa, self.expected["toas"])
+        receiver.assert_not_called()
+
+    def test_corrected_ephemeris_changes_phases(self):
+        Ephemeris.objects.filter(pulsar__name="J0125-2327").update(binary_t0=F("binary_t0") + F("binary_pb") / 4)
+
+        self.recompute_orbital_phases("--pulsar", "J0125-2327")
+
+        for observation in Observation.objects.filter(pulsar__name="J0125-2327"):
+            phase_shift = (self.expected["observations"][observation.id][1] - observation.binary_orbital_phase) % 1
+            self.assertAlmostEqual(phase_shift, 0.25, delta=1e-6)
+
+    def test_filters(self):
+        output = self.recompute_orbital_phases("--pulsar", "J0437-4715", "--project", "TPA")
+
+        self.assertIn("Recomputed 0 observations and 0 ToAs across 0 ephemerides.", output)
+
+        output = self.recompute_orbital_phases("--pulsar", "J0125-2327")
+
+        self.assertIn("Recomputed 2 observations and 2 ToAs across 2 ephemerides.", output)
+        self.assertEqual(Observation.objects.get(pulsar__name="J0437-4715").day_of_year, 0)
+
+
+# Worker processes only see committed data, so this can't run inside a TestCase transaction
+class RecomputeOrbitalPhasesWorkersTestCase(TransactionTestCase):
+    def test_workers_match_serial(self):
+        if multiprocessing.current_process().daemon:
+            self.skipTest("Worker processes can't be started from a parallel test runner process")
+        expected = create_observations()
+
+        stdout = StringIO()
+        call_command("recompute_orbital_phases", "--workers", "2", stdout=stdout, stderr=StringIO())
+
+        self.assertIn("Recomputed 3 observations and 3 ToAs across 3 ephemerides.", stdout.getvalue())
+        for model, name in [(Observation, "observations"), (Toa, "toas")]:
+            for id, day_of_year, binary_orbital_phase in model.objects.values_list(
+                "id", "day_of_year", "binary_orbital_phase"
+            ):
+                self.assertEqual(day_of_year, expected[name][id][0])
+                self.assertAlmostEqual(binary_orbital_phase, expected[name][id][1], delta=1e-9)
@@ -0,0 +1,73 @@
+import os
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+
+from dataportal.models import Ephemeris, Observation, Project, ProjectMembership, Template, Toa
+from dataportal.public_data import update_public_flags
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+
+OBSERVATION_FILES = [
+    "2019-04-23-06:11:30_1_J0125-2327.json",
+    "2019-05-14-10:14:18_1_J0125-2327.json",
+    "2023-04-17-15:08:35_1_J0437-4715.json",
+]
+
+
+class RestrictedIdsTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, template = create_basic_data()
+        for file_name in OBSERVATION_FILES:
+            create_observation_pipeline_run_toa(os.path.join(TEST_DATA_DIR, file_name), telescope, template)
+        # Embargo everything, then release the J0125-2327 data
+        for project in Project.objects.all():
+            project.embargo_period = timedelta(days=36500)
+            project.save()
+        released = timezone.now() - timedelta(days=1)
+        Observation.objects.filter(pulsar__name="J0125-2327").update(embargo_end_date=released)
+        Ephemeris.objects.filter(pulsar__name="J0125-2327").update(embargo_end_date=released)
+        Toa.objects.filter(observation__pulsar__name="J0125-2327").update(embargo_end_date=released)
+        update_public_flags()
+
+        self.member = get_user_model().objects.create(username="member", email="member@example.com")
+        for project in Project.objects.all():
+            ProjectMembership.objects.create(user=self.member, project=project)
+        self.non_member = get_user_model().objects.create(username="non_member", email="non_member@example.com")
+        self.superuser = get_user_model().objects.create(
+            username="super", email="super@example.com", is_superuser=True
+        )
+
+    def test_restricted_ids(self):
+        for model in [Observation, Ephemeris, Template, Toa]:
+            ids = set(model.objects.values_list("id", flat=True))
+            embargoed_ids = set(
+                model.objects.filter(embargo_end_date__gte=timezone.now()).values_list("id", flat=True)
+            )
+            for user, expected in [
+                # Templates are never public to anonymous users
+                (AnonymousUser(), ids if model is Template else embargoed_ids),
+                (self.non_member, embargoed_ids),
+                (self.member, set()),
+                (self.superuser, set()),
+            ]:
+                with self.subTest(model=model.__name__, user=str(user)):
+                    self.assertEqual(model.restricted_ids(user, ids), expected)
+
+    def test_restricted_ids_uses_one_query(self):
+        ids = list(Toa.objects.values_list("id", flat=True)) + [0]
+        non_member = get_user_model().objects.get(id=self.non_member.id)
+
+        with self.assertNumQueries(1):
+            restricted_ids = Toa.restricted_ids(non_member, ids)
+        # Unknown ids are restricted too
+        self.assertIn(0, restricted_ids)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Toa.restricted_ids(non_member, []), set())
+
+    def test_is_restricted_without_annotation(self):
+        self.assertTrue(Observation.objects.get(pulsar__name="J0437-4715").is_restricted(self.non_member))
+        self.assertFalse(Observation.objects.filter(pulsar__name="J0125-2327").first().is_restricted(self.non_member))
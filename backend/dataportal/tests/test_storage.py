@@ -1,9 +1,20 @@
+import hashlib
+import os
+import tempfile
 from datetime import datetime, timezone
+from unittest.mock import patch
 
+from django.core.files.base import ContentFile
 from django.test import TestCase
 from model_bakery import baker
 
-from dataportal.storage import get_template_upload_location, get_upload_location
+from dataportal.storage import (
+    ContentAddressedStorage,
+    create_file_hash,
+    get_template_content_location,
+    get_template_upload_location,
+    get_upload_location,
+)
 
 
 class StorageTestCase(TestCase):
@@ -40,3 +51,31 @@ class StorageTestCase(TestCase):
         )
 
         self.assertEqual(get_template_upload_location(template, "J0023+0923.par"), expected)
+
+    def test_get_template_content_location(self):
+        """Test generation of content addressed paths for template files."""
+        template_hash = hashlib.sha256(b"template").hexdigest()
+        template = baker.prepare("dataportal.Template", template_hash=template_hash)
+
+        self.assertEqual(
+            get_template_content_location(template, "path/to/J0023+0923.std"),
+            f"templates/{template_hash[:2]}/{template_hash}/J0023+0923.std",
+        )
+
+    def test_create_file_hash_reads_in_chunks(self):
+        """Test files are hashed a chunk at a time."""
+        content = os.urandom(1000)
+        with patch("dataportal.storage.HASH_CHUNK_SIZE", 64):
+            self.assertEqual(create_file_hash(ContentFile(content)), hashlib.sha256(content).hexdigest())
+
+    def test_content_addressed_storage_keeps_existing_files(self):
+        """Test saving a name that already exists keeps the stored file."""
+        with tempfile.TemporaryDirectory() as location:
+            storage = ContentAddressedStorage(location=location)
+
+            self.assertEqual(storage.save("ab/abcd/template.std", ContentFile(b"first")), "ab/abcd/template.std")
+            self.assertEqual(storage.save("ab/abcd/template.std", ContentFile(b"second")), "ab/abcd/template.std")
+
+            self.assertEqual(os.listdir(os.path.join(location, "ab", "abcd")), ["template.std"])
+            with storage.open("ab/abcd/template.std") as stored_file:
+                self.assertEqual(stored_file.read(), b"first")
@@ -0,0 +1,113 @@
+import os
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import override_settings
+
+from dataportal.models import Calibration, Observation, ObservationSummary, SummaryUpdate
+from dataportal.signals import update_observation_summaries
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+
+OBSERVATION_FILES = [
+    "2019-04-23-06:11:30_1_J0125-2327.json",
+    "2019-05-14-10:14:18_1_J0125-2327.json",
+    "2019-12-15-17:22:31_1_J0125-2327.json",
+]
+
+
+@override_settings(SUMMARY_UPDATE_QUEUE=True)
+class SummaryUpdateQueueTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, template = create_basic_data()
+        self.calibration = Calibration.objects.create(calibration_type="pre")
+        for file_name in OBSERVATION_FILES:
+            create_observation_pipeline_run_toa(
+                os.path.join(TEST_DATA_DIR, file_name), telescope, template, self.calibration, make_toas=False
+            )
+
+    def process_summary_updates(self, *args):
+        stdout = StringIO()
+        call_command("process_summary_updates", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_saving_observations_only_queues_updates(self):
+        self.assertTrue(SummaryUpdate.objects.exists())
+        self.assertFalse(ObservationSummary.objects.exists())
+        self.calibration.refresh_from_db()
+        self.assertIsNone(self.calibration.n_observations)
+
+    def test_worker_recalculates_each_summary_once(self):
+        n_queued = SummaryUpdate.objects.count()
+        n_distinct = len({summary_update.key for summary_update in SummaryUpdate.objects.all()})
+        self.assertLess(n_distinct, n_queued)
+
+        with patch(
+            "dataportal.models.Calibration.update_observation_session",
+            wraps=Calibration.update_observation_session,
+        ) as mock_session:
+            output = self.process_summary_updates()
+
+        self.assertEqual(mock_session.call_count, 1)
+        self.assertIn(f"Recalculated {n_distinct} summaries for {n_queued} queued updates.", output)
+        self.assertFalse(SummaryUpdate.objects.exists())
+        self.calibration.refresh_from_db()
+        self.assertEqual(self.calibration.n_observations, 3)
+        summary = ObservationSummary.objects.get(
+            obs_type="fold", pulsar=None, project=None, calibration=None, band=None
+        )
+        self.assertEqual(summary.observations, 3)
+
+    def test_matches_immediate_recalculation(self):
+        self.process_summary_updates("--batch-size", "5")
+        queued_summaries = list(ObservationSummary.objects.order_by("id").values())
+
+        ObservationSummary.objects.all().delete()
+        with override_settings(SUMMARY_UPDATE_QUEUE=False):
+            update_observation_summaries(Observation.objects.all())
+
+        immediate_summaries = list(ObservationSummary.objects.order_by("id").values())
+        self.assertEqual(
+            [{**summary, "id": None} for summary in queued_summaries],
+            [{**summary, "id": None} for summary in immediate_summaries],
+        )
+
+    def test_reprocessing_updates_the_existing_summaries(self):
+        self.process_summary_updates()
+        n_summaries = ObservationSummary.objects.count()
+
+        update_observation_summaries(Observation.objects.all())
+        self.process_summary_updates()
+
+        self.assertEqual(ObservationSummary.objects.count(), n_summaries)
+        # The all NULL key of the overall summary is unique too
+        summary = ObservationSummary.objects.get(
+            obs_type=None, pulsar=None, main_project=None, project=None, calibration=self.calibration, band=None
+        )
+        summary.pk = None
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            summary.save()
+
+    def test_moving_an_observation_queues_the_summaries_it_leaves(self):
+        self.process_summary_updates()
+        observation = Observation.objects.order_by("utc_start").first()
+        band = observation.band
+
+        observation.frequency = 816.0
+        observation.bandwidth = 544.0
+        observation.save()
+        self.process_summary_updates()
+
+        self.assertNotEqual(observation.band, band)
+        for summary_band in [band, observation.band]:
+            summary = ObservationSummary.objects.get(
+                obs_type="fold",
+                pulsar=None,
+                main_project=observation.project.main_project,
+                project=None,
+                calibration=None,
+                band=summary_band,
+            )
+            self.assertEqual(summary.observations, Observation.objects.filter(band=summary_band).count())
@@ -0,0 +1,200 @@
+import gzip
+import io
+import os
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from graphql import GraphQLError
+
+from dataportal.models import Project, Toa
+from dataportal.tests.test_base import BaseTestCaseWithTempMedia
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
+
+TIMING_DIR = os.path.join(TEST_DATA_DIR, "timing_files")
+TOA_16CH = os.path.join(TIMING_DIR, "J0437-4715_2023-10-22-04:41:07_zap.16ch1p1t.ar.tim")
+TOA_1CH = os.path.join(TIMING_DIR, "J0437-4715_2023-10-22-04:41:07_zap.1ch1p1t.ar.tim")
+
+
+class ToaBulkCreateTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, self.template = create_basic_data()
+        _, _, self.pipeline_run = create_observation_pipeline_run_toa(
+            os.path.join(TIMING_DIR, "2023-10-22-04:41:07_1_J0437-4715.json"),
+            telescope,
+            self.template,
+            make_toas=False,
+        )
+
+    def bulk_create(self, toa_lines, project_short="PTA", nchan=16):
+        return Toa.bulk_create(
+            pipeline_run_id=self.pipeline_run.id,
+            project_short=project_short,
+            template_id=self.template.id,
+            ephemeris_text=os.path.join(TEST_DATA_DIR, "J0125-2327.par"),
+            toa_lines=toa_lines,
+            dm_corrected=False,
+            nsub_type="1",
+            npol=1,
+            nchan=nchan,
+        )
+
+    def read_lines(self, path):
+        with open(path, "r") as toa_file:
+            return toa_file.readlines()
+
+    def test_returns_saved_toas_in_line_order(self):
+        toa_lines = self.read_lines(TOA_16CH)
+        created_toas = self.bulk_create(toa_lines)
+
+        self.assertEqual(len(created_toas), 16)
+        self.assertEqual([toa.chan for toa in created_toas], list(range(16)))
+        self.assertEqual(
+            sorted(toa.id for toa in created_toas),
+            sorted(Toa.objects.filter(pipeline_run=self.pipeline_run).values_list("id", flat=True)),
+        )
+
+    def test_reupload_updates_existing_rows(self):
+        toa_lines = self.read_lines(TOA_16CH)
+        first_ids = [toa.id for toa in self.bulk_create(toa_lines)]
+
+        toa_lines = [line.replace("-snr ", "-snr 1") if "-chan 3 " in line else line for line in toa_lines]
+        second_ids = [toa.id for toa in self.bulk_create(toa_lines)]
+
+        self.assertEqual(first_ids, second_ids)
+        self.assertEqual(Toa.objects.filter(pipeline_run=self.pipeline_run).count(), 16)
+        updated_line = next(line for line in toa_lines if "-chan 3 " in line)
+        updated_snr = float(updated_line.split("-snr ")[1].split()[0])
+        self.assertEqual(Toa.objects.get(pipeline_run=self.pipeline_run, chan=3).snr, updated_snr)
+
+    def test_batch_is_written_with_a_single_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.bulk_create(self.read_lines(TOA_16CH))
+
+        toa_queries = [query["sql"] for query in queries.captured_queries if '"dataportal_toa"' in query["sql"]]
+        self.assertEqual(len(toa_queries), 1)
+        self.assertIn("ON CONFLICT", toa_queries[0])
+
+    def test_missing_flag_raises(self):
+        toa_lines = [line.replace(" -chan ", " -channel ") for line in self.read_lines(TOA_16CH)]
+
+        with self.assertRaises(GraphQLError):
+            self.bulk_create(toa_lines)
+
+        self.assertFalse(Toa.objects.filter(pipeline_run=self.pipeline_run).exists())
+
+    def test_project_without_metadata_collapses_to_one_row(self):
+        project = Project.objects.create(
+            code="NO-METADATA",
+            short="NOMETA",
+            main_project=self.pipeline_run.observation.project.main_project,
+            toa_metadata_available=False,
+        )
+        toa_lines = self.read_lines(TOA_16CH)
+
+        created_toas = self.bulk_create(toa_lines, project_short=project.short)
+        self.bulk_create(toa_lines, project_short=project.short)
+
+        self.assertEqual(len(created_toas), 16)
+        self.assertEqual(len({toa.id for toa in created_toas}), 1)
+        toas = Toa.objects.filter(pipeline_run=self.pipeline_run, project=project)
+        self.assertEqual(toas.count(), 1)
+        self.assertIsNone(toas.get().chan)
+
+
+class ToaCopyFromTimFileTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        telescope, _, _, self.template = create_basic_data()
+        _, _, self.pipeline_run = create_observation_pipeline_run_toa(
+            os.path.join(TIMING_DIR, "2023-10-22-04:41:07_1_J0437-4715.json"),
+            telescope,
+            self.template,
+            make_toas=False,
+        )
+
+    def copy_from_tim_file(self, tim_bytes, project_short="PTA", nchan=16):
+        return Toa.copy_from_tim_file(
+            tim_file=io.BytesIO(tim_bytes),
+            pipeline_run_id=self.pipeline_run.id,
+            project_short=project_short,
+            template_id=self.template.id,
+            ephemeris_text=os.path.join(TEST_DATA_DIR, "J0125-2327.par"),
+            dm_corrected=False,
+            nsub_type="1",
+            npol=1,
+            nchan=nchan,
+        )
+
+    def read_bytes(self, path):
+        with open(path, "rb") as toa_file:
+            return toa_file.read()
+
+    def test_matches_bulk_create(self):
+        tim_bytes = self.read_bytes(TOA_16CH)
+        fields = ["chan", "subint", "mjd", "mjd_err", "freq_MHz", "snr", "gof", "length", "ephemeris_id"]
+
+        self.assertEqual(self.copy_from_tim_file(tim_bytes), 16)
+        copied = list(Toa.objects.filter(pipeline_run=self.pipeline_run).order_by("chan").values(*fields))
+        Toa.objects.filter(pipeline_run=self.pipeline_run).delete()
+        Toa.bulk_create(
+            pipeline_run_id=self.pipeline_run.id,
+            project_short="PTA",
+            template_id=self.template.id,
+            ephemeris_text=os.path.join(TEST_DATA_DIR, "J0125-2327.par"),
+            toa_lines=tim_bytes.decode().splitlines(keepends=True),
+            dm_corrected=False,
+            nsub_type="1",
+            npol=1,
+            nchan=16,
+        )
+        created = list(Toa.objects.filter(pipeline_run=self.pipeline_run).order_by("chan").values(*fields))
+
+        self.assertEqual(copied, created)
+
+    def test_gzipped_reupload_updates_existing_rows(self):
+        tim_bytes = self.read_bytes(TOA_16CH)
+        self.copy_from_tim_file(tim_bytes)
+        first_ids = list(Toa.objects.filter(pipeline_run=self.pipeline_run).order_by("chan").values_list("id"))
+
+        self.assertEqual(self.copy_from_tim_file(gzip.compress(tim_bytes.replace(b"-snr ", b"-snr 1"))), 16)
+
+        toas = Toa.objects.filter(pipeline_run=self.pipeline_run).order_by("chan")
+        self.assertEqual(list(toas.values_list("id")), first_ids)
+        self.assertTrue(all(snr >= 1000 for snr in toas.values_list("snr", flat=True)))
+
+    def test_invalid_line_writes_nothing(self):
+        tim_bytes = self.read_bytes(TOA_16CH) + b"not a valid toa line with enough columns -fe\n"
+
+        with self.assertRaises(ValueError):
+            self.copy_from_tim_file(tim_bytes)
+
+        self.assertFalse(Toa.objects.filter(pipeline_run=self.pipeline_run).exists())
+
+    def test_lines_without_chan_or_subint_raise(self):
+        # ON CONFLICT can't match NULL keys, so lines without them would be duplicated by every re-upload
+        for flag in [b" -chan ", b" -subint "]:
+            with self.subTest(flag=flag):
+                with self.assertRaises(ValueError):
+                    self.copy_from_tim_file(self.read_bytes(TOA_16CH).replace(flag, b" -other "))
+
+        self.assertFalse(Toa.objects.filter(pipeline_run=self.pipeline_run).exists())
+
+    def test_round_trip_mismatch_raises(self):
+        tim_bytes = self.read_bytes(TOA_1CH).replace(b" meerkat ", b" meerkat  ")
+
+        with self.assertRaises(ValueError):
+            self.copy_from_tim_file(tim_bytes, nchan=1)
+
+    def test_project_without_metadata_collapses_to_one_row(self):
+        project = Project.objects.create(
+            code="NO-METADATA",
+            short="NOMETA",
+            main_project=self.pipeline_run.observation.project.main_project,
+            toa_metadata_available=False,
+        )
+
+        self.assertEqual(self.copy_from_tim_file(self.read_bytes(TOA_16CH), project_short=project.short), 1)
+        self.copy_from_tim_file(self.read_bytes(TOA_16CH), project_short=project.short)
+
+        toas = Toa.objects.filter(pipeline_run=self.pipeline_run, project=project)
+        self.assertEqual(toas.count(), 1)
+        self.assertIsNone(toas.get().chan)
@@ -1,10 +1,16 @@
 import json
 from base64 import b64decode
+from datetime import datetime, timedelta
 
+import numpy as np
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from graphene_django.utils.testing import GraphQLTestCase
 
+from dataportal.models import Toa
 from dataportal.tests.test_base import BaseTestCaseWithTempMedia
 from dataportal.tests.testing_utils import setup_timing_obs
+from utils.binary_phase import get_binary_phase
 
 
 class ToaResidualIngestTestCase(BaseTestCaseWithTempMedia, GraphQLTestCase):
@@ -101,3 +107,40 @@ class ToaResidualIngestTestCase(BaseTestCaseWithTempMedia, GraphQLTestCase):
         for toa in content["data"]["createResidual"]["toa"]:
             self.assertIn(toa["id"], residual_dict)
             self.assertEqual(toa["residualSec"], residual_dict[toa["id"]])
+
+
+class ToaUpdateResidualsTestCase(BaseTestCaseWithTempMedia):
+    def setUp(self):
+        setup_timing_obs()
+        self.toas = list(Toa.objects.select_related("ephemeris").order_by("id"))
+        self.residual_lines = [f"{toa.id},{toa.mjd},{n},{n * 10 + 1},0.5" for n, toa in enumerate(self.toas)]
+
+    def test_matches_per_toa_calculation(self):
+        updated_toas = Toa.update_residuals(self.residual_lines + ["999999999,60000.0,1,1,1"])
+
+        self.assertEqual(len(updated_toas), len(self.toas))
+        self.assertGreater(len({toa.ephemeris_id for toa in self.toas}), 1)
+        for n, toa in enumerate(self.toas):
+            saved_toa = Toa.objects.get(id=toa.id)
+            ephemeris_dict = json.loads(toa.ephemeris.ephemeris_data)
+            date = datetime(1858, 11, 17) + timedelta(days=float(toa.mjd))
+            expected_day_of_year = (
+                date.timetuple().tm_yday + date.hour / 24.0 + date.minute / (1440.0) + date.second / (86400.0)
+            )
+            self.assertEqual(saved_toa.day_of_year, expected_day_of_year)
+            self.assertAlmostEqual(
+                saved_toa.binary_orbital_phase,
+                float(get_binary_phase(np.array([float(toa.mjd)]), ephemeris_dict)[0]),
+                places=12,
+            )
+            self.assertEqual(saved_toa.residual_sec, n)
+            self.assertEqual(saved_toa.residual_sec_err, (n * 10 + 1) / 1e6)
+            self.assertEqual(saved_toa.residual_phase, 0.5)
+            self.assertEqual(saved_toa.residual_phase_err, (n * 10 + 1) / 1e6 / ephemeris_dict["P0"])
+
+    def test_updates_are_batched(self):
+        with CaptureQueriesContext(connection) as queries:
+            Toa.update_residuals(self.residual_lines)
+
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
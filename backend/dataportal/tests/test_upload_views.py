@@ -1,16 +1,24 @@
+import gzip
+import hashlib
+import io
 import json
 import os
+import tarfile
+import zipfile
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
 from django.test import Client
 from django.urls import reverse
 
-from dataportal.models import PipelineImage, Template
+from dataportal.models import PipelineImage, Template, Toa
+from dataportal.storage import ContentAddressedStorage
 from dataportal.tests.test_base import BaseTestCaseWithTempMedia
-from dataportal.tests.testing_utils import create_basic_data, create_observation_pipeline_run_toa
+from dataportal.tests.testing_utils import TEST_DATA_DIR, create_basic_data, create_observation_pipeline_run_toa
 from utils.constants import UserRole
 
 User = get_user_model()
@@ -78,6 +86,81 @@ class UploadTemplateViewTestCase(BaseTestCaseWithTempMedia):
         response_data = json.loads(response.content)
         self.assertTrue(response_data["success"])
 
+    def post_template(self, content, band="LBAND"):
+        content_type = ContentType.objects.get_for_model(Template)
+        self.unrestricted_user.user_permissions.add(
+            Permission.objects.get(codename="add_template", content_type=content_type)
+        )
+        self.client.force_login(self.unrestricted_user)
+        return self.client.post(
+            reverse("upload_template-list"),
+            {
+                "template_upload": SimpleUploadedFile("test_template.std", content),
+                "pulsar_name": self.pulsar.name,
+                "project_code": self.project.code,
+                "band": band,
+            },
+        )
+
+    def test_upload_template_is_hashed_while_spooled(self):
+        """Test the template hash comes from the upload handler and duplicates store nothing"""
+        content = b"Template content " * 10000
+
+        with patch("dataportal.storage.create_file_hash") as mock_hash:
+            response = self.post_template(content)
+        mock_hash.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        response_data = json.loads(response.content)
+        self.assertTrue(response_data["created"])
+        template = Template.objects.get(id=response_data["id"])
+        template_hash = hashlib.sha256(content).hexdigest()
+        self.assertEqual(template.template_hash, template_hash)
+        self.assertEqual(
+            template.template_file.name, f"templates/{template_hash[:2]}/{template_hash}/test_template.std"
+        )
+        with template.template_file.open("rb") as template_file:
+            self.assertEqual(template_file.read(), content)
+
+        with patch.object(ContentAddressedStorage, "_save") as mock_save:
+            response = self.post_template(content)
+        mock_save.assert_not_called()
+        response_data = json.loads(response.content)
+        self.assertFalse(response_data["created"])
+        self.assertEqual(response_data["id"], template.id)
+
+    def test_template_saved_without_a_hash_is_hashed(self):
+        """Test a template file saved without a hash, e.g. from the admin, is hashed and stored by content"""
+        content = b"Admin template"
+        template_hash = hashlib.sha256(content).hexdigest()
+
+        template = Template(pulsar=self.pulsar, project=self.project, band="LBAND")
+        template.template_file = SimpleUploadedFile("admin_template.std", content)
+        template.save()
+
+        template.refresh_from_db()
+        self.assertEqual(template.template_hash, template_hash)
+        self.assertEqual(
+            template.template_file.name, f"templates/{template_hash[:2]}/{template_hash}/admin_template.std"
+        )
+
+        # Replacing the file updates the hash
+        template.template_file = SimpleUploadedFile("admin_template.std", b"New admin template")
+        template.save()
+        template.refresh_from_db()
+        self.assertEqual(template.template_hash, hashlib.sha256(b"New admin template").hexdigest())
+
+    def test_identical_templates_share_a_file(self):
+        """Test identical template files uploaded for different bands are stored once"""
+
+        lband_id = json.loads(self.post_template(b"Shared template").content)["id"]
+        uhf_id = json.loads(self.post_template(b"Shared template", band="UHF").content)["id"]
+
+        self.assertNotEqual(lband_id, uhf_id)
+        lband, uhf = Template.objects.get(id=lband_id), Template.objects.get(id=uhf_id)
+        self.assertEqual(lband.template_file.name, uhf.template_file.name)
+        template_dir = os.path.dirname(lband.template_file.path)
+        self.assertEqual(os.listdir(template_dir), ["test_template.std"])
+
     def test_upload_template_restricted_user_without_permission(self):
         """Test template upload with restricted user (no add_template permission)"""
         self.client.login(username="restricted@example.com", password="secret")
@@ -214,3 +297,325 @@ class UploadPipelineImageViewTestCase(BaseTestCaseWithTempMedia):
         # Note: DRF permission classes return 403 for both unauthenticated and unauthorized users
         # when accessed through ViewSets
         self.assertEqual(response.status_code, 403)
+
+
+class UploadToaViewTestCase(BaseTestCaseWithTempMedia):
+    """Tests for the UploadToa ViewSet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data once for all test methods in this class."""
+        cls.User = get_user_model()
+
+        cls.unrestricted_user = cls.User.objects.create_user(
+            username="unrestricted",
+            email="unrestricted@example.com",
+            password="secret",
+            role=UserRole.UNRESTRICTED.value,
+        )
+        cls.restricted_user = cls.User.objects.create_user(
+            username="restricted", email="restricted@example.com", password="secret", role=UserRole.RESTRICTED.value
+        )
+        content_type = ContentType.objects.get_for_model(Toa)
+        cls.unrestricted_user.user_permissions.add(
+            Permission.objects.get(codename="add_toa", content_type=content_type)
+        )
+
+        telescope, project, ephemeris, template = create_basic_data()
+        cls.template = template
+        observation, pulsar_fold_result, pipeline_run = create_observation_pipeline_run_toa(
+            os.path.join(TEST_DATA_DIR, "timing_files", "2023-10-22-04:41:07_1_J0437-4715.json"),
+            telescope,
+            template,
+            make_toas=False,
+        )
+        cls.pipeline_run = pipeline_run
+        with open(os.path.join(TEST_DATA_DIR, "J0125-2327.par"), "r") as par_file:
+            cls.ephemeris_text = par_file.read()
+        with open(
+            os.path.join(TEST_DATA_DIR, "timing_files", "J0437-4715_2023-10-22-04:41:07_zap.16ch1p1t.ar.tim"), "rb"
+        ) as tim_file:
+            cls.tim_bytes = tim_file.read()
+
+    def setUp(self):
+        """Setup that runs before each test method."""
+        self.client = Client()
+
+    def post_toas(self, toa_upload, **overrides):
+        data = {
+            "toa_upload": toa_upload,
+            "pipeline_run_id": self.pipeline_run.id,
+            "project_short": "PTA",
+            "template_id": self.template.id,
+            "ephemeris_text": self.ephemeris_text,
+            "dm_corrected": False,
+            "nsub_type": "1",
+            "obs_npol": 1,
+            "obs_nchan": 16,
+        }
+        data.update(overrides)
+        return self.client.post(reverse("upload_toa-list"), data)
+
+    def test_upload_toa_with_permission(self):
+        """Test a gzipped .tim upload is ingested by a user with add_toa permission"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+
+        response = self.post_toas(SimpleUploadedFile("toas.tim.gz", gzip.compress(self.tim_bytes)))
+
+        self.assertEqual(response.status_code, 201)
+        response_data = json.loads(response.content)
+        self.assertTrue(response_data["success"])
+        self.assertEqual(response_data["count"], 16)
+        self.assertEqual(Toa.objects.filter(pipeline_run=self.pipeline_run).count(), 16)
+
+    def test_upload_toa_invalid_input(self):
+        """Test missing fields and unknown foreign keys are rejected with a 400"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+
+        response = self.post_toas(SimpleUploadedFile("toas.tim", self.tim_bytes), nsub_type="bogus")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("nsub_type", json.loads(response.content)["errors"])
+
+        response = self.post_toas(SimpleUploadedFile("toas.tim", self.tim_bytes), project_short="MISSING")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(json.loads(response.content)["success"])
+        self.assertFalse(Toa.objects.exists())
+
+    def test_upload_toa_malformed_file(self):
+        """Test lines missing a flag and corrupt or truncated gzip files are rejected with a 400"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+        compressed = gzip.compress(self.tim_bytes)
+
+        for name, content in [
+            ("missing_flag.tim", self.tim_bytes.replace(b" -snr ", b" -nosnr ")),
+            ("corrupt.tim.gz", compressed[:10] + b"corrupt" + compressed[17:]),
+            ("truncated.tim.gz", compressed[: len(compressed) // 2]),
+        ]:
+            with self.subTest(name=name):
+                response = self.post_toas(SimpleUploadedFile(name, content))
+
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(json.loads(response.content)["success"])
+                self.assertFalse(Toa.objects.exists())
+
+    def test_upload_toa_restricted_user_without_permission(self):
+        """Test ToA upload with restricted user (no add_toa permission)"""
+        self.client.login(username="restricted@example.com", password="secret")
+
+        response = self.post_toas(SimpleUploadedFile("toas.tim", self.tim_bytes))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Toa.objects.exists())
+
+
+class UploadPipelineImageBundleViewTestCase(BaseTestCaseWithTempMedia):
+    """Tests for the UploadPipelineImageBundle ViewSet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up test data once for all test methods in this class."""
+        cls.User = get_user_model()
+
+        cls.unrestricted_user = cls.User.objects.create_user(
+            username="unrestricted",
+            email="unrestricted@example.com",
+            password="secret",
+            role=UserRole.UNRESTRICTED.value,
+        )
+        cls.restricted_user = cls.User.objects.create_user(
+            username="restricted", email="restricted@example.com", password="secret", role=UserRole.RESTRICTED.value
+        )
+        content_type = ContentType.objects.get_for_model(PipelineImage)
+        cls.unrestricted_user.user_permissions.add(
+            Permission.objects.get(codename="add_pipelineimage", content_type=content_type)
+        )
+
+        telescope, project, ephemeris, template = create_basic_data()
+        _, _, pipeline_run = create_observation_pipeline_run_toa(
+            os.path.join(TEST_DATA_DIR, "2023-04-17-15:08:35_1_J0437-4715.json"),
+            telescope,
+            template,
+            make_toas=False,
+        )
+        cls.pipeline_run = pipeline_run
+
+    def setUp(self):
+        """Setup that runs before each test method."""
+        self.client = Client()
+        self.images = {
+            "profile.png": b"profile image",
+            "phase_time.png": b"phase time image",
+            "bandpass_raw.png": b"raw bandpass image",
+        }
+        self.manifest = [
+            {"file": "profile.png", "image_type": "profile", "resolution": "high", "cleaned": True},
+            {"file": "phase_time.png", "image_type": "phase-time", "resolution": "low", "cleaned": True},
+            {"file": "bandpass_raw.png", "image_type": "bandpass", "resolution": "high", "cleaned": False},
+        ]
+
+    def tar_bundle(self, images):
+        bundle = io.BytesIO()
+        with tarfile.open(fileobj=bundle, mode="w:gz") as archive:
+            for name, content in images.items():
+                member = tarfile.TarInfo(f"images/{name}")
+                member.size = len(content)
+                archive.addfile(member, io.BytesIO(content))
+        return SimpleUploadedFile("images.tar.gz", bundle.getvalue())
+
+    def zip_bundle(self, images):
+        bundle = io.BytesIO()
+        with zipfile.ZipFile(bundle, "w") as archive:
+            for name, content in images.items():
+                archive.writestr(name, content)
+        return SimpleUploadedFile("images.zip", bundle.getvalue())
+
+    def post_bundle(self, manifest=None, **files):
+        data = {
+            "pipeline_run_id": self.pipeline_run.id,
+            "manifest": json.dumps(self.manifest if manifest is None else manifest),
+        }
+        data.update(files)
+        return self.client.post(reverse("upload_image_bundle-list"), data)
+
+    def assert_images_stored(self, response_data):
+        images = PipelineImage.objects.filter(pulsar_fold_result__observation=self.pipeline_run.observation)
+        self.assertEqual(images.count(), len(self.manifest))
+        ids = {image["file"]: image["id"] for image in response_data["images"]}
+        for entry in self.manifest:
+            image = images.get(id=ids[entry["file"]])
+            self.assertEqual(
+                (image.image_type, image.resolution, image.cleaned),
+                (entry["image_type"], entry["resolution"], entry["cleaned"]),
+            )
+            self.assertTrue(image.image.name.endswith(entry["file"]))
+            self.assertEqual(image.url, image.image.url)
+            with image.image.open("rb") as image_file:
+                self.assertEqual(image_file.read(), self.images[entry["file"]])
+
+    def test_upload_tar_bundle(self):
+        """Test every image of a tar bundle is stored and returned in manifest order"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+
+        response = self.post_bundle(bundle=self.tar_bundle(self.images))
+
+        self.assertEqual(response.status_code, 201)
+        response_data = json.loads(response.content)
+        self.assertTrue(response_data["success"])
+        self.assertEqual([image["file"] for image in response_data["images"]], list(self.images))
+        self.assertTrue(all(image["created"] for image in response_data["images"]))
+        self.assert_images_stored(response_data)
+
+    def test_upload_zip_bundle_replaces_existing_images(self):
+        """Test uploading the images again updates the existing rows"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+        first_ids = [
+            image["id"]
+            for image in json.loads(self.post_bundle(bundle=self.tar_bundle(self.images)).content)["images"]
+        ]
+
+        self.images["profile.png"] = b"new profile image"
+        response = self.post_bundle(bundle=self.zip_bundle(self.images))
+
+        self.assertEqual(response.status_code, 201)
+        response_data = json.loads(response.content)
+        self.assertEqual([image["id"] for image in response_data["images"]], first_ids)
+        self.assertFalse(any(image["created"] for image in response_data["images"]))
+        self.assert_images_stored(response_data)
+
+    def test_upload_multipart_images(self):
+        """Test the images can be sent as separate files instead of a bundle"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+
+        response = self.post_bundle(
+            image_uploads=[SimpleUploadedFile(name, content) for name, content in self.images.items()]
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assert_images_stored(json.loads(response.content))
+
+    def test_upload_bundle_invalid_input(self):
+        """Test bad manifests, missing files and unknown pipeline runs are rejected without writing rows"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+
+        response = self.post_bundle(
+            manifest=[dict(self.manifest[0], image_type="bogus")], bundle=self.tar_bundle(self.images)
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("manifest", json.loads(response.content)["errors"])
+
+        response = self.post_bundle(manifest=self.manifest + [dict(self.manifest[0], file="other.png")])
+        self.assertEqual(response.status_code, 400)
+
+        response = self.post_bundle(bundle=self.tar_bundle({"profile.png": b"profile image"}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("phase_time.png", json.loads(response.content)["errors"])
+
+        response = self.post_bundle(bundle=SimpleUploadedFile("images.tar", b"not an archive"))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            reverse("upload_image_bundle-list"),
+            {"pipeline_run_id": 0, "manifest": json.dumps(self.manifest), "bundle": self.tar_bundle(self.images)},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PipelineImage.objects.exists())
+
+    def test_upload_bundle_over_limits(self):
+        """Test bundles with too many or too large files are rejected before anything is stored"""
+        self.client.login(username="unrestricted@example.com", password="secret")
+
+        for bundle in [self.tar_bundle, self.zip_bundle]:
+            with self.subTest(bundle=bundle.__name__):
+                with patch("dataportal.storage.BUNDLE_MAX_FILES", 2):
+                    response = self.post_bundle(bundle=bundle(self.images))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("more than 2 files", json.loads(response.content)["errors"])
+
+                with patch("dataportal.storage.BUNDLE_MAX_FILE_SIZE", 14):
+                    response = self.post_bundle(bundle=bundle(self.images))
+                self.assertEqual(response.status_code, 400)
+
+                with patch("dataportal.storage.BUNDLE_MAX_TOTAL_SIZE", 40):
+                    response = self.post_bundle(bundle=bundle(self.images))
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(PipelineImage.objects.exists())
+
+    def test_failed_upsert_deletes_stored_files(self):
+        """Test the files of a bundle whose rows fail to be written are deleted"""
+        storage = PipelineImage._meta.get_field("image").storage
+        images = [(entry, SimpleUploadedFile(entry["file"], self.images[entry["file"]])) for entry in self.manifest]
+
+        with patch.object(storage, "save", wraps=storage.save) as mock_save:
+            with patch("dataportal.models.PipelineImage.objects.bulk_create", side_effect=DatabaseError):
+                with self.assertRaises(DatabaseError):
+                    PipelineImage.upsert_bundle(self.pipeline_run.id, images)
+
+        self.assertEqual(mock_save.call_count, len(self.manifest))
+        for call in mock_save.call_args_list:
+            self.assertFalse(storage.exists(call.args[0]))
+        self.assertFalse(PipelineImage.objects.exists())
+
+    def test_replaced_image_files_are_deleted_on_commit(self):
+        """Test the old file of an image replaced by a file with another name is deleted once committed"""
+        storage = PipelineImage._meta.get_field("image").storage
+        images = [(entry, SimpleUploadedFile(entry["file"], self.images[entry["file"]])) for entry in self.manifest]
+        [(old_image, _), *_] = PipelineImage.upsert_bundle(self.pipeline_run.id, images)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            [(new_image, created)] = PipelineImage.upsert_bundle(
+                self.pipeline_run.id, [(self.manifest[0], SimpleUploadedFile("profile_v2.png", b"new profile"))]
+            )
+
+        self.assertFalse(created)
+        self.assertEqual(PipelineImage.objects.get(id=old_image.id).image.name, new_image.image.name)
+        self.assertTrue(storage.exists(new_image.image.name))
+        self.assertFalse(storage.exists(old_image.image.name))
+
+    def test_upload_bundle_restricted_user_without_permission(self):
+        """Test bundle upload with restricted user (no add_pipelineimage permission)"""
+        self.client.login(username="restricted@example.com", password="secret")
+
+        response = self.post_bundle(bundle=self.tar_bundle(self.images))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(PipelineImage.objects.exists())
@@ -6,6 +6,8 @@ from . import views
 router = routers.DefaultRouter()
 router.register(r"api/upload/template", views.UploadTemplate, basename="upload_template")
 router.register(r"api/upload/image", views.UploadPipelineImage, basename="upload_image")
+router.register(r"api/upload/image_bundle", views.UploadPipelineImageBundle, basename="upload_image_bundle")
+router.register(r"api/upload/toa", views.UploadToa, basename="upload_toa")
 
 urlpatterns = [
     path("", include(router.urls)),
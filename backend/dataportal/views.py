@@ -1,8 +1,11 @@
 import logging
+import os
+from contextlib import ExitStack
 from datetime import datetime, timezone
 from pathlib import Path
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import OuterRef, Subquery
 from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
@@ -17,20 +20,26 @@ from zipstream import ZipStream
 
 from utils.ephemeris import format_ephemeris_to_text
 
+from .caching import get_active_project_ids
 from .file_utils import serve_file
 from .models import (
+    Ephemeris,
     Observation,
     PipelineImage,
     PipelineRun,
     Project,
-    ProjectMembership,
     Pulsar,
     PulsarFoldResult,
     Template,
     Toa,
 )
-from .serializers import UploadPipelineImageSerializer, UploadTemplateSerializer
-from .storage import create_file_hash
+from .serializers import (
+    UploadPipelineImageBundleSerializer,
+    UploadPipelineImageSerializer,
+    UploadTemplateSerializer,
+    UploadToaSerializer,
+)
+from .storage import HashingFileUploadHandler, get_uploaded_file_hash, open_file_bundle
 
 logger = logging.getLogger("dataportal.media")
 
@@ -149,12 +158,7 @@ def get_accessible_toa_files(user, observations):
     # Structure: {project_id1, project_id2, ...}
     user_project_ids = set()
     if user.is_authenticated and not user.is_superuser:
-        user_project_ids = set(
-            ProjectMembership.objects.filter(
-                user=user,
-                is_active=True,
-            ).values_list("project_id", flat=True)
-        )
+        user_project_ids = get_active_project_ids(user)
 
     # Fetch related objects for the unique (observation, project) combinations
     # We need one representative ToA per group to access embargo status via the project relationship
@@ -186,6 +190,14 @@ def get_accessible_toa_files(user, observations):
                 "template": toa.template,
             }
 
+    # Check the ephemerides and templates of every group at once rather than one query per object
+    restricted_ephemeris_ids = Ephemeris.restricted_ids(
+        user, {details["ephemeris"].id for details in group_details.values()}
+    )
+    restricted_template_ids = Template.restricted_ids(
+        user, {details["template"].id for details in group_details.values()}
+    )
+
     # Build result dictionary: for each observation, collect accessible ToA files
     # Gate 2 logic: Filter ToAs by per-project embargo and membership
     result = {obs: [] for obs in observations}
@@ -201,7 +213,7 @@ def get_accessible_toa_files(user, observations):
 
         # Third embargo test: ToAs are restricted if their Ephemeris or Template is restricted.
         # This overrides the older Gate 2 based only on observation date.
-        if ephemeris.is_restricted(user) or template.is_restricted(user):
+        if ephemeris.id in restricted_ephemeris_ids or template.id in restricted_template_ids:
             # Log denial for debugging/audit purposes
             logger.warning(
                 f"User {user.username if user.is_authenticated else 'anonymous'} denied access to "
@@ -273,6 +285,15 @@ class PipelineImageAddPermission(BasePermission):
         return request.user.has_perm("dataportal.add_pipelineimage")
 
 
+class ToaAddPermission(BasePermission):
+    """
+    Custom permission to check for dataportal.add_toa permission.
+    """
+
+    def has_permission(self, request, view):
+        return request.user.has_perm("dataportal.add_toa")
+
+
 def handler500(request):
     if settings.ENABLE_SENTRY_DSN:
         return render(
@@ -292,6 +313,12 @@ class UploadTemplate(ViewSet):
     serializer_class = UploadTemplateSerializer
     permission_classes = [TemplateAddPermission]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Hash the template as it is spooled to disk instead of reading it back afterwards
+        if not hasattr(request, "_files"):
+            request.upload_handlers = [HashingFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def create(self, request):
         template_upload = request.FILES.get("template_upload")
         pulsar_name = request.data.get("pulsar_name")
@@ -315,28 +342,24 @@ class UploadTemplate(ViewSet):
         except Project.DoesNotExist:
             return JsonResponse({"errors": "Project code {project_code} not found."}, status=400)
 
-        # Create Template object
-        with template_upload.open("rb") as file:
-            template_hash = create_file_hash(file)
-            # Check if a template with the same hash already exists
-            template_check = Template.objects.filter(
-                pulsar=pulsar,
-                project=project,
-                band=band,
-                template_hash=template_hash,
-            )
-            if template_check.exists():
-                id = template_check.first().id
-                response = f"POST API and you have uploaded a template file to Template id: {id} (already exists)"
+        # The upload was hashed while it was spooled, so nothing is stored if the template already exists
+        template_hash = get_uploaded_file_hash(template_upload)
+        template_keys = {"pulsar": pulsar, "project": project, "band": band, "template_hash": template_hash}
+        template = Template.objects.filter(**template_keys).first()
+        created = template is None
+        if created:
+            try:
+                with transaction.atomic():
+                    template = Template.objects.create(**template_keys, template_file=template_upload)
+            except IntegrityError:
+                # The same template was uploaded concurrently
+                template = Template.objects.get(**template_keys)
                 created = False
-            else:
-                template = Template.objects.create(
-                    pulsar=pulsar, project=project, band=band, template_hash=template_hash, template_file=file
-                )
-                template.save()
-                id = template.id
-                response = f"POST API and you have uploaded a template file to Template id: {id}"
-                created = True
+        id = template.id
+        if created:
+            response = f"POST API and you have uploaded a template file to Template id: {id}"
+        else:
+            response = f"POST API and you have uploaded a template file to Template id: {id} (already exists)"
 
         return JsonResponse(
             {
@@ -408,6 +431,101 @@ class UploadPipelineImage(ViewSet):
         )
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class UploadPipelineImageBundle(ViewSet):
+    """
+    Upload all the images of a pipeline run in one request.
+
+    The images are sent either as a tar or zip bundle or as several image_uploads files, with a JSON
+    manifest giving the image_type, resolution and cleaned of each file name.
+    """
+
+    serializer_class = UploadPipelineImageBundleSerializer
+    permission_classes = [PipelineImageAddPermission]
+
+    def create(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse({"errors": serializer.errors, "text": None, "success": False}, status=400)
+        data = serializer.validated_data
+
+        try:
+            with ExitStack() as stack:
+                if "bundle" in data:
+                    files = stack.enter_context(open_file_bundle(data["bundle"]))
+                else:
+                    files = {os.path.basename(image_file.name): image_file for image_file in data["image_uploads"]}
+
+                missing = [entry["file"] for entry in data["manifest"] if entry["file"] not in files]
+                if missing:
+                    raise ValueError(f"Files listed in the manifest were not uploaded: {', '.join(missing)}")
+                pipeline_images = PipelineImage.upsert_bundle(
+                    data["pipeline_run_id"], [(entry, files[entry["file"]]) for entry in data["manifest"]]
+                )
+        except (PipelineRun.DoesNotExist, PulsarFoldResult.DoesNotExist, ValueError) as error:
+            return JsonResponse({"errors": str(error), "text": str(error), "success": False}, status=400)
+
+        return JsonResponse(
+            {
+                "text": (
+                    f"POST API and you have uploaded {len(pipeline_images)} images to PipelineRun id: "
+                    f"{data['pipeline_run_id']}"
+                ),
+                "success": True,
+                "errors": None,
+                "images": [
+                    {"file": entry["file"], "id": pipeline_image.id, "created": created}
+                    for entry, (pipeline_image, created) in zip(data["manifest"], pipeline_images)
+                ],
+            },
+            status=201,
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class UploadToa(ViewSet):
+    """
+    Ingest a whole .tim file (optionally gzip compressed) in one request.
+
+    The file is streamed line by line into the database with COPY instead of being held in memory,
+    so this is the preferred route for large ToA files over the createToa mutation.
+    """
+
+    serializer_class = UploadToaSerializer
+    permission_classes = [ToaAddPermission]
+
+    def create(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse({"errors": serializer.errors, "text": None, "success": False}, status=400)
+        data = serializer.validated_data
+
+        try:
+            n_toas = Toa.copy_from_tim_file(
+                tim_file=data["toa_upload"],
+                pipeline_run_id=data["pipeline_run_id"],
+                project_short=data["project_short"],
+                template_id=data["template_id"],
+                ephemeris_text=data["ephemeris_text"],
+                dm_corrected=data["dm_corrected"],
+                nsub_type=data["nsub_type"],
+                npol=data["obs_npol"],
+                nchan=data["obs_nchan"],
+            )
+        except (PipelineRun.DoesNotExist, Project.DoesNotExist, Template.DoesNotExist, ValueError) as error:
+            return JsonResponse({"errors": str(error), "text": str(error), "success": False}, status=400)
+
+        return JsonResponse(
+            {
+                "text": f"POST API and you have uploaded {n_toas} ToAs to PipelineRun id: {data['pipeline_run_id']}",
+                "success": True,
+                "errors": None,
+                "count": n_toas,
+            },
+            status=201,
+        )
+
+
 @require_GET
 def download_observation_files(request, jname, observation_timestamp, beam, file_type):
     """
@@ -527,20 +645,23 @@ def download_pulsar_files(request, jname, file_type):
 
     try:
         pulsar = Pulsar.objects.get(name=jname)
-        observations = Observation.objects.filter(
-            pulsar=pulsar,
-            project__main_project__name__iexact="MeerTime",
-            project__allow_downloads=True,
-            obs_type="fold",
-        ).order_by("utc_start")
+        observations = list(
+            Observation.objects.filter(
+                pulsar=pulsar,
+                project__main_project__name__iexact="MeerTime",
+                project__allow_downloads=True,
+                obs_type="fold",
+            ).order_by("utc_start")
+        )
 
         # If there are no observations, return 404
-        if not observations.exists():
+        if not observations:
             return HttpResponse("No observations found for this pulsar", status=404)
 
-        # Check if all observations are restricted for this user
-        all_restricted = all(obs.is_restricted(request.user) for obs in observations)
-        if all_restricted:
+        # Check if all observations are restricted for this user, with one query for all of them
+        restricted_ids = Observation.restricted_ids(request.user, [obs.id for obs in observations])
+        accessible_observations = [obs for obs in observations if obs.id not in restricted_ids]
+        if not accessible_observations:
             return HttpResponse(
                 "Access denied - all data is under embargo. Please request to join project(s).", status=403
             )
@@ -551,9 +672,8 @@ def download_pulsar_files(request, jname, file_type):
             has_files = False
 
             if file_type == "toas":
-                # Gate 1: Filter observations by observation-level embargo
+                # Gate 1: Only the observations that aren't restricted by the observation-level embargo
                 # Gate 2: get_accessible_toa_files handles per-project ToA access
-                accessible_observations = [obs for obs in observations if not obs.is_restricted(request.user)]
                 obs_toa_files = get_accessible_toa_files(request.user, accessible_observations)
 
                 for observation, toa_files in obs_toa_files.items():
@@ -577,12 +697,8 @@ def download_pulsar_files(request, jname, file_type):
                             eph_filename = f"{observation.pulsar.name}_{project.short}.par"
                             zs.add(ephemeris_text.encode("utf-8"), f"{zip_dir}{eph_filename}")
             else:
-                # Handle full and decimated files
-                for observation in observations:
-                    # Check if the observation is restricted for this user
-                    if observation.is_restricted(request.user):
-                        continue
-
+                # Handle full and decimated files of the observations the user can access
+                for observation in accessible_observations:
                     # Construct the relative path for the observation
                     base_path = Path(
                         f"{pulsar.name}/{observation.utc_start.strftime('%Y-%m-%d-%H:%M:%S')}/{observation.beam}"
@@ -701,10 +817,13 @@ def serve_protected_media(request, file_path):
 
     # Try to find as Template
     try:
-        template = Template.objects.select_related("project", "pulsar").get(template_file=lookup_path)
+        # Identical template files are stored once, so a file can belong to several templates
+        templates = list(Template.objects.select_related("project", "pulsar").filter(template_file=lookup_path))
+        if not templates:
+            raise Template.DoesNotExist
 
-        # Use template's is_restricted method
-        if template.is_restricted(request.user):
+        # Check every template sharing the file with one query
+        if len(Template.restricted_ids(request.user, [template.id for template in templates])) == len(templates):
             if not request.user.is_authenticated:
                 logger.warning(f"Anonymous user denied template download: {file_path}")
                 return HttpResponse("Unauthorized - please log in", status=401)
@@ -29,6 +29,7 @@ base_settings = [
     "email.py",
     "cache.py",
     "file_download.py",
+    "summaries.py",
     # Optionally override some settings:
     optional("local.py"),
 ]
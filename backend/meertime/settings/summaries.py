@@ -0,0 +1,5 @@
+from meertime.settings import env
+
+# Queue summary recalculations for the process_summary_updates command instead of
+# recalculating them every time an observation is saved
+SUMMARY_UPDATE_QUEUE = env.bool("SUMMARY_UPDATE_QUEUE", default=True)
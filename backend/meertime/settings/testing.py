@@ -4,3 +4,6 @@ freezegun.configure(extend_ignore_list=["cachalot", "django.contrib.auth", "djan
 
 # Decorator-level frozen time can otherwise make login sessions expire in the past.
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 365 * 100
+
+# Recalculate summaries as observations are saved so tests can check them straight away.
+SUMMARY_UPDATE_QUEUE = False
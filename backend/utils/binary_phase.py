@@ -14,10 +14,15 @@ from decimal import Decimal, InvalidOperation
 
 # Imports
 import numpy as np
-from scipy.optimize import fsolve
 
 # Constants
 DAYPERYEAR = 365.25
+# Newton-Raphson steps below this (radians) count as converged when solving Kepler's equation
+KEPLER_TOLERANCE = 1e-15
+KEPLER_MAX_ITERATIONS = 50
+# Halvings of the [M - ECC, M + ECC] bracket for anomalies Newton-Raphson didn't converge on, enough to
+# reach long double precision
+KEPLER_BISECTIONS = 64
 
 
 # reads a par file into a dictionary object
@@ -97,8 +102,18 @@ def get_binary_phase(mjds, ephemeris_dict):
     Calculates binary phase for an array of barycentric MJDs and a parameter dictionary
     """
 
-    U = get_true_anomaly(mjds, ephemeris_dict)
-    OM = get_omega(ephemeris_dict, U)
+    return get_orbital_phase(mjds, **get_orbital_elements(ephemeris_dict))
+
+
+def get_orbital_phase(mjds, t0, ecc, om, omdot, pb=None, pbdot=0.0, fb=None):
+    """
+    Calculates binary phase for an array of barycentric MJDs from the orbital elements of get_binary_orbit,
+    so no parameter dictionary needs to be parsed
+    """
+
+    U = true_anomaly(eccentric_anomaly(mean_anomaly(mjds, t0, pb, pbdot, fb), ecc), ecc)
+    # calculate the instantaneous omega
+    OM = om + omdot * U / get_omb(pb, fb)
 
     # normalise U
     U = np.fmod(U, 2 * np.pi)
@@ -106,6 +121,54 @@ def get_binary_phase(mjds, ephemeris_dict):
     return np.fmod(U + OM + 2 * np.pi, 2 * np.pi) / (2 * np.pi)
 
 
+def get_orbital_elements(ephemeris_dict):
+    """
+    Extract the orbital elements the binary phase depends on from a parameter dictionary, in the units
+    get_orbital_phase takes them:
+        t0: MJD of periastron
+        ecc: eccentricity
+        om: longitude of periastron at t0 (radians)
+        omdot: advance of periastron (radians / day)
+        pb, pbdot: orbital period (days) and its derivative, corrected from tempo format, if PB is given
+        fb: orbital frequency and its derivatives [FB0, FB1, ...] (Hz, Hz / s, ...) if PB is not given
+    """
+
+    if "PB" in ephemeris_dict.keys():
+        pb = ephemeris_dict["PB"]
+        pbdot = float(ephemeris_dict.get("PBDOT", 0))
+        if np.abs(pbdot) > 1e-6:  # adjusted from Daniels' setting
+            # correct tempo-format
+            pbdot *= 10**-12
+        fb = None
+    else:
+        pb = None
+        pbdot = 0.0
+        fb = []
+        while f"FB{len(fb)}" in ephemeris_dict.keys():
+            fb.append(ephemeris_dict[f"FB{len(fb)}"])
+
+    return {
+        "t0": get_T0(ephemeris_dict),
+        "ecc": float(get_ecc(ephemeris_dict)),
+        "om": get_reference_omega(ephemeris_dict),
+        # convert from deg/yr to rad/day
+        "omdot": ephemeris_dict.get("OMDOT", 0) * (np.pi / 180) / DAYPERYEAR,
+        "pb": pb,
+        "pbdot": pbdot,
+        "fb": fb,
+    }
+
+
+def get_binary_orbit(ephemeris_dict):
+    """
+    The orbital elements of get_orbital_elements, or None if the parameters don't describe a binary pulsar
+    """
+
+    if not is_binary(ephemeris_dict):
+        return None
+    return get_orbital_elements(ephemeris_dict)
+
+
 def get_ELL1_arctan(EPS1, EPS2):
     """
     Given the EPS1 and EPS2 parameters of the ELL1 binary model,
@@ -131,13 +194,11 @@ def get_ELL1_arctan(EPS1, EPS2):
     return np.fmod(AT + 2 * np.pi, 2 * np.pi)
 
 
-def get_omega(ephemeris_dict, U):
+def get_reference_omega(ephemeris_dict):
     """
-    Calculate the instantaneous version of omega (radians) accounting for OMDOT
-    per Eq. 8.19 of the Handbook. May be slightly incorrect for relativistic systems
+    Calculate omega (radians) at T0 depending on binary model
     """
 
-    # get reference omega
     if "TASC" in ephemeris_dict.keys():
         if "EPS1" in ephemeris_dict.keys() and "EPS2" in ephemeris_dict.keys():
             OM = get_ELL1_arctan(ephemeris_dict["EPS1"], ephemeris_dict["EPS2"])
@@ -152,18 +213,17 @@ def get_omega(ephemeris_dict, U):
         else:
             OM = 0
 
-    # get change in omega
-    if "OMDOT" in ephemeris_dict.keys():
-        # convert from deg/yr to rad/day
-        OMDOT = ephemeris_dict["OMDOT"] * (np.pi / 180) / DAYPERYEAR
-    else:
-        OMDOT = 0
+    return OM
 
-    # calculate current omega
-    OMB = get_OMB(ephemeris_dict)
-    OM = OM + OMDOT * U / (OMB)
 
-    return OM
+def get_omega(ephemeris_dict, U):
+    """
+    Calculate the instantaneous version of omega (radians) accounting for OMDOT
+    per Eq. 8.19 of the Handbook. May be slightly incorrect for relativistic systems
+    """
+
+    elements = get_orbital_elements(ephemeris_dict)
+    return elements["om"] + elements["omdot"] * U / get_omb(elements["pb"], elements["fb"])
 
 
 def get_OMB(ephemeris_dict):
@@ -178,6 +238,16 @@ def get_OMB(ephemeris_dict):
         return 2 * np.pi * ephemeris_dict["FB0"] * 86400
 
 
+def get_omb(pb, fb):
+    """
+    Return a simple, constant value of OMB (rad / days) from the orbital period or frequencies
+    """
+
+    if pb is not None:
+        return 2 * np.pi / pb
+    return 2 * np.pi * fb[0] * 86400
+
+
 def get_ecc(ephemeris_dict):
     """
     Calculate eccentricity depending on binary model
@@ -220,38 +290,29 @@ def get_mean_anomaly(mjds, ephemeris_dict):
     """
     Calculates mean anomalies for an array of barycentric MJDs and a parameter dictionary
     """
-    # handle conversion of T0/TASC
-    T0 = get_T0(ephemeris_dict)
+    elements = get_orbital_elements(ephemeris_dict)
+    return mean_anomaly(mjds, elements["t0"], elements["pb"], elements["pbdot"], elements["fb"])
 
-    # determine which type of orbital period encoding we're dealing with
-    if "PB" in ephemeris_dict.keys():
-        PB = ephemeris_dict["PB"]
 
-        # normal approach
-        if "PBDOT" in ephemeris_dict.keys():
-            PBDOT = float(ephemeris_dict["PBDOT"])
-        else:
-            PBDOT = 0
-
-        if np.abs(PBDOT) > 1e-6:  # adjusted from Daniels' setting
-            # correct tempo-format
-            PBDOT *= 10**-12
+def mean_anomaly(mjds, t0, pb=None, pbdot=0.0, fb=None):
+    """
+    Calculates mean anomalies for an array of barycentric MJDs from T0 and either PB and PBDOT or FB0..FBn
+    """
 
-        OMB = get_OMB(ephemeris_dict)
-        M = OMB * ((mjds - T0) - 0.5 * (PBDOT / PB) * (mjds - T0) ** 2)
+    # determine which type of orbital period encoding we're dealing with
+    if pb is not None:
+        # normal approach
+        OMB = get_omb(pb, fb)
+        M = OMB * ((mjds - t0) - 0.5 * (pbdot / pb) * (mjds - t0) ** 2)
         return M.squeeze()
 
-    elif "FB0" in ephemeris_dict.keys():
-        M = np.zeros(len(mjds))
-        i = 0
-
-        # produce integrated Taylor series of FB terms
-        while f"FB{i}" in ephemeris_dict.keys():
-            M = M + ephemeris_dict[f"FB{i}"] * ((mjds - T0) ** (i + 1)) / math.factorial(i + 1)
-            i += 1
+    M = np.zeros(len(mjds))
+    # produce integrated Taylor series of FB terms
+    for i, FBi in enumerate(fb):
+        M = M + FBi * ((mjds - t0) ** (i + 1)) / math.factorial(i + 1)
 
-        M = M * 2 * np.pi * 86400
-        return M.squeeze()
+    M = M * 2 * np.pi * 86400
+    return M.squeeze()
 
 
 def get_eccentric_anomaly(mjds, ephemeris_dict):
@@ -259,22 +320,54 @@ def get_eccentric_anomaly(mjds, ephemeris_dict):
     Calculates eccentric anomalies for an array of barycentric MJDs and a parameter dictionary
     """
 
-    # first obtain mean anomaly
-    M = get_mean_anomaly(mjds, ephemeris_dict)
+    return eccentric_anomaly(get_mean_anomaly(mjds, ephemeris_dict), float(get_ecc(ephemeris_dict)))
 
-    # handle conversion of EPS/ECC
-    ECC = float(get_ecc(ephemeris_dict))
 
-    # eccentric anomaly
+def eccentric_anomaly(M, ECC, tolerance=KEPLER_TOLERANCE, max_iterations=KEPLER_MAX_ITERATIONS):
+    """
+    Calculates eccentric anomalies from mean anomalies and the eccentricity
+
+    Kepler's equation E - ECC * sin(E) = M is solved for every mean anomaly at once with Newton-Raphson
+    iterations in long double precision, each anomaly stopping once its step is within the tolerance.
+    Any left after max_iterations are bisected instead, which always converges as E - ECC * sin(E)
+    increases monotonically.
+    """
+
+    M = np.atleast_1d(np.asarray(M, dtype=np.longdouble))
     if ECC < 1e-4:
         # print("Assuming circular orbit for true anomaly calculation")
-        E = np.atleast_1d(M).astype(np.longdouble)
+        return M
+    if ECC >= 1:
+        raise ValueError(f"Eccentricity {ECC} does not describe an elliptical orbit")
+
+    ECC = np.longdouble(ECC)
+    two_pi = 2 * np.arccos(np.longdouble(-1))
+    # Solve within [-pi, pi] and add the whole orbits back afterwards, so E counts orbits like M does
+    orbits = np.round(M / two_pi)
+    M = M - orbits * two_pi
+
+    # Danby's starting value, which keeps the iterations few and stable up to eccentricities near 1
+    E = M + 0.85 * ECC * np.sign(np.sin(M))
+    unconverged = np.arange(len(M))
+    for _ in range(max_iterations):
+        E_i = E[unconverged]
+        step = (E_i - ECC * np.sin(E_i) - M[unconverged]) / (1 - ECC * np.cos(E_i))
+        E[unconverged] = E_i - step
+        unconverged = unconverged[np.abs(step) > tolerance]
+        if not len(unconverged):
+            break
     else:
-        M = np.asarray(M, dtype=np.float64)
-        E = fsolve(lambda E: E - ECC * np.sin(E) - M, M)
-        E = np.asarray(E, dtype=np.longdouble)
+        M_i = M[unconverged]
+        lower = M_i - ECC
+        upper = M_i + ECC
+        for _ in range(KEPLER_BISECTIONS):
+            middle = (lower + upper) / 2
+            above = middle - ECC * np.sin(middle) > M_i
+            upper = np.where(above, middle, upper)
+            lower = np.where(above, lower, middle)
+        E[unconverged] = (lower + upper) / 2
 
-    return E
+    return E + orbits * two_pi
 
 
 def get_true_anomaly(mjds, ephemeris_dict):
@@ -282,11 +375,13 @@ def get_true_anomaly(mjds, ephemeris_dict):
     Calculates true anomalies for an array of barycentric MJDs and a parameter dictionary
     """
 
-    # first obtain eccentric anomaly
-    E = get_eccentric_anomaly(mjds, ephemeris_dict)
+    return true_anomaly(get_eccentric_anomaly(mjds, ephemeris_dict), get_ecc(ephemeris_dict))
 
-    # handle conversion of EPS/ECC
-    ECC = get_ecc(ephemeris_dict)
+
+def true_anomaly(E, ECC):
+    """
+    Calculates true anomalies from eccentric anomalies and the eccentricity
+    """
 
     # true anomaly
     U = 2 * np.arctan2(np.sqrt(1 + ECC) * np.sin(E / 2), np.sqrt(1 - ECC) * np.cos(E / 2))
@@ -0,0 +1,42 @@
+import numpy as np
+
+# MJD 0 as a microsecond resolution datetime
+MJD_EPOCH = np.datetime64("1858-11-17T00:00:00", "us")
+
+
+def mjd_to_day_of_year(mjds):
+    """
+    Convert an array of MJDs to the day of the year as a float, for all MJDs at once.
+
+    Matches the datetime based calculation used for observations, tm_yday plus the hours, minutes
+    and whole seconds into the day as a fraction of a day.
+
+    Args:
+        mjds (array): MJDs as floats, Decimals or strings.
+
+    Returns:
+        numpy.ndarray: The day of the year (1 to 366.99999) for each MJD.
+    """
+    mjds = np.asarray(mjds, dtype=np.float64)
+    # timedelta(days=mjd) rounds to the nearest microsecond (half to even), as does np.round
+    dates = MJD_EPOCH + np.round(mjds * 86400e6).astype(np.int64).astype("timedelta64[us]")
+    return datetime_to_day_of_year(dates)
+
+
+def datetime_to_day_of_year(dates):
+    """
+    Convert an array of UTC datetimes to the day of the year as a float, for all dates at once.
+
+    Args:
+        dates (array): numpy datetime64 values or naive datetimes in UTC.
+
+    Returns:
+        numpy.ndarray: The day of the year (1 to 366.99999) for each date.
+    """
+    dates = np.asarray(dates, dtype="datetime64[us]")
+    days = dates.astype("datetime64[D]")
+    day_of_year = (days - dates.astype("datetime64[Y]")).astype(np.int64) + 1
+    hours, seconds = np.divmod((dates.astype("datetime64[s]") - days).astype(np.int64), 3600)
+    minutes, seconds = np.divmod(seconds, 60)
+    # Summed in the same order as the datetime calculation so the floats match exactly
+    return day_of_year + hours / 24.0 + minutes / 1440.0 + seconds / 86400.0
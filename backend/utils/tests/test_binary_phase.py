@@ -1,7 +1,8 @@
 import numpy as np
 from django.test import TestCase
+from scipy.optimize import fsolve
 
-from utils.binary_phase import get_binary_phase
+from utils.binary_phase import eccentric_anomaly, get_binary_orbit, get_binary_phase, get_orbital_phase
 
 
 class BinaryPhaseTestCase(TestCase):
@@ -242,3 +243,51 @@ class BinaryPhaseTestCase(TestCase):
         for mjd, ephemeris_dict, expected in tests:
             binary_phase = get_binary_phase(np.array([float(mjd)]), ephemeris_dict)[0]
             self.assertAlmostEqual(binary_phase, expected, delta=1e-6)
+
+            # The extracted orbit gives the same phase without the rest of the ephemeris
+            orbit = get_binary_orbit(ephemeris_dict)
+            orbital_phase = get_orbital_phase(np.array([float(mjd)]), **orbit)[0]
+            self.assertAlmostEqual(orbital_phase, binary_phase, delta=1e-12)
+
+    def test_get_binary_orbit_of_isolated_pulsar(self):
+        self.assertIsNone(get_binary_orbit({"PSRJ": "J0437-4715", "F0": 173.6879, "DM": 2.64}))
+
+
+class EccentricAnomalyTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Mean anomalies over many orbits either side of T0, plus periastron and apastron
+        self.mean_anomalies = np.concatenate([rng.uniform(-1e4, 1e4, 500), [0.0, np.pi, -np.pi, 2 * np.pi]])
+
+    def test_matches_fsolve(self):
+        for ecc in [0.001, 0.1, 0.617134, 0.9, 0.99]:
+            expected = [fsolve(lambda E, M=M: E - ecc * np.sin(E) - M, M, xtol=1e-14)[0] for M in self.mean_anomalies]
+
+            np.testing.assert_allclose(
+                eccentric_anomaly(self.mean_anomalies, ecc).astype(float), expected, rtol=0, atol=1e-9
+            )
+
+    def test_solves_keplers_equation_at_high_eccentricity(self):
+        for ecc in [0.999, 0.99999]:
+            E = eccentric_anomaly(self.mean_anomalies, ecc)
+
+            self.assertEqual(E.dtype, np.longdouble)
+            np.testing.assert_allclose((E - ecc * np.sin(E)).astype(float), self.mean_anomalies, rtol=0, atol=1e-11)
+            # E keeps the orbit count of M
+            np.testing.assert_array_equal(
+                np.round(E.astype(float) / (2 * np.pi)), np.round(self.mean_anomalies / (2 * np.pi))
+            )
+
+    def test_unconverged_anomalies_are_bisected(self):
+        E = eccentric_anomaly(self.mean_anomalies, 0.9999)
+
+        np.testing.assert_allclose(
+            eccentric_anomaly(self.mean_anomalies, 0.9999, max_iterations=1).astype(float), E.astype(float), atol=1e-11
+        )
+
+    def test_circular_orbit(self):
+        np.testing.assert_array_equal(eccentric_anomaly(self.mean_anomalies, 5e-5), self.mean_anomalies)
+
+    def test_rejects_unbound_orbit(self):
+        with self.assertRaises(ValueError):
+            eccentric_anomaly(self.mean_anomalies, 1.0)
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.test import TestCase
+
+from utils.day_of_year import datetime_to_day_of_year, mjd_to_day_of_year
+
+
+class DayOfYearTestCase(TestCase):
+    def test_mjd_to_day_of_year_matches_datetime_calculation(self):
+        rng = np.random.default_rng(0)
+        # Random MJDs plus year boundaries and a leap day
+        mjds = np.concatenate([rng.uniform(45000, 70000, 1000), [51543.99999999, 51544.0, 51603.5, 60310.999999]])
+
+        expected = []
+        for mjd in mjds:
+            date = datetime(1858, 11, 17) + timedelta(days=float(mjd))
+            expected.append(date.timetuple().tm_yday + date.hour / 24.0 + date.minute / 1440.0 + date.second / 86400.0)
+
+        self.assertEqual(mjd_to_day_of_year(mjds).tolist(), expected)
+
+    def test_mjd_to_day_of_year_accepts_strings(self):
+        self.assertEqual(mjd_to_day_of_year(["51544.5", "51910.25"]).tolist(), [1.5, 1.25])
+
+    def test_datetime_to_day_of_year_matches_datetime_calculation(self):
+        dates = [datetime(2019, 12, 31, 23, 59, 59, 999999), datetime(2020, 2, 29, 12, 30, 15), datetime(2023, 4, 17)]
+
+        expected = [
+            date.timetuple().tm_yday + date.hour / 24.0 + date.minute / 1440.0 + date.second / 86400.0
+            for date in dates
+        ]
+
+        self.assertEqual(datetime_to_day_of_year(dates).tolist(), expected)
@@ -1,8 +1,18 @@
+import gzip
+import io
 import os
+import warnings
 
+import numpy as np
 from django.test import TestCase
 
-from utils.toa import toa_dict_to_line, toa_line_to_dict
+from utils.toa import (
+    iter_tim_lines,
+    toa_columns_to_lines,
+    toa_dict_to_line,
+    toa_line_to_dict,
+    toa_lines_to_columns,
+)
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "test_data")
 
@@ -35,3 +45,103 @@ class ToaTestCase(TestCase):
                     toa_dict = toa_line_to_dict(input_toa_line)
                     output_toa_line = toa_dict_to_line(toa_dict)
                     self.assertEqual(input_toa_line, output_toa_line)
+
+    def test_iter_tim_lines_reads_plain_and_gzipped_files(self):
+        """
+        Test that iter_tim_lines yields the same ToA lines whether or not the file is gzipped
+        """
+        for toa_file, _ in TOA_FILES:
+            with open(toa_file, "rb") as f:
+                raw = f.read()
+            expected = [line for line in raw.decode().splitlines() if line.strip() and "FORMAT" not in line]
+
+            self.assertEqual(list(iter_tim_lines(io.BytesIO(raw))), expected)
+            self.assertEqual(list(iter_tim_lines(io.BytesIO(gzip.compress(raw)))), expected)
+
+    def test_iter_tim_lines_rejects_corrupt_gzip_files(self):
+        """
+        Test that iter_tim_lines raises ValueError for corrupt and truncated gzip files
+        """
+        with open(TOA_FILES[0][0], "rb") as f:
+            compressed = gzip.compress(f.read())
+
+        for corrupt in [compressed[:10] + b"corrupt" + compressed[17:], compressed[: len(compressed) // 2]]:
+            with self.assertRaises(ValueError):
+                list(iter_tim_lines(io.BytesIO(corrupt)))
+
+    def test_toa_lines_to_columns_to_lines(self):
+        """
+        Test that the columnar parser and serializer round trip and agree with toa_line_to_dict
+        """
+        for toa_file, _ in TOA_FILES:
+            with open(toa_file, "rb") as f:
+                toa_lines = list(iter_tim_lines(f))
+
+            blocks = toa_lines_to_columns(toa_lines)
+            self.assertEqual(sum(len(block) for block in blocks), len(toa_lines))
+            for block in blocks:
+                self.assertEqual(toa_columns_to_lines(block), [toa_lines[row] for row in block.rows])
+                for name in block.columns:
+                    expected = [toa_line_to_dict(toa_lines[row])[name] for row in block.rows]
+                    self.assertEqual(block.tolist(name), expected)
+
+    def test_toa_lines_to_columns_types(self):
+        """
+        Test flag columns are typed per column and mixed int/float values still round trip
+        """
+        toa_lines = [
+            "a.ar 1284.000000 60000.123456789012   0.066  meerkat  -fe KAT -gof 913 -length 248 -chan 0",
+            "a.ar 1284.000000 60000.123456789013   0.066  meerkat  -fe KAT -gof 3.33e+03 -length 6.998 -chan 1",
+        ]
+
+        (block,) = toa_lines_to_columns(toa_lines)
+
+        self.assertEqual(block.columns["chan"].dtype, np.int64)
+        self.assertEqual(block.columns["gof"].dtype, np.float64)
+        self.assertEqual(block.tolist("fe"), ["KAT", "KAT"])
+        self.assertEqual(block.tolist("snr"), [None, None])
+        self.assertEqual(toa_columns_to_lines(block), toa_lines)
+
+    def test_toa_lines_to_columns_keeps_large_integers(self):
+        """
+        Test integers a float64 can't hold exactly are kept as Python ints like the per line parsing keeps them
+        """
+        toa_lines = [
+            "a.ar 1284.000000 60000.1   0.066 pks -x 1.5 -y 99999999999999999999 -gof 3.33e+03",
+            "a.ar 1284.000000 60000.2   0.066 pks -x 99999999999999999999 -y 9007199254740993 -gof 9007199254740993",
+        ]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            (block,) = toa_lines_to_columns(toa_lines)
+            toa_lines_out = toa_columns_to_lines(block)
+
+        self.assertEqual(block.tolist("x"), [1.5, 99999999999999999999])
+        self.assertEqual(block.tolist("y"), [99999999999999999999, 9007199254740993])
+        self.assertEqual(toa_lines_out, [toa_dict_to_line(toa_line_to_dict(toa_line)) for toa_line in toa_lines])
+
+    def test_toa_lines_to_columns_groups_lines_by_flags(self):
+        """
+        Test lines with different flags are parsed into separate blocks that keep their line numbers
+        """
+        toa_lines = [
+            "a.ar 1284.000000 60000.1   0.066 pks -fe KAT -chan 0",
+            "a.ar 1284.000000 60000.2   0.066 pks -be MKBF -chan 1",
+            "a.ar 1284.000000 60000.3   0.066 pks -fe KAT -chan 2",
+            "a.ar 1284.000000 60000.4   0.066 pks -chan 3",
+        ]
+
+        blocks = toa_lines_to_columns(toa_lines)
+
+        self.assertEqual([block.rows.tolist() for block in blocks], [[0, 2], [1], [3]])
+        self.assertEqual([block.flag_names for block in blocks], [("fe", "chan"), ("be", "chan"), ("chan",)])
+        for block in blocks:
+            self.assertEqual(toa_columns_to_lines(block), [toa_lines[row] for row in block.rows])
+
+    def test_toa_lines_to_columns_malformed(self):
+        """
+        Test malformed lines raise a ValueError like toa_line_to_dict does
+        """
+        for toa_line in ["a.ar 1284.0 60000.1", "a.ar 1284.0 60000.1   0.066 pks -fe", "a.ar 1 2 3 pks -fe A -fe B"]:
+            with self.assertRaises(ValueError):
+                toa_lines_to_columns([toa_line])
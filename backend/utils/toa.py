@@ -1,4 +1,17 @@
+import gzip
+import io
+import zlib
+from dataclasses import dataclass, field
 from decimal import Decimal, getcontext
+from itertools import islice, repeat
+
+import numpy as np
+
+GZIP_MAGIC = b"\x1f\x8b"
+# The space separated columns at the start of every ToA line, before the -flag value pairs
+TOA_HEADER_COLUMNS = ["archive", "freq_MHz", "mjd", "mjd_err", "telescope"]
+# Integers from this size up can't all be stored exactly in a float64
+FLOAT64_EXACT_INT_LIMIT = 2**53
 
 
 def convert_to_int_or_float_if_possible(value):
@@ -74,3 +87,206 @@ def toa_dict_to_line(toa_dict):
             else:
                 toa_line += f" -{key} {value}"
     return toa_line
+
+
+def iter_tim_lines(tim_file):
+    """
+    Lazily read the ToA lines of a .tim file, transparently decompressing gzip files.
+
+    Only one line is held in memory at a time so arbitrarily large files can be streamed.
+
+    Args:
+        tim_file (file): A binary file object opened at the start of the .tim file.
+
+    Yields:
+        str: Each non-empty line without its trailing newline, skipping the FORMAT header.
+
+    Raises:
+        ValueError: If the file is a corrupt or truncated gzip file, or isn't UTF-8 text.
+    """
+    if tim_file.read(2) == GZIP_MAGIC:
+        tim_file.seek(0)
+        tim_file = gzip.GzipFile(fileobj=tim_file)
+    else:
+        tim_file.seek(0)
+    text_file = io.TextIOWrapper(tim_file, encoding="utf-8")
+    try:
+        for toa_line in text_file:
+            toa_line = toa_line.rstrip("\n")
+            if not toa_line.strip() or "FORMAT" in toa_line:
+                continue
+            yield toa_line
+    except (OSError, EOFError, zlib.error) as error:
+        # gzip raises BadGzipFile (an OSError) or zlib.error for a corrupt file and EOFError for a truncated one
+        raise ValueError(f"Could not read the .tim file: {error}") from error
+    finally:
+        # Detach so the caller's file isn't closed when the wrapper is garbage collected
+        text_file.detach()
+
+
+def iter_chunks(iterable, chunk_size):
+    """
+    Yield lists of up to chunk_size items from an iterable.
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+@dataclass
+class ToaColumns:
+    """
+    A block of .tim lines that share the same flags, stored as one typed array per column.
+
+    Flag columns are int64 when every value is an integer, float64 when every value is a number
+    (int_masks records which of those were written as integers) and str otherwise.
+    """
+
+    flag_names: tuple
+    rows: np.ndarray
+    columns: dict
+    int_masks: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def tolist(self, name):
+        """
+        Return a column as a list of Python values, or None for every row if it's a flag the block doesn't have.
+        """
+        if name not in self.columns:
+            return [None] * len(self)
+        return self.columns[name].tolist()
+
+
+def _parse_flag_column(tokens):
+    """
+    Type a column of flag values the same way convert_to_int_or_float_if_possible types each value.
+    """
+    try:
+        return np.array(tokens, dtype=np.int64), None
+    except (ValueError, OverflowError):
+        pass
+    try:
+        values = np.array(tokens, dtype=np.float64)
+    except ValueError:
+        return np.array(tokens, dtype=object), None
+    int_mask = np.array([(token[1:] if token[0] in "+-" else token).isdigit() for token in tokens])
+    if np.any(np.abs(values[int_mask]) >= FLOAT64_EXACT_INT_LIMIT):
+        # Float64 can't hold these integers exactly, keep the Python values like the per line parsing does
+        return np.array([convert_to_int_or_float_if_possible(token) for token in tokens], dtype=object), None
+    return values, int_mask if int_mask.any() else None
+
+
+def _parse_block(toa_lines, rows, tokens):
+    """
+    Type the token columns of a block of ToA lines that share the same flags.
+    """
+    n_header = len(TOA_HEADER_COLUMNS)
+    flag_names = tuple(flag_token[0][1:] for flag_token in tokens[n_header::2])
+    if len(set(flag_names)) != len(flag_names):
+        raise ValueError(f"Malformed ToA line, repeated flag.\n{toa_lines[rows[0]]}")
+    columns = {
+        "archive": np.array(tokens[0], dtype=object),
+        "freq_MHz": np.array(tokens[1], dtype=np.float64),
+        # MJDs are stored as Decimals as standard floats don't have enough precision
+        "mjd": np.array([Decimal(mjd) for mjd in tokens[2]], dtype=object),
+        "mjd_err": np.array(tokens[3], dtype=np.float64),
+        "telescope": np.array(tokens[4], dtype=object),
+    }
+    block = ToaColumns(flag_names=flag_names, rows=rows, columns=columns)
+    for flag_name, flag_values in zip(flag_names, tokens[n_header + 1 :: 2]):
+        block.columns[flag_name], int_mask = _parse_flag_column(flag_values)
+        if int_mask is not None:
+            block.int_masks[flag_name] = int_mask
+    return block
+
+
+def toa_lines_to_columns(toa_lines):
+    """
+    Parse the lines of a .tim file into typed column arrays in one pass.
+
+    Lines are grouped by their flags (normally a whole file shares the same flags) and each group is
+    parsed column by column, so the only per line work is a str.split().
+
+    Args:
+        toa_lines (list): Lines from a .tim file without their trailing newlines or the FORMAT header.
+
+    Returns:
+        list: A ToaColumns per group of lines with the same flags, in order of first appearance.
+    """
+    n_header = len(TOA_HEADER_COLUMNS)
+    split_lines = [toa_line.split() for toa_line in toa_lines]
+    n_tokens = np.fromiter(map(len, split_lines), dtype=np.int64, count=len(split_lines))
+    malformed = (n_tokens < n_header) | ((n_tokens - n_header) % 2 == 1)
+    if malformed.any():
+        raise ValueError(
+            f"Malformed ToA line, expected five columns then -flag value pairs.\n{toa_lines[np.argmax(malformed)]}"
+        )
+
+    blocks = []
+    for length in np.unique(n_tokens):
+        rows = np.flatnonzero(n_tokens == length)
+        # Transpose to a tuple of tokens per column
+        tokens = list(zip(*(split_lines if len(rows) == len(split_lines) else map(split_lines.__getitem__, rows))))
+        if all(flag_tokens.count(flag_tokens[0]) == len(rows) for flag_tokens in tokens[n_header::2]):
+            blocks.append(_parse_block(toa_lines, rows, tokens))
+            continue
+        # Lines with the same number of flags but different flags, split them up by flag names
+        layouts = {}
+        for row, layout in zip(rows, zip(*tokens[n_header::2])):
+            layouts.setdefault(layout, []).append(row)
+        for layout_rows in layouts.values():
+            tokens = list(zip(*map(split_lines.__getitem__, layout_rows)))
+            blocks.append(_parse_block(toa_lines, np.array(layout_rows), tokens))
+    return sorted(blocks, key=lambda block: block.rows[0])
+
+
+def _format_flag_column(block, flag_name):
+    """
+    Format a column of flag values the way toa_dict_to_line formats each value.
+    """
+    values = block.columns[flag_name]
+    if values.dtype == np.int64:
+        return list(map(str, values.tolist()))
+    if values.dtype != np.float64:
+        return [
+            format_float(value, threshold=1e3, decimal_places=2)
+            if isinstance(value, float) and flag_name == "gof"
+            else str(value)
+            for value in values.tolist()
+        ]
+    formatted = values.astype(str).astype(object)
+    is_int = block.int_masks.get(flag_name, np.zeros(len(values), dtype=bool))
+    formatted[is_int] = list(map(str, values[is_int].astype(np.int64).tolist()))
+    if flag_name == "gof":
+        # Vectorized format_float(value, threshold=1e3, decimal_places=2)
+        large = ~is_int & (np.abs(values) >= 1e3)
+        e_format = ["%.2e" % value for value in values[large].tolist()]
+        formatted[large] = [value.replace("0e", "e").replace("0e", "e").replace(".e", "e") for value in e_format]
+    return formatted.tolist()
+
+
+def toa_columns_to_lines(block):
+    """
+    Convert a block of ToA columns back into .tim lines, the columnar equivalent of toa_dict_to_line.
+
+    Args:
+        block (ToaColumns): Columns from toa_lines_to_columns.
+
+    Returns:
+        list: The .tim lines in the same order as block.rows.
+    """
+    columns = block.columns
+    telescope = columns["telescope"].copy()
+    telescope[telescope == "meerkat"] = " meerkat "
+    parts = [
+        columns["archive"].tolist(),
+        ["%.6f" % freq for freq in columns["freq_MHz"].tolist()],
+        list(map(str, columns["mjd"].tolist())),
+        ["%7.3f" % mjd_err for mjd_err in columns["mjd_err"].tolist()],
+        telescope.tolist(),
+    ]
+    for flag_name in block.flag_names:
+        parts += [repeat(f"-{flag_name}"), _format_flag_column(block, flag_name)]
+    return [" ".join(line_parts) for line_parts in zip(*parts)]